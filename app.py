@@ -1,25 +1,53 @@
 import streamlit as st
 import pandas as pd
-import altair as alt
+import datetime
+import io
+import os
 
 st.set_page_config(page_title="FinPal Budget App", layout="wide")
 
-from utils.data_processing import calculate_taxes, categorize_expense, parse_bank_statement
-from db_manager import init_db, load_user_data, save_user_data, initialize_session_from_user_data, persist_session
-from user_auth_storage import login_user, authenticator
-
-# Initialize the database
-init_db()
-
-# Show login form every time — only authenticate once
-username = login_user()
+from utils.categorization import BUDGET_CATEGORIES, RULE_KINDS
+from utils.expense_store import ExpenseStore
+from utils.data_processing import calculate_taxes, statement_fingerprint
+from utils.tax_scenarios import tax_scenarios
+from db_manager import (
+    EXPENSE_COLUMNS, init_db, load_user_data_window,
+    initialize_session_from_user_data, current_month_start, ExpenseFilters, EXPENSE_SORT_COLUMNS, load_expense_page,
+    persist_session, import_bank_statement, statement_already_imported, load_category_totals,
+    load_category_rules, save_category_rule, delete_category_rule,
+    ARCHIVE_CLOSED_MONTHS, archive_closed_months, export_user_data, load_spend_forecast,
+    REPORT_QUEUED, REPORT_RUNNING, REPORT_DONE, REPORT_FAILED, list_report_jobs, load_report_result
+)
+from report_jobs import REPORT_POLL_SECONDS, get_report_queue
+from user_auth_storage import login_user, logout_user
+from utils.reports import REPORT_FORMATS, REPORT_KINDS
+from utils.spend_forecast import month_range, shift_month
+from utils import instrumentation
+from utils.instrumentation import RerunTimer, span
+
+# Usernames allowed to see the performance panel, e.g. FINPAL_ADMIN_USERS=alice,bob
+ADMIN_USERS = {name.strip() for name in os.environ.get("FINPAL_ADMIN_USERS", "").split(",") if name.strip()}
+
+# Time this rerun's stages; a rerun cut short by st.stop()/st.rerun() is dropped
+if st.session_state.get("rerun_timer") is not None:
+    st.session_state.rerun_timer.abandon()
+rerun_timer = st.session_state.rerun_timer = RerunTimer(profile=st.session_state.pop("profile_next_rerun", False))
+
+# Migrations run once per process; later sessions and reruns reuse the pooled connections
+if "db_initialized" not in st.session_state:
+    init_db()
+    st.session_state.db_initialized = True
+
+# Signed-in reruns only re-check the session token; the password is checked once per login
+with span("app.authenticate"):
+    username = login_user()
 
 # Check status and stop if not logged in
 if st.session_state.get("authentication_status") != True:
     st.stop()
 
 # Place logout button AFTER login has succeeded
-authenticator.logout("Logout", "sidebar")
+logout_user("Logout", "sidebar")
 
 # After logout, session keys are cleared → re-trigger login
 if "username" not in st.session_state or not st.session_state["username"]:
@@ -27,13 +55,20 @@ if "username" not in st.session_state or not st.session_state["username"]:
 
 # If the user is authenticated, proceed with loading user data
 username = st.session_state["username"]
-user_data = load_user_data(username)
-initialize_session_from_user_data(user_data)
+# Closed months move to the Parquet archive once per session when archiving is on
+if ARCHIVE_CLOSED_MONTHS and not st.session_state.get("archive_checked"):
+    archive_closed_months(username)
+    st.session_state.archive_checked = True
+
+# Only the current month is loaded up front; Detailed Expenses pages through the rest
+with span("app.load_session"):
+    user_data = load_user_data_window(username, start=current_month_start())
+    initialize_session_from_user_data(user_data)
 
 st.sidebar.title("FinPal Setup")
 
 # Multi-page setup
-page = st.sidebar.radio("Navigate", ["Budget Setup", "Track Expenses"])
+page = st.sidebar.radio("Navigate", ["Budget Setup", "Track Expenses", "Reports"])
 
 # Load full list of US states for dropdown
 US_STATE_CODES = [
@@ -46,7 +81,7 @@ US_STATE_CODES = [
 if "annual_income" not in st.session_state:
     st.session_state.annual_income = 0.0
 if "expenses" not in st.session_state:
-    st.session_state.expenses = pd.DataFrame(columns=["Date", "Amount", "Category", "Description"])
+    st.session_state.expenses = ExpenseStore()
 if "budget" not in st.session_state:
     st.session_state.budget = {}
 if "selected_state" not in st.session_state:
@@ -125,24 +160,86 @@ if page == "Budget Setup":
     else:
         st.info("Please submit the form above to see tax calculations.")
 
+    st.subheader("What If? Tax Scenarios")
+    current_income = float(st.session_state.get("annual_income", 0.0))
+    col_states, col_options = st.columns([2, 1])
+    with col_states:
+        scenario_states = st.multiselect(
+            "Compare states", US_STATE_CODES,
+            default=[st.session_state.selected_state] + (["TX"] if st.session_state.selected_state != "TX" else [])
+        )
+    with col_options:
+        scenario_metric = st.selectbox("Show", ["Net Monthly Income", "Effective Tax Rate", "Marginal Tax Rate"])
+        include_nyc = "NY" in scenario_states and st.checkbox("Include NYC resident curve", value=True)
+    income_max = st.slider(
+        "Income range ($)", min_value=50_000, max_value=1_000_000,
+        value=min(1_000_000, max(200_000, int(round(current_income * 2, -4)))), step=10_000
+    )
+    if scenario_states:
+        with span("app.tax_scenarios"):
+            # Curves are memoized per (state, NYC) and only missing ones are computed
+            scenarios = tax_scenarios(scenario_states, (False, True) if include_nyc else (False,), 0, income_max)
+            scenarios["Scenario"] = scenarios["state"] + scenarios["nyc"].map({True: " + NYC", False: ""})
+            metric_column = {
+                "Net Monthly Income": "net_monthly_income",
+                "Effective Tax Rate": "effective_rate",
+                "Marginal Tax Rate": "marginal_rate",
+            }[scenario_metric]
+            is_rate = metric_column != "net_monthly_income"
+
+            import altair as alt
+            scenario_chart = alt.Chart(scenarios).mark_line().encode(
+                x=alt.X("gross_income:Q", title="Gross Annual Income ($)"),
+                y=alt.Y(f"{metric_column}:Q", title=scenario_metric, axis=alt.Axis(format="%" if is_rate else "$,.0f")),
+                color=alt.Color("Scenario:N"),
+                tooltip=[
+                    "Scenario:N",
+                    alt.Tooltip("gross_income:Q", title="Income", format="$,.0f"),
+                    alt.Tooltip(f"{metric_column}:Q", title=scenario_metric, format=".2%" if is_rate else "$,.2f"),
+                ]
+            ).properties(height=350).interactive()
+            if current_income:
+                # Dashed marker at the income entered above
+                scenario_chart += alt.Chart(pd.DataFrame({"gross_income": [current_income]})).mark_rule(
+                    strokeDash=[4, 4]
+                ).encode(x="gross_income:Q")
+        st.altair_chart(scenario_chart, use_container_width=True)
+        st.caption("Dashed line: your current income. Drag to pan, scroll to zoom.")
+
     st.subheader("Set Monthly Budget Goals")
     # Only define categories once
     if "budget" not in st.session_state:
         st.session_state.budget = {}
     
-    categories = ["Rent", "Groceries", "Transportation", "Entertainment", "Utilities", "Gym", "Internet"]
+    # Same categories the statement categorization rules produce
+    categories = BUDGET_CATEGORIES
     
     # Set each category only if it's not already present
     for cat in categories:
         if cat not in st.session_state.budget:
             st.session_state.budget[cat] = 0
     
+    # Suggestions come from the trailing months' aggregates, with recurring charges as a floor
+    with span("app.spend_forecast"):
+        spend_forecast = load_spend_forecast(username)
+    if spend_forecast.budgets:
+        st.caption("Suggested budgets are your average spend over the last few months, "
+                   "never below the recurring charges due in each category.")
+        if st.button("Use suggested budgets"):
+            for cat in categories:
+                st.session_state.budget[cat] = spend_forecast.budgets.get(cat, 0)
+
     # Then create input boxes without overwriting stored values
     for cat in categories:
         st.session_state.budget[cat] = st.number_input(
-            f"{cat} Budget ($)", min_value=0, value=st.session_state.budget[cat], step=50
+            f"{cat} Budget ($)", min_value=0, value=st.session_state.budget[cat], step=50,
+            help=f"Suggested: ${spend_forecast.budgets[cat]:,}" if cat in spend_forecast.budgets else None
         )
 
+    if not spend_forecast.recurring.empty:
+        with st.expander(f"Recurring charges ({len(spend_forecast.recurring)})"):
+            st.dataframe(spend_forecast.recurring, hide_index=True, use_container_width=True)
+
     # Save
     if "budget" in st.session_state:
         persist_session(username)
@@ -159,98 +256,250 @@ elif page == "Track Expenses":
         submitted = st.form_submit_button("Add Expense")
 
     if submitted:
-        new_expense = pd.DataFrame([[date, amount, category, description]], columns=st.session_state.expenses.columns)
-        st.session_state.expenses = pd.concat([st.session_state.expenses, new_expense], ignore_index=True)
+        st.session_state.expenses.append(date, amount, category, description)
+        persist_session(username)  # so the summary below includes it
         st.success("Expense added!")
 
     st.header("Upload Bank Statement")
-    uploaded_file = st.file_uploader("Upload a CSV bank statement", type=["csv"])
+    with st.expander("My categorization rules"):
+        st.caption("Your rules are checked before the defaults when statements are imported.")
+        user_rules = load_category_rules(username)
+        if not user_rules.empty:
+            st.dataframe(user_rules, hide_index=True)
+        with st.form("category_rule_form"):
+            rule_pattern = st.text_input("Description contains")
+            rule_kind = st.selectbox("Match as", RULE_KINDS)
+            rule_category = st.selectbox("Category", BUDGET_CATEGORIES + ["Other"])
+            col_add, col_remove = st.columns(2)
+            add_rule = col_add.form_submit_button("Add rule")
+            remove_rule = col_remove.form_submit_button("Remove rule")
+        if add_rule and rule_pattern:
+            try:
+                save_category_rule(username, rule_pattern, rule_category, kind=rule_kind)
+                st.success(f"Rule added: '{rule_pattern}' -> {rule_category}")
+            except Exception as e:
+                st.error(f"Invalid rule: {e}")
+        elif remove_rule and rule_pattern:
+            delete_category_rule(username, rule_pattern)
+            st.success(f"Rule removed: '{rule_pattern}'")
+
+    uploaded_file = st.file_uploader("Upload a CSV or PDF bank statement", type=["csv", "pdf"])
     if uploaded_file is not None:
-        parsed_expenses = parse_bank_statement(uploaded_file)
-        st.session_state.expenses = pd.concat([st.session_state.expenses, parsed_expenses], ignore_index=True)
-        st.success("Bank statement parsed and expenses added!")
+        # The uploader keeps the file attached across reruns; only import it once
+        content_hash = statement_fingerprint(uploaded_file)
+        if statement_already_imported(username, content_hash):
+            st.info("This bank statement has already been imported.")
+        else:
+            # Rows go straight into the expenses table chunk by chunk, then the session reloads them
+            progress_bar = st.progress(0.0, text="Importing bank statement...")
+            imported = import_bank_statement(
+                username, uploaded_file, content_hash=content_hash,
+                progress=lambda fraction, rows: progress_bar.progress(fraction, text=f"Imported {rows:,} transactions...")
+            )
+            progress_bar.empty()
+            initialize_session_from_user_data(load_user_data_window(username, start=current_month_start()))
+            st.success(f"Bank statement parsed and {imported:,} new expenses added!")
 
     st.header("Expense Summary")
 
     # Protect against missing keys
     budget = st.session_state.get("budget", {})
-    expenses = st.session_state.get("expenses", pd.DataFrame())
     tax_summary = st.session_state.get("tax_summary", {})
     
+    # This month's totals come from the per-(month, category) aggregates, not a scan of every expense
+    with span("app.category_totals"):
+        category_totals = load_category_totals(username, month=current_month_start()[:7])
+        actual_totals = dict(zip(category_totals["Category"], category_totals["Actual"]))
+
     estimated_spend = sum(budget.values()) if budget else 0
-    total_expenses = expenses["Amount"].sum() if not expenses.empty else 0
+    total_expenses = sum(actual_totals.values())
     monthly_net_income = tax_summary.get("net_income", 0) / 12
     expected_savings = monthly_net_income - estimated_spend
+    with span("app.spend_forecast"):
+        forecast_spend = load_spend_forecast(username).forecast["Forecast"].sum()
+    projected_savings = monthly_net_income - forecast_spend
     
     col1, col2 = st.columns(2)
     with col1:
         st.metric("Expected Monthly Income", f"${monthly_net_income:,.2f}")
         st.metric("Expected Monthly Savings", f"${expected_savings:,.2f}")
+        st.metric("Projected Monthly Savings", f"${projected_savings:,.2f}")
     with col2:
         st.metric("Estimated Spend (Budgeted Total):", f"${estimated_spend:,.2f}")
         st.metric("Total Monthly Expenses", f"${total_expenses:,.2f}")
+        st.metric("Forecast Spend (From History)", f"${forecast_spend:,.2f}")
 
     
     st.subheader("Spending by Category vs Budget")
-    # Create DataFrame from session state
-    budget_df = pd.DataFrame({
-        "Category": list(st.session_state.budget.keys()),
-        "Budgeted": list(st.session_state.budget.values())
-    })
-    
-    # Create actuals DataFrame from expenses
-    if not st.session_state.expenses.empty:
-        actual_df = (
-            st.session_state.expenses
-            .groupby("Category")["Amount"]
-            .sum()
-            .reset_index()
-            .rename(columns={"Amount": "Actual"})
+    with span("app.chart_prep"):
+        # Budgeted and actual amounts for every category in either, one row per (Category, Type)
+        categories = list(budget) + [cat for cat in actual_totals if cat not in budget]
+        stacked_df = pd.DataFrame({
+            "Category": categories * 2,
+            "Amount": [budget.get(cat, 0) for cat in categories] + [actual_totals.get(cat, 0) for cat in categories],
+            "Type": ["Budgeted"] * len(categories) + ["Actual"] * len(categories)
+        })
+
+        # Defining the stacking of the graph
+        category_order = sorted(
+            categories, key=lambda cat: budget.get(cat, 0) + actual_totals.get(cat, 0), reverse=True
         )
-    else:
-        actual_df = pd.DataFrame(columns=["Category", "Actual"])
-    
-    # Merge budget and actual
-    combined_df = pd.merge(budget_df, actual_df, on="Category", how="outer").fillna(0)
     
-    # Melt for two stacks: Budgeted and Actual
-    stacked_budget = combined_df[["Category", "Budgeted"]].copy()
-    stacked_budget["Type"] = "Budgeted"
-    stacked_budget = stacked_budget.rename(columns={"Budgeted": "Amount"})
-    
-    stacked_actual = combined_df[["Category", "Actual"]].copy()
-    stacked_actual["Type"] = "Actual"
-    stacked_actual = stacked_actual.rename(columns={"Actual": "Amount"})
-    
-    # Combine into one long dataframe
-    stacked_df = pd.concat([stacked_budget, stacked_actual])
-
-    # Defining the stacking of the graph
-    category_order = (
-        stacked_df.groupby("Category")["Amount"]
-        .sum()
-        .sort_values(ascending=False)
-        .index
-        .tolist()
-    )
-    
-    # Plot as a grouped, stacked bar chart by Type
-    chart = alt.Chart(stacked_df).mark_bar().encode(
-        x=alt.X('Type:N', title=None),  # 'Budgeted' and 'Actual'
-        y=alt.Y('Amount:Q', stack='zero', title='Total Spending ($)'),
-        color=alt.Color(
-            'Category:N',
-            title='Category',
-            sort=category_order  # <- this is safe now
-        ),
-        tooltip=['Category:N', 'Amount:Q']
-    ).properties(width=600, height=400)
+        # Plot as a grouped, stacked bar chart by Type; altair is only imported once a chart is drawn
+        import altair as alt
+        chart = alt.Chart(stacked_df).mark_bar().encode(
+            x=alt.X('Type:N', title=None),  # 'Budgeted' and 'Actual'
+            y=alt.Y('Amount:Q', stack='zero', title='Total Spending ($)'),
+            color=alt.Color(
+                'Category:N',
+                title='Category',
+                sort=category_order  # <- this is safe now
+            ),
+            tooltip=['Category:N', 'Amount:Q']
+        ).properties(width=600, height=400)
         
     st.altair_chart(chart, use_container_width=True)
 
     st.subheader("Detailed Expenses")
-    st.dataframe(st.session_state.expenses)
+    # Only the visible page is read from the database; counts and sums are computed in SQL
+    with st.expander("Filter and sort"):
+        col_dates, col_amounts = st.columns(2)
+        with col_dates:
+            browse_dates = st.date_input("Date range", value=(), key="browse_dates")
+            browse_categories = st.multiselect("Categories", BUDGET_CATEGORIES + ["Other"])
+        with col_amounts:
+            browse_min = st.number_input("Minimum amount ($)", min_value=0.0, value=0.0, step=10.0)
+            browse_max = st.number_input("Maximum amount ($, 0 for no limit)", min_value=0.0, value=0.0, step=10.0)
+        browse_search = st.text_input("Description contains", key="browse_search")
+        col_sort, col_order, col_size = st.columns(3)
+        browse_sort = col_sort.selectbox("Sort by", list(EXPENSE_SORT_COLUMNS))
+        browse_descending = col_order.selectbox("Order", ["Descending", "Ascending"]) == "Descending"
+        browse_page_size = col_size.selectbox("Rows per page", [25, 50, 100, 250], index=1)
+
+    browse_filters = ExpenseFilters(
+        start=browse_dates[0].isoformat() if len(browse_dates) > 0 else None,
+        # The picked end date is inclusive, the SQL bound is exclusive
+        end=(browse_dates[1] + datetime.timedelta(days=1)).isoformat() if len(browse_dates) > 1 else None,
+        categories=tuple(browse_categories),
+        min_amount=browse_min or None,
+        max_amount=browse_max or None,
+        search=browse_search.strip(),
+    )
+    # Cursors of the pages visited so far; any change of filter or sort starts over at page one
+    browse_key = (browse_filters, browse_sort, browse_descending, browse_page_size)
+    if st.session_state.get("browse_key") != browse_key:
+        st.session_state.browse_key = browse_key
+        st.session_state.browse_cursors = [None]
+    cursors = st.session_state.browse_cursors
+
+    expense_page = load_expense_page(
+        username, browse_filters, sort=browse_sort, descending=browse_descending,
+        after=cursors[-1], page_size=browse_page_size
+    )
+    first_row = (len(cursors) - 1) * browse_page_size
+    if expense_page.total_count:
+        st.dataframe(expense_page.expenses[EXPENSE_COLUMNS], hide_index=True)
+        st.caption(
+            f"Rows {first_row + 1:,}–{first_row + len(expense_page.expenses):,} of {expense_page.total_count:,} · "
+            f"this page ${expense_page.page_amount:,.2f} · all matching ${expense_page.total_amount:,.2f}"
+        )
+    else:
+        st.info("No expenses match these filters.")
+    col_prev, col_next, _ = st.columns([1, 1, 6])
+    if col_prev.button("◀ Previous", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    if col_next.button("Next ▶", disabled=expense_page.next_cursor is None):
+        cursors.append(expense_page.next_cursor)
+        st.rerun()
+
+    with st.expander("Export my expenses"):
+        export_format = st.radio("Format", ["CSV", "Parquet"], horizontal=True)
+        if st.button("Prepare export"):
+            buffer = io.BytesIO()
+            exported = export_user_data(username, buffer, export_format.lower())
+            st.download_button(
+                f"Download {exported:,} expenses", buffer.getvalue(),
+                file_name=f"finpal_expenses.{export_format.lower()}",
+                mime="text/csv" if export_format == "CSV" else "application/octet-stream"
+            )
 
     # Save
     if "budget" in st.session_state:
         persist_session(username)
+
+elif page == "Reports":
+    st.title("Reports")
+    # Reports are built by background workers; this page only queues them and polls for the results
+    report_kind = st.radio("Report", list(REPORT_KINDS), format_func=REPORT_KINDS.get, horizontal=True)
+    this_month = current_month_start()[:7]
+    if report_kind == "monthly":
+        report_period = st.selectbox("Month", month_range(shift_month(this_month, -23), this_month)[::-1])
+    else:
+        report_period = st.selectbox("Year", [str(int(this_month[:4]) - i) for i in range(5)])
+    report_format = st.radio("Format", list(REPORT_FORMATS), format_func=str.upper, horizontal=True)
+    if st.button("Generate report"):
+        report_job = get_report_queue().submit(username, report_kind, report_period, report_format)
+        if report_job.status == REPORT_DONE:
+            st.toast("Nothing changed since this report was last generated; it is ready below.")
+
+    report_pending = any(job.status in (REPORT_QUEUED, REPORT_RUNNING) for job in list_report_jobs(username))
+    if report_pending:
+        # Starting the queue requeues jobs a previous process left running and dispatches queued ones
+        get_report_queue()
+
+    # Only this part reruns while a report is being generated
+    @st.fragment(run_every=REPORT_POLL_SECONDS if report_pending else None)
+    def report_status():
+        recent_jobs = list_report_jobs(username)
+        if not recent_jobs:
+            st.info("No reports yet.")
+        for job in recent_jobs:
+            col_label, col_status = st.columns([3, 2])
+            col_label.write(f"{REPORT_KINDS[job.kind]}, {job.period} ({job.format.upper()})")
+            if job.status == REPORT_DONE:
+                col_status.download_button(
+                    "Download", load_report_result(username, job.id), key=f"report_download_{job.id}",
+                    file_name=f"finpal_{job.kind}_{job.period}.{job.format}", mime=REPORT_FORMATS[job.format]
+                )
+            elif job.status == REPORT_FAILED:
+                col_status.error(job.error)
+            else:
+                col_status.caption(f"{job.status.capitalize()}…")
+        # Stop polling once everything has finished
+        if report_pending and not any(job.status in (REPORT_QUEUED, REPORT_RUNNING) for job in recent_jobs):
+            st.rerun()
+
+    st.subheader("Recent reports")
+    report_status()
+
+rerun_timer.finish()
+st.session_state.rerun_timer = None
+
+if username in ADMIN_USERS:
+    with st.sidebar.expander("Performance (admin)"):
+        timing_on = st.checkbox("Record stage timings", value=instrumentation.is_enabled())
+        if timing_on and not instrumentation.is_enabled():
+            instrumentation.enable()
+        elif not timing_on and instrumentation.is_enabled():
+            instrumentation.disable()
+        if rerun_timer.spans:
+            st.caption("This rerun")
+            st.dataframe(
+                pd.DataFrame(rerun_timer.spans, columns=["Stage", "Seconds"]).groupby("Stage", sort=False).sum()
+            )
+        stats = instrumentation.snapshot()
+        if stats:
+            st.caption("All sessions since start (seconds)")
+            st.dataframe(
+                pd.DataFrame(stats).T[["count", "mean", "p50", "p95", "max"]]
+            )
+            metrics_path = st.text_input("Metrics file (.json or .prom)", value="user_data/metrics.prom")
+            if st.button("Write metrics file"):
+                st.success(f"Wrote {instrumentation.dump_metrics(metrics_path)}")
+        if st.button("Profile next rerun"):
+            st.session_state.profile_next_rerun = True
+            st.rerun()
+        if rerun_timer.profile_text:
+            st.caption(f"cProfile of this rerun, saved to {rerun_timer.profile_path}")
+            st.code(rerun_timer.profile_text)
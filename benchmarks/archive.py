@@ -0,0 +1,94 @@
+"""Benchmark full-history analytics on the Parquet archive against the SQLite path.
+
+Saves a synthetic expense history for one user, runs the same analytical query
+(spending per month and category) through the original route (load_user_data
+into pandas) and through the column-pruned, memory-mapped archive, and times
+archiving, the unified reader and exports. Run from the repository root:
+
+    python -m benchmarks.archive --rows 100000 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import pyarrow.compute as pc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db_manager  # noqa: E402
+from benchmarks.categorization import timed  # noqa: E402
+from benchmarks.synthetic import HISTORY_DAYS, HISTORY_START, synthetic_expenses  # noqa: E402
+
+BENCH_USER = "archive_bench"
+
+
+def monthly_totals_sqlite(username):
+    """The pre-archive route: the whole history through load_user_data, then a pandas groupby."""
+    expenses = db_manager.load_user_data(username)["expenses"].to_frame()
+    return expenses.groupby([expenses["Date"].str[:7], "Category"], observed=True)["Amount"].sum()
+
+
+def monthly_totals_sql(username):
+    return db_manager.get_connection().execute(
+        "SELECT substr(date, 1, 7), category, SUM(amount) FROM expenses WHERE username = ? GROUP BY 1, 2",
+        (username,)
+    ).fetchall()
+
+
+def monthly_totals_archive(username):
+    table = db_manager.load_archived_expenses(username, columns=["date", "amount", "category"])
+    table = table.append_column("month", pc.utf8_slice_codeunits(table.column("date"), 0, 7))
+    return table.group_by(["month", "category"]).aggregate([("amount", "sum")])
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    # Everything but the last month of the synthetic history is closed and gets archived
+    archive_before = (
+        db_manager.pd.Timestamp(HISTORY_START) + db_manager.pd.Timedelta(days=HISTORY_DAYS)
+    ).replace(day=1).date().isoformat()
+
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_manager.close_connections()
+            db_manager.DB_PATH = os.path.join(tmp, "archive_bench.db")
+            db_manager.ARCHIVE_DIR = os.path.join(tmp, "archive")
+            db_manager.save_user_data(BENCH_USER, {
+                "budget": {}, "income": 85000, "state": "NY",
+                "expenses": synthetic_expenses(rows, with_ids=False),
+            })
+            db_size = os.path.getsize(db_manager.DB_PATH)
+
+            _, sqlite_seconds = timed(monthly_totals_sqlite, BENCH_USER)
+            _, sql_seconds = timed(monthly_totals_sql, BENCH_USER)
+            archived, archive_seconds = timed(db_manager.archive_closed_months, BENCH_USER, archive_before)
+            _, parquet_seconds = timed(monthly_totals_archive, BENCH_USER)
+            history, history_seconds = timed(db_manager.load_expense_history, BENCH_USER)
+            _, csv_seconds = timed(db_manager.export_user_data, BENCH_USER, os.path.join(tmp, "export.csv"))
+            _, parquet_export_seconds = timed(
+                db_manager.export_user_data, BENCH_USER, os.path.join(tmp, "export.parquet")
+            )
+
+            print(f"rows: {rows:,} ({archived:,} archived)")
+            print(f"  monthly totals, load_user_data + pandas: {sqlite_seconds * 1000:>9.1f} ms")
+            print(f"  monthly totals, SQL GROUP BY:            {sql_seconds * 1000:>9.1f} ms")
+            print(f"  monthly totals, Parquet archive:         {parquet_seconds * 1000:>9.1f} ms "
+                  f"({sqlite_seconds / parquet_seconds:.1f}x)")
+            print(f"  archive closed months (one-off):         {archive_seconds * 1000:>9.1f} ms")
+            print(f"  unified history read ({len(history):,} rows):  {history_seconds * 1000:>9.1f} ms")
+            print(f"  export CSV / Parquet:                    {csv_seconds * 1000:>9.1f} / "
+                  f"{parquet_export_seconds * 1000:.1f} ms")
+            print(f"  size SQLite before / archive:            {db_size / 1e6:>9.1f} / "
+                  f"{directory_size(db_manager.ARCHIVE_DIR) / 1e6:.1f} MB")
+    db_manager.close_connections()
+
+
+if __name__ == "__main__":
+    main()
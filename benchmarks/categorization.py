@@ -0,0 +1,62 @@
+"""Benchmark the compiled categorization RuleEngine against the original if-chain.
+
+Generates synthetic bank descriptions, checks both implementations agree and
+prints their timings. Run from the repository root:
+
+    python -m benchmarks.categorization --rows 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.synthetic import synthetic_descriptions  # noqa: E402
+from utils.categorization import RuleEngine, load_rules  # noqa: E402
+
+
+def legacy_categorize_expense(description):
+    """The keyword chain categorization used before the rule engine."""
+    description = str(description).lower()
+    if any(x in description for x in ['rent', 'apartment', 'lease']): return "Rent"
+    if any(x in description for x in ['grocery', 'whole foods', 'supermarket']): return "Groceries"
+    if any(x in description for x in ['uber', 'lyft', 'metro', 'transit', 'gas']): return "Transportation"
+    if any(x in description for x in ['restaurant', 'cafe', 'chipotle', 'mcdonald']): return "Dining Out"
+    if any(x in description for x in ['netflix', 'spotify', 'subscription']): return "Subscriptions"
+    if any(x in description for x in ['insurance']): return "Insurance"
+    if any(x in description for x in ['entertainment', 'movie', 'concert']): return "Entertainment"
+    if any(x in description for x in ['electric', 'water', 'coned', 'utility']): return "Utilities"
+    return "Other"
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    descriptions = synthetic_descriptions(args.rows)
+    rules = load_rules()
+    # Only the rules the legacy chain knows about, so results are comparable
+    legacy_rules = rules[rules["category"] != "Gym"]
+    legacy_rules = legacy_rules[legacy_rules["category"] != "Internet"]
+
+    engine, compile_seconds = timed(RuleEngine, legacy_rules)
+    legacy, legacy_seconds = timed(lambda s: s.apply(legacy_categorize_expense), descriptions)
+    compiled, compiled_seconds = timed(engine.categorize, descriptions)
+    mismatches = int((legacy.to_numpy() != compiled.to_numpy()).sum())
+
+    print(f"rows:             {args.rows:,}")
+    print(f"compile rules:    {compile_seconds * 1000:.2f} ms")
+    print(f"legacy apply:     {legacy_seconds:.3f} s")
+    print(f"rule engine:      {compiled_seconds:.3f} s  ({legacy_seconds / compiled_seconds:.1f}x)")
+    print(f"mismatches:       {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Import-time and cold-start report for a new FinPal server process.
+
+Every measurement runs in a fresh interpreter so nothing is already imported
+or cached. It reports the slowest imports (from ``python -X importtime``), the
+first-use cost of the lazily loaded reference data, and the time until a new
+session's login page is rendered. Run from the repository root:
+
+    python -m benchmarks.cold_start --top 15
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_MODULES = ["utils.data_processing", "db_manager", "user_auth_storage"]
+
+# Runs in the child interpreter; prints one JSON object of phase timings
+PHASES_SCRIPT = """
+import json, os, sys, time
+timings = {}
+def phase(name, fn):
+    start = time.perf_counter()
+    fn()
+    timings[name] = time.perf_counter() - start
+phase("import app modules", lambda: [__import__(m) for m in %(modules)r])
+import db_manager
+from utils import tax_brackets
+from utils.data_processing import calculate_taxes
+db_manager.DB_PATH = %(db_path)r
+phase("bracket registry", tax_brackets.get_registry)
+phase("first calculate_taxes", lambda: calculate_taxes(85000, "NY", nyc=True))
+phase("init_db", db_manager.init_db)
+phase("credential lookup", lambda: db_manager.load_credential("test"))
+print(json.dumps(timings))
+"""
+
+# AppTest runs app.py in this interpreter, so pointing the already imported modules
+# at the temporary directory keeps the app from touching user_data
+FIRST_PAINT_SCRIPT = """
+import json, os, time
+import db_manager, user_auth_storage
+from utils import instrumentation
+from streamlit.testing.v1 import AppTest
+db_manager.DB_PATH = os.path.join(%(tmp)r, "cold_start.db")
+db_manager.ARCHIVE_DIR = os.path.join(%(tmp)r, "archive")
+user_auth_storage.AUTH_KEY_PATH = os.path.join(%(tmp)r, "auth_key")
+instrumentation.PROFILE_DIR = os.path.join(%(tmp)r, "profiles")
+start = time.perf_counter()
+app = AppTest.from_file("app.py", default_timeout=120).run()
+first = time.perf_counter() - start
+start = time.perf_counter()
+app.run()
+print(json.dumps({"first paint": first, "warm rerun": time.perf_counter() - start}))
+"""
+
+
+def run_child(code, env=None, *flags):
+    result = subprocess.run(
+        [sys.executable, *flags, "-c", code], cwd=ROOT, capture_output=True, text=True,
+        env={**os.environ, **(env or {})}
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "child failed")
+    return result
+
+
+def import_times(top):
+    """Slowest imports as ``(cumulative_us, self_us, module)``, heaviest first."""
+    stderr = run_child(f"import {', '.join(APP_MODULES)}", None, "-X", "importtime").stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((int(cumulative_us), int(self_us), module.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def phase_times(bracket_cache=None):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {"FINPAL_BRACKET_CACHE": bracket_cache} if bracket_cache else None
+        code = PHASES_SCRIPT % {"modules": APP_MODULES, "db_path": os.path.join(tmp, "cold_start.db")}
+        return json.loads(run_child(code, env).stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=15, help="number of imports to list")
+    parser.add_argument("--skip-first-paint", action="store_true", help="do not render app.py with AppTest")
+    args = parser.parse_args()
+
+    print(f"Slowest imports of {', '.join(APP_MODULES)}:")
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    for cumulative_us, self_us, module in import_times(args.top):
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>8.1f}  {module}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bracket_cache = os.path.join(tmp, "bracket_registry.pkl")
+        run_child(f"from utils import tax_brackets; tax_brackets.compile_registry({bracket_cache!r})")
+        from_csv, compiled = phase_times(), phase_times(bracket_cache)
+    print(f"\n{'cold-start phase':<24} {'CSV ms':>8} {'compiled ms':>12}")
+    for name in from_csv:
+        print(f"{name:<24} {from_csv[name] * 1000:>8.1f} {compiled[name] * 1000:>12.1f}")
+
+    if not args.skip_first_paint:
+        with tempfile.TemporaryDirectory() as tmp:
+            paint = json.loads(run_child(FIRST_PAINT_SCRIPT % {"tmp": tmp}).stdout.strip().splitlines()[-1])
+        print(f"\nnew session login page: {paint['first paint'] * 1000:.0f} ms cold, "
+              f"{paint['warm rerun'] * 1000:.0f} ms warm rerun")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Multi-threaded stress test for the pooled SQLite layer in db_manager.
+
+Each simulated session repeats what a Streamlit rerun does: load the user's
+data, add an expense and persist the session. Run from the repository root:
+
+    python -m benchmarks.db_stress --sessions 1 8 32 --rounds 50
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db_manager  # noqa: E402
+
+
+def simulate_session(username, rounds, errors):
+    try:
+        snapshot = None
+        for i in range(rounds):
+            user_data = db_manager.load_user_data(username)
+            expenses = user_data["expenses"].to_frame() if user_data else pd.DataFrame(
+                columns=[db_manager.EXPENSE_ID] + db_manager.EXPENSE_COLUMNS
+            )
+            new_expense = pd.DataFrame(
+                [[datetime.date(2024, 1, 1 + i % 28), 10.0 + i, "Groceries", f"stress {i}"]],
+                columns=db_manager.EXPENSE_COLUMNS
+            )
+            expenses = pd.concat([expenses, new_expense], ignore_index=True)
+            saved = db_manager.save_user_data(username, {
+                "budget": {"Groceries": 400},
+                "income": 85000,
+                "state": "NY",
+                "expenses": expenses,
+            }, snapshot=snapshot)
+            snapshot = db_manager.expense_fingerprints(saved)
+    except Exception as e:
+        errors.append(f"{username}: {e}")
+
+
+def run(sessions, rounds):
+    errors = []
+    threads = [
+        threading.Thread(target=simulate_session, args=(f"stress_user_{i}", rounds, errors))
+        for i in range(sessions)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--rounds", type=int, default=25, help="reruns per simulated session")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'sessions':>8} {'reruns':>8} {'seconds':>8} {'reruns/s':>9} {'errors':>7}")
+        for sessions in args.sessions:
+            db_manager.close_connections()
+            db_manager.DB_PATH = os.path.join(tmp, f"stress_{sessions}.db")
+            db_manager.init_db()
+            elapsed, errors = run(sessions, args.rounds)
+            total = sessions * args.rounds
+            print(f"{sessions:>8} {total:>8} {elapsed:>8.2f} {total / elapsed:>9.1f} {len(errors):>7}")
+            for error in errors[:5]:
+                print(f"    {error}")
+        db_manager.close_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Compare per-transaction memory of ExpenseStore with the object-dtype session DataFrame.
+
+Builds the same synthetic expenses both ways: the DataFrame the session used to
+hold (grown with pd.concat, so every column is object dtype) and the compact
+ExpenseStore. Run from the repository root:
+
+    python -m benchmarks.expense_memory --rows 1000 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.synthetic import synthetic_expenses  # noqa: E402
+from utils.expense_store import EXPENSE_COLUMNS, EXPENSE_ID, ExpenseStore  # noqa: E402
+
+
+def legacy_frame(expenses):
+    """The session layout before ExpenseStore: rows appended to an empty object frame."""
+    empty = pd.DataFrame(columns=[EXPENSE_ID] + EXPENSE_COLUMNS)
+    return pd.concat([empty, expenses], ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 100_000])
+    parser.add_argument("--appends", type=int, default=2_000, help="single-row appends to time")
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'frame B/tx':>11} {'store B/tx':>11} {'ratio':>6}")
+    for rows in args.rows:
+        expenses = synthetic_expenses(rows)
+        frame_bytes = legacy_frame(expenses).memory_usage(deep=True).sum()
+        store = ExpenseStore.from_frame(expenses)
+        store_bytes = store.memory_usage()
+        print(f"{rows:>9,} {frame_bytes / rows:>11.1f} {store_bytes / rows:>11.1f} {frame_bytes / store_bytes:>6.1f}")
+
+    new_rows = synthetic_expenses(args.appends, seed=1).drop(columns=EXPENSE_ID)
+    frame = legacy_frame(synthetic_expenses(0))
+    start = time.perf_counter()
+    for row in new_rows.itertuples(index=False):
+        frame = pd.concat([frame, pd.DataFrame([row], columns=EXPENSE_COLUMNS)], ignore_index=True)
+    concat_seconds = time.perf_counter() - start
+    store = ExpenseStore()
+    start = time.perf_counter()
+    for row in new_rows.itertuples(index=False):
+        store.append(*row)
+    append_seconds = time.perf_counter() - start
+    print(f"\n{args.appends:,} single-row appends: concat {concat_seconds:.2f} s, ExpenseStore {append_seconds:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Check and time PDF statement parsing on generated sample statements.
+
+Writes a synthetic PDF statement (see benchmarks.synthetic.write_pdf_statement)
+for every requested page count, checks that parsing it gives back exactly the
+transactions it was generated from, and times text extraction with one worker
+and with ``--workers`` processes, then re-parsing from the in-memory text cache. Exits with status 1 if any statement parses wrong. Run from
+the repository root:
+
+    python -m benchmarks.pdf_statements --pages 20 200 --workers 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.categorization import timed  # noqa: E402
+from benchmarks.synthetic import PDF_ROWS_PER_PAGE, synthetic_bank_statement, write_pdf_statement  # noqa: E402
+from utils import pdf_statements  # noqa: E402
+from utils.data_processing import normalize_dates  # noqa: E402
+
+
+def parse_cold(path, workers):
+    pdf_statements.clear_pdf_text_cache()
+    return pdf_statements.parse_pdf_statement(path, workers=workers)
+
+
+def check(parsed, rows):
+    """Differences between a parsed statement and the transactions it was generated from."""
+    expected = synthetic_bank_statement(rows)
+    expected["Date"] = normalize_dates(expected["Date"])
+    problems = []
+    if len(parsed) != rows:
+        problems.append(f"{len(parsed):,} rows parsed, expected {rows:,}")
+    else:
+        for column in ["Date", "Amount", "Description"]:
+            mismatched = (parsed[column].to_numpy() != expected[column].to_numpy()).sum()
+            if mismatched:
+                problems.append(f"{mismatched:,} rows with the wrong {column}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[20, 200])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        # Start the shared pool up front so its spawn cost is not counted against the first file
+        pdf_statements._get_pool(args.workers).submit(os.getpid).result()
+        for pages in args.pages:
+            rows = pages * PDF_ROWS_PER_PAGE
+            path = write_pdf_statement(os.path.join(tmp, f"statement_{pages}.pdf"), rows)
+            parsed, serial_seconds = timed(parse_cold, path, 1)
+            _, parallel_seconds = timed(parse_cold, path, args.workers)
+            _, cached_seconds = timed(pdf_statements.parse_pdf_statement, path)
+            problems = check(parsed, rows)
+            failed = failed or bool(problems)
+
+            print(f"pages: {pages:,} ({rows:,} transactions) {'FAILED' if problems else 'parsed correctly'}")
+            for problem in problems:
+                print(f"  {problem}")
+            print(f"  1 worker:             {serial_seconds * 1000:>9.1f} ms ({pages / serial_seconds:,.0f} pages/s)")
+            print(f"  {args.workers} workers:{' ' * (13 - len(str(args.workers)))}{parallel_seconds * 1000:>9.1f} ms "
+                  f"({serial_seconds / parallel_seconds:.1f}x)")
+            print(f"  cached text:          {cached_seconds * 1000:>9.1f} ms")
+    pdf_statements.clear_pdf_text_cache()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Benchmark background report generation against building reports on the script thread.
+
+Saves a synthetic expense history for several users, then times what a rerun
+pays to build a year-end summary inline, to queue it with report_jobs, and to
+queue it again while nothing has changed (a cache hit), plus how long a burst
+of jobs from every user takes to drain with the per-user cap. Run from the
+repository root:
+
+    python -m benchmarks.reports --rows 100000 --users 4 --workers 2
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db_manager  # noqa: E402
+import report_jobs  # noqa: E402
+from benchmarks.categorization import timed  # noqa: E402
+from benchmarks.synthetic import HISTORY_START, synthetic_expenses  # noqa: E402
+from utils.reports import render_report  # noqa: E402
+from utils.spend_forecast import month_range  # noqa: E402
+
+BENCH_YEAR = HISTORY_START[:4]
+
+
+def build_inline(username):
+    return render_report(db_manager.load_report(username, "year_end", BENCH_YEAR), "html")
+
+
+def drain(jobs):
+    for job in jobs:
+        report_jobs.wait_for_report(job.username, job.id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000, help="expenses per user")
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=report_jobs.REPORT_WORKERS)
+    args = parser.parse_args()
+
+    users = [f"report_bench_{i}" for i in range(args.users)]
+    with tempfile.TemporaryDirectory() as tmp:
+        db_manager.close_connections()
+        db_manager.DB_PATH = os.path.join(tmp, "report_bench.db")
+        db_manager.ARCHIVE_DIR = os.path.join(tmp, "archive")
+        for i, username in enumerate(users):
+            db_manager.save_user_data(username, {
+                "budget": {}, "income": 85000, "state": "NY", "tax_summary": {"net_income": 65000},
+                "expenses": synthetic_expenses(args.rows, seed=i, with_ids=False),
+            })
+
+        queue = report_jobs.ReportJobQueue(workers=args.workers)
+        _, inline_seconds = timed(build_inline, users[0])
+        job, submit_seconds = timed(queue.submit, users[0], "year_end", BENCH_YEAR, "html")
+        report_jobs.wait_for_report(users[0], job.id)
+        cached, cached_seconds = timed(queue.submit, users[0], "year_end", BENCH_YEAR, "html")
+        assert cached.id == job.id and cached.status == db_manager.REPORT_DONE
+
+        # Every user asks for each month of the year at once; each runs one at a time
+        start = time.perf_counter()
+        burst = [queue.submit(username, "monthly", month, "csv")
+                 for username in users for month in month_range(f"{BENCH_YEAR}-01", f"{BENCH_YEAR}-12")]
+        drain(burst)
+        burst_seconds = time.perf_counter() - start
+        queue.shutdown()
+
+        print(f"users: {args.users}, rows per user: {args.rows:,}, workers: {args.workers}")
+        print(f"  year-end summary built inline:     {inline_seconds * 1000:>9.1f} ms")
+        print(f"  year-end summary queued:           {submit_seconds * 1000:>9.1f} ms")
+        print(f"  queued again, unchanged (cached):  {cached_seconds * 1000:>9.1f} ms")
+        print(f"  {len(burst)} monthly reports, queued to done: {burst_seconds * 1000:>9.1f} ms "
+              f"({burst_seconds / len(burst) * 1000:.1f} ms each)")
+    db_manager.close_connections()
+
+
+if __name__ == "__main__":
+    main()
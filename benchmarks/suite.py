@@ -0,0 +1,250 @@
+"""Offline benchmark suite for the tax, ingestion, categorization and persistence hot paths.
+
+Each case runs on seeded synthetic data (see benchmarks.synthetic) at every
+requested size and is timed ``--repeat`` times; the best and median wall times
+are written as JSON. Given a ``--baseline`` JSON from an earlier run, cases
+whose best time grew by more than their threshold are reported as regressions
+and the exit status is 1. Run from the repository root:
+
+    python -m benchmarks.suite --sizes 1000 100000 1000000 --output bench.json
+    python -m benchmarks.suite --baseline bench.json --threshold 0.2 --case-threshold save_user_data=0.5
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db_manager  # noqa: E402
+from benchmarks.synthetic import (  # noqa: E402
+    STATE_CODES, synthetic_descriptions, synthetic_expenses, synthetic_users, write_bank_statement
+)
+from utils import data_processing, tax_scenarios  # noqa: E402
+from utils.data_processing import (  # noqa: E402
+    calculate_taxes, calculate_taxes_batch, categorize_expense, categorize_expenses, parse_bank_statement
+)
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+DEFAULT_THRESHOLD = 0.20
+# Row-at-a-time cases are capped so the 1M size finishes in minutes, not hours
+SCALAR_ROW_CAP = 20_000
+BENCH_USER = "bench_user"
+
+
+class Case:
+    """A benchmark: ``setup(rows, tmp)`` builds inputs untimed, ``run(inputs)`` is timed.
+
+    ``rows(size)`` is the number of rows one run actually processes.
+    """
+
+    def __init__(self, name, setup, run, rows=None):
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.rows = rows or (lambda size: size)
+
+
+def _setup_users(size, tmp):
+    return synthetic_users(size)
+
+
+def _scalar_taxes(users):
+    columns = ["annual_income", "selected_state", "nyc_resident"]
+    for income, state, nyc in users[columns].head(SCALAR_ROW_CAP).itertuples(index=False, name=None):
+        calculate_taxes(income, state, nyc)
+
+
+def _setup_all_states(size, tmp):
+    incomes = np.linspace(20_000, 400_000, max(size // len(STATE_CODES), 1))
+    return [(income, state, state == "NY") for state in STATE_CODES for income in incomes][:SCALAR_ROW_CAP]
+
+
+def _sweep_uncached(points):
+    tax_scenarios.clear_scenario_cache()
+    return tax_scenarios.tax_scenarios(STATE_CODES, (False, True), points=points)
+
+
+def _setup_statement(size, tmp):
+    return write_bank_statement(os.path.join(tmp, f"statement_{size}.csv"), size)
+
+
+def _parse_uncached(path):
+    with data_processing._parse_cache_lock:
+        data_processing._parse_cache.clear()
+    return parse_bank_statement(path)
+
+
+def _setup_descriptions(size, tmp):
+    return synthetic_descriptions(size)
+
+
+def _use_database(tmp, name):
+    db_manager.close_connections()
+    db_manager.DB_PATH = os.path.join(tmp, name)
+    db_manager.init_db()
+
+
+def _user_data(expenses):
+    return {"budget": {"Groceries": 400}, "income": 85000, "state": "NY", "expenses": expenses}
+
+
+def _setup_save(size, tmp):
+    _use_database(tmp, f"save_{size}.db")
+    return synthetic_expenses(size, with_ids=False)
+
+
+def _save_fresh(expenses):
+    with db_manager.transaction() as cursor:
+        cursor.execute("DELETE FROM expenses WHERE username = ?", (BENCH_USER,))
+    db_manager.save_user_data(BENCH_USER, _user_data(expenses))
+
+
+def _setup_saved_history(size, tmp):
+    _use_database(tmp, f"load_{size}.db")
+    db_manager.save_user_data(BENCH_USER, _user_data(synthetic_expenses(size, with_ids=False)))
+    return BENCH_USER
+
+
+def _summary(username):
+    """The Track Expenses summary: per-category totals for one month and for all history."""
+    month = db_manager.load_user_data(username, start="2024-06-01", end="2024-07-01")["expenses"]
+    return db_manager.load_category_totals(username, "2024-06"), db_manager.load_category_totals(username), month
+
+
+CASES = [
+    Case("calculate_taxes_all_states", _setup_all_states,
+         lambda rows: [calculate_taxes(*row) for row in rows], lambda size: min(size, SCALAR_ROW_CAP)),
+    Case("calculate_taxes_scalar", _setup_users, _scalar_taxes, lambda size: min(size, SCALAR_ROW_CAP)),
+    Case("calculate_taxes_batch", _setup_users, calculate_taxes_batch),
+    # Every state (plus NY with NYC tax) over an income grid of size / 50 points
+    Case("tax_scenario_sweep", lambda size, tmp: max(size // len(STATE_CODES), 2), _sweep_uncached,
+         lambda size: (len(STATE_CODES) + 1) * max(size // len(STATE_CODES), 2)),
+    Case("parse_bank_statement", _setup_statement, _parse_uncached),
+    Case("categorize_expense", _setup_descriptions,
+         lambda descriptions: [categorize_expense(d) for d in descriptions.head(SCALAR_ROW_CAP)],
+         lambda size: min(size, SCALAR_ROW_CAP)),
+    Case("categorize_expenses", _setup_descriptions, categorize_expenses),
+    Case("save_user_data", _setup_save, _save_fresh),
+    Case("load_user_data", _setup_saved_history, db_manager.load_user_data),
+    Case("summary_aggregation", _setup_saved_history, _summary),
+    Case("load_expense_page", _setup_saved_history, db_manager.load_expense_page,
+         lambda size: min(size, db_manager.EXPENSE_PAGE_SIZE)),
+]
+
+
+def run_case(case, size, repeat, tmp):
+    inputs = case.setup(size, tmp)
+    case.run(inputs)  # warm-up: imports, compiled rules, bracket registry
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        case.run(inputs)
+        timings.append(time.perf_counter() - start)
+    rows = case.rows(size)
+    best = min(timings)
+    return {
+        "case": case.name,
+        "size": size,
+        "rows": rows,
+        "best_s": best,
+        "median_s": statistics.median(timings),
+        "rows_per_s": rows / best if best else None,
+    }
+
+
+def run_suite(sizes, repeat, case_names=None):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            for case in CASES:
+                if case_names and case.name not in case_names:
+                    continue
+                result = run_case(case, size, repeat, tmp)
+                results[f"{case.name}@{size}"] = result
+                print(f"{case.name:<28} {size:>9,} {result['best_s'] * 1000:>10.1f} ms "
+                      f"{result['rows_per_s'] or 0:>14,.0f} rows/s", flush=True)
+        db_manager.close_connections()
+    return {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "repeat": repeat,
+            "sizes": sizes,
+        },
+        "results": results,
+    }
+
+
+def compare(report, baseline, threshold, case_thresholds):
+    """Cases slower than the baseline by more than their threshold, as ``(key, ratio, limit)``."""
+    regressions = []
+    for key, result in report["results"].items():
+        previous = baseline.get("results", {}).get(key)
+        if previous is None or not previous["best_s"]:
+            continue
+        limit = case_thresholds.get(result["case"], threshold)
+        ratio = result["best_s"] / previous["best_s"]
+        if ratio > 1 + limit:
+            regressions.append((key, ratio, limit))
+    return regressions
+
+
+def _case_threshold(text):
+    name, _, value = text.partition("=")
+    if not value:
+        raise argparse.ArgumentTypeError("expected CASE=FRACTION, e.g. save_user_data=0.5")
+    return name, float(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cases", nargs="+", choices=[case.name for case in CASES], help="only run these cases")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown of the best time, as a fraction (0.2 = 20%%)")
+    parser.add_argument("--case-threshold", type=_case_threshold, action="append", default=[],
+                        metavar="CASE=FRACTION", help="per-case override of --threshold")
+    args = parser.parse_args()
+
+    print(f"{'case':<28} {'size':>9} {'best':>13} {'throughput':>21}")
+    report = run_suite(args.sizes, args.repeat, args.cases)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold, dict(args.case_threshold))
+        report["regressions"] = [
+            {"key": key, "ratio": ratio, "threshold": limit} for key, ratio, limit in regressions
+        ]
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+            for key, ratio, limit in regressions:
+                print(f"  {key:<40} {ratio:.2f}x slower (allowed {1 + limit:.2f}x)")
+        else:
+            print(f"\nNo regressions against {args.baseline}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
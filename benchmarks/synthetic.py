@@ -0,0 +1,168 @@
+"""Seeded synthetic data for the benchmarks: users, bank statement CSVs and PDFs and expense histories.
+
+Every generator takes a ``seed`` so runs are reproducible. It can also be used
+on its own to write a dataset to disk:
+
+    python -m benchmarks.synthetic --rows 100000 --out /tmp/finpal_data
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.categorization import BUDGET_CATEGORIES  # noqa: E402
+from utils.expense_store import EXPENSE_COLUMNS, EXPENSE_ID  # noqa: E402
+
+MERCHANTS = [
+    "RENT PAYMENT APT 4B", "WHOLE FOODS MARKET #10234", "UBER *TRIP", "LYFT RIDE", "SHELL GAS STATION",
+    "CHIPOTLE 1234", "MCDONALD'S F1234", "NETFLIX.COM", "SPOTIFY USA", "GEICO INSURANCE", "AMC MOVIE THEATRE",
+    "CONED ENERGY BILL", "CITY WATER UTILITY", "AMAZON MKTPLACE", "TARGET T-1234", "VENMO PAYMENT",
+    "STARBUCKS CAFE", "MTA METRO CARD", "TICKETMASTER CONCERT", "CVS PHARMACY",
+]
+STATE_CODES = [
+    'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'FL', 'GA', 'HI', 'ID', 'IL', 'IN', 'IA', 'KS', 'KY', 'LA',
+    'ME', 'MD', 'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ', 'NM', 'NY', 'NC', 'ND', 'OH', 'OK',
+    'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY'
+]
+HISTORY_START = "2023-01-01"
+HISTORY_DAYS = 730
+
+
+def synthetic_descriptions(rows, seed=0):
+    """Merchant names with a per-transaction reference suffix, as most banks export them.
+
+    References are drawn from a large range, so nearly every description is
+    distinct, as in a real statement.
+    """
+    rng = np.random.default_rng(seed)
+    merchants = rng.choice(np.array(MERCHANTS, dtype=object), rows)
+    refs = rng.integers(0, 1_000_000_000, rows).astype(str)
+    return pd.Series(merchants + " REF" + refs.astype(object))
+
+
+def synthetic_users(rows, seed=0):
+    """Users in the shape of the users table: income, state and NYC residency."""
+    rng = np.random.default_rng(seed)
+    states = rng.choice(np.array(STATE_CODES, dtype=object), rows)
+    return pd.DataFrame({
+        "username": [f"user_{i}" for i in range(rows)],
+        "annual_income": np.round(rng.lognormal(11.2, 0.6, rows), 2),
+        "selected_state": states,
+        "nyc_resident": (states == "NY") & (rng.random(rows) < 0.4),
+    })
+
+
+def synthetic_dates(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    days = np.sort(rng.integers(0, HISTORY_DAYS, rows))
+    return (pd.Timestamp(HISTORY_START) + pd.to_timedelta(days, unit="D")).strftime("%Y-%m-%d")
+
+
+def synthetic_bank_statement(rows, seed=0):
+    """A bank export: US-style dates, signed amounts and raw descriptions, no categories."""
+    rng = np.random.default_rng(seed)
+    dates = pd.to_datetime(synthetic_dates(rows, seed)).strftime("%m/%d/%Y")
+    return pd.DataFrame({
+        "Date": dates,
+        "Amount": np.round(rng.uniform(1, 500, rows), 2),
+        "Description": synthetic_descriptions(rows, seed).to_numpy(),
+    })
+
+
+def write_bank_statement(path, rows, seed=0):
+    synthetic_bank_statement(rows, seed).to_csv(path, index=False)
+    return path
+
+
+PDF_ROWS_PER_PAGE = 45
+# x positions of the Date, Description, Amount and Balance columns, in points
+PDF_COLUMNS = (40, 110, 430, 510)
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _pdf_page(rows, page, pages):
+    """Content stream of one statement page; every cell is its own text run, as banks lay them out."""
+    y = 740
+    ops = ["BT", "/F1 12 Tf", f"1 0 0 1 40 {y + 20} Tm ({_pdf_escape(f'Statement page {page} of {pages}')}) Tj",
+           "/F1 9 Tf"]
+    for cells in [("Date", "Description", "Amount", "Balance")] + rows:
+        for x, text in zip(PDF_COLUMNS, cells):
+            ops.append(f"1 0 0 1 {x} {y} Tm ({_pdf_escape(text)}) Tj")
+        y -= 15
+    ops.append("ET")
+    return "\n".join(ops).encode("latin-1")
+
+
+def _pdf_document(contents):
+    """A minimal PDF 1.4 file with one Helvetica page per content stream."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for content in contents:
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+    out, offsets = bytearray(b"%PDF-1.4\n"), []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def write_pdf_statement(path, rows, seed=0, rows_per_page=PDF_ROWS_PER_PAGE):
+    """The synthetic_bank_statement as a paged PDF, with a running balance column after the amount."""
+    statement = synthetic_bank_statement(rows, seed)
+    balance = 10_000 - statement["Amount"].cumsum()
+    cells = list(zip(
+        statement["Date"], statement["Description"],
+        statement["Amount"].map("{:,.2f}".format), balance.map("{:,.2f}".format),
+    ))
+    pages = max(-(-rows // rows_per_page), 1)
+    contents = [_pdf_page(cells[i * rows_per_page:(i + 1) * rows_per_page], i + 1, pages) for i in range(pages)]
+    with open(path, "wb") as f:
+        f.write(_pdf_document(contents))
+    return path
+
+
+def synthetic_expenses(rows, seed=0, with_ids=True):
+    """An expense history in the session layout, sorted by date."""
+    rng = np.random.default_rng(seed)
+    expenses = pd.DataFrame({
+        "Date": synthetic_dates(rows, seed),
+        "Amount": np.round(rng.uniform(1, 500, rows), 2),
+        "Category": rng.choice(np.array(BUDGET_CATEGORIES, dtype=object), rows),
+        "Description": synthetic_descriptions(rows, seed).to_numpy(),
+    })
+    if with_ids:
+        expenses.insert(0, EXPENSE_ID, np.arange(1, rows + 1))
+    return expenses[([EXPENSE_ID] if with_ids else []) + EXPENSE_COLUMNS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True, help="directory to write the files to")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    synthetic_users(max(args.rows // 1000, 1), args.seed).to_csv(os.path.join(args.out, "users.csv"), index=False)
+    write_bank_statement(os.path.join(args.out, "bank_statement.csv"), args.rows, args.seed)
+    write_pdf_statement(os.path.join(args.out, "bank_statement.pdf"), min(args.rows, 10_000), args.seed)
+    synthetic_expenses(args.rows, args.seed).to_csv(os.path.join(args.out, "expenses.csv"), index=False)
+    print(f"Wrote users.csv, bank_statement.csv/.pdf and expenses.csv ({args.rows:,} rows) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""Bulk-import per-user CSV and PDF bank statements into the FinPal database.
+
+Statements are found under DIRECTORY as ``<username>.csv`` (or ``.pdf``) or
+``<username>/<any name>.csv``. They are parsed and categorized, with each
+user's own category rules, in a pool of worker processes, while this process
+alone writes to SQLite, committing many statements per transaction through
+db_manager.import_statement_batch.
+
+Progress is checkpointed to a JSON file after every committed batch. Running
+the same command again after a crash or a failed file skips every file that
+was imported and has not changed since, and retries the ones that failed.
+Statements already imported are never written twice either way, since their
+content hashes are recorded with their rows. Exits with status 1 if any file
+failed. Run from the repository root:
+
+    python bulk_import.py statements/ --workers 8 --report import_report.csv
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+import db_manager
+from utils.categorization import get_rule_engine
+from utils.data_processing import iter_statement, statement_fingerprint
+
+CHECKPOINT_FILE = ".finpal_import_checkpoint.json"
+STATEMENT_EXTENSIONS = (".csv", ".pdf")
+BATCH_ROWS = 200_000
+REPORT_COLUMNS = ["file", "username", "status", "rows", "inserted", "error"]
+
+
+def find_statements(directory):
+    """``(relative path, username)`` for every statement under ``directory``, in a stable order."""
+    statements = []
+    for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+        if entry.is_file() and entry.name.lower().endswith(STATEMENT_EXTENSIONS):
+            statements.append((entry.name, os.path.splitext(entry.name)[0]))
+        elif entry.is_dir() and not entry.name.startswith("."):
+            for root, dirs, names in os.walk(entry.path):
+                dirs.sort()
+                for name in sorted(names):
+                    if name.lower().endswith(STATEMENT_EXTENSIONS):
+                        statements.append((os.path.relpath(os.path.join(root, name), directory), entry.name))
+    return statements
+
+
+def parse_statement(path, user_rules):
+    """Worker: hashes, parses and categorizes one statement file.
+
+    Returns ``(content_hash, expenses, error)``; failures are returned as text
+    rather than raised so one bad file never takes the pool down.
+    """
+    try:
+        engine = get_rule_engine(list(user_rules))
+        content_hash = statement_fingerprint(path)
+        # Files are already spread over the pool, so PDF pages are extracted in this worker alone
+        expenses = pd.concat(list(iter_statement(path, engine=engine, workers=1)), ignore_index=True)
+        return content_hash, expenses, None
+    except Exception as e:
+        return None, None, f"{type(e).__name__}: {e}"
+
+
+def _file_state(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return {"files": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _is_done(entry, state):
+    return entry is not None and entry["status"] == "imported" and all(entry.get(k) == v for k, v in state.items())
+
+
+class BatchWriter:
+    """Collects parsed statements and writes them in transactions of about ``batch_rows`` rows."""
+
+    def __init__(self, checkpoint, checkpoint_path, batch_rows):
+        self.checkpoint = checkpoint
+        self.checkpoint_path = checkpoint_path
+        self.batch_rows = batch_rows
+        self.pending = []  # (relative path, username, content hash, expenses, file state)
+        self.pending_rows = 0
+
+    def add(self, relpath, username, content_hash, expenses, state):
+        self.pending.append((relpath, username, content_hash, expenses, state))
+        self.pending_rows += len(expenses)
+        if self.pending_rows >= self.batch_rows:
+            self.flush()
+
+    def record(self, relpath, entry):
+        self.checkpoint["files"][relpath] = entry
+
+    def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending, self.pending_rows = self.pending, [], 0
+        try:
+            inserted = db_manager.import_statement_batch(
+                [(username, content_hash, expenses) for _, username, content_hash, expenses, _ in batch]
+            )
+        except Exception as e:
+            for relpath, username, _, expenses, state in batch:
+                self.record(relpath, {"username": username, "status": "failed", "rows": len(expenses),
+                                      "error": f"{type(e).__name__}: {e}", **state})
+        else:
+            for relpath, username, content_hash, expenses, state in batch:
+                self.record(relpath, {"username": username, "status": "imported", "hash": content_hash,
+                                      "rows": len(expenses), "inserted": inserted[(username, content_hash)],
+                                      **state})
+        save_checkpoint(self.checkpoint_path, self.checkpoint)
+
+
+def bulk_import(directory, workers=None, batch_rows=BATCH_ROWS, checkpoint_path=None):
+    """Imports every statement under ``directory``; returns the checkpoint entries of the files handled."""
+    checkpoint_path = checkpoint_path or os.path.join(directory, CHECKPOINT_FILE)
+    checkpoint = load_checkpoint(checkpoint_path)
+    todo = []
+    for relpath, username in find_statements(directory):
+        state = _file_state(os.path.join(directory, relpath))
+        if not _is_done(checkpoint["files"].get(relpath), state):
+            todo.append((relpath, username, state))
+    if not todo:
+        return {}
+
+    db_manager.init_db()
+    rules = {
+        username: tuple(db_manager.load_category_rules(username).itertuples(index=False, name=None))
+        for username in dict.fromkeys(username for _, username, _ in todo)
+    }
+    writer = BatchWriter(checkpoint, checkpoint_path, batch_rows)
+    workers = workers or os.cpu_count() or 1
+    queue = iter(todo)
+    in_flight = {}
+    # Spawned rather than forked, as pdf_statements does: a fork would copy this process's open
+    # SQLite connections and any locks held by its other threads into every worker
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        # A bounded number of files in flight keeps parsed but unwritten rows from piling up
+        while True:
+            while len(in_flight) < 2 * workers:
+                item = next(queue, None)
+                if item is None:
+                    break
+                relpath, username, _ = item
+                in_flight[pool.submit(parse_statement, os.path.join(directory, relpath), rules[username])] = item
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                relpath, username, state = in_flight.pop(future)
+                content_hash, expenses, error = future.result()
+                if error is not None:
+                    writer.record(relpath, {"username": username, "status": "failed", "error": error, **state})
+                    save_checkpoint(checkpoint_path, checkpoint)
+                else:
+                    writer.add(relpath, username, content_hash, expenses, state)
+        writer.flush()
+    return {relpath: checkpoint["files"][relpath] for relpath, _, _ in todo}
+
+
+def write_report(path, results):
+    with open(path, "w", newline="") as f:
+        out = csv.DictWriter(f, fieldnames=REPORT_COLUMNS, extrasaction="ignore")
+        out.writeheader()
+        for relpath, entry in results.items():
+            out.writerow({"file": relpath, **entry})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory", help="directory of <username>.csv/.pdf files or <username>/ folders")
+    parser.add_argument("--workers", type=int, help="parser processes (default: one per core)")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS, help="rows written per transaction")
+    parser.add_argument("--checkpoint", help=f"checkpoint file (default: DIRECTORY/{CHECKPOINT_FILE})")
+    parser.add_argument("--db", help=f"SQLite database to import into (default: {db_manager.DB_PATH})")
+    parser.add_argument("--report", help="write a CSV with the outcome of every file handled")
+    args = parser.parse_args()
+
+    if args.db:
+        db_manager.DB_PATH = args.db
+    start = time.perf_counter()
+    results = bulk_import(args.directory, args.workers, args.batch_rows, args.checkpoint)
+    seconds = time.perf_counter() - start
+    db_manager.close_connections()
+
+    imported = [entry for entry in results.values() if entry["status"] == "imported"]
+    failed = {relpath: entry for relpath, entry in results.items() if entry["status"] == "failed"}
+    rows = sum(entry["rows"] for entry in imported)
+    if not results:
+        print("Nothing to import: every statement is already in the checkpoint")
+        return
+    print(f"{len(imported)} file(s) imported, {len(failed)} failed; {rows:,} rows parsed, {sum(entry['inserted'] for entry in imported):,} new, "
+          f"in {seconds:.1f} s ({rows / seconds if seconds else 0:,.0f} rows/s)")
+    for relpath, entry in failed.items():
+        print(f"  {relpath}: {entry['error']}", file=sys.stderr)
+    if args.report:
+        write_report(args.report, results)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,130 @@
 import streamlit as st
 import sqlite3
 import os
+import atexit
+import copy
+import datetime
+import hashlib
 import json
+import logging
+import random
+import threading
+import time
 import pandas as pd
-from typing import Dict, Any
+from collections import Counter
+from contextlib import contextmanager
+from urllib.parse import quote
+from typing import Dict, Any, NamedTuple, Optional
+from utils import instrumentation
+from utils.categorization import RULE_COLUMNS, get_rule_engine
+from utils.data_processing import BANK_STATEMENT_CHUNKSIZE, iter_statement, normalize_dates, statement_fingerprint
+from utils.expense_store import EXPENSE_COLUMNS, EXPENSE_ID, ExpenseStore
+from utils.reports import REPORT_FORMATS, Report, monthly_report, report_months, year_end_summary
+from utils.spend_forecast import (
+    FORECAST_WINDOW, RECURRING_WINDOW, detect_recurring, forecast_spending, merchant_key, shift_month,
+    suggested_budgets
+)
 
 DB_PATH = "user_data/finpal_users.db"
+LEGACY_CREDENTIALS_FILE = "credentials.json"
+
+logger = logging.getLogger(__name__)
+
+# --- CONNECTIONS ---
+BUSY_TIMEOUT_MS = 5000
+MAX_BUSY_RETRIES = 5
+RETRY_BASE_DELAY = 0.05
+
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",        # readers never block the single writer
+    "PRAGMA synchronous=NORMAL",      # safe with WAL, avoids an fsync per commit
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",       # 16 MB page cache per connection
+]
+
+# Connections are bound to the thread that uses them. Streamlit runs every rerun
+# on a fresh script thread, so a connection whose thread has exited is handed to
+# the next thread that asks instead of being reopened.
+_pool_lock = threading.Lock()
+_schema_lock = threading.Lock()
+_connections = {}  # (db path, thread) -> sqlite3.Connection
+_schema_ready = set()
+
+
+def _open_connection(path: str) -> sqlite3.Connection:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # isolation_level=None: transactions are opened explicitly by transaction()
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None, check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def get_connection() -> sqlite3.Connection:
+    """Returns the calling thread's pooled connection to DB_PATH."""
+    path = DB_PATH
+    thread = threading.current_thread()
+    with _pool_lock:
+        conn = _connections.get((path, thread))
+        if conn is not None:
+            return conn
+        for (conn_path, owner), idle in list(_connections.items()):
+            if conn_path == path and not owner.is_alive():
+                del _connections[(conn_path, owner)]
+                conn = idle
+                break
+        if conn is None:
+            conn = _open_connection(path)
+        _connections[(path, thread)] = conn
+    if path not in _schema_ready:
+        _ensure_schema(conn, path)
+    return conn
 
-# --- INIT DB ---
-def init_db():
-    os.makedirs("user_data", exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
 
+def close_connections():
+    """Closes every pooled connection, e.g. at shutdown or between benchmark runs."""
+    with _pool_lock:
+        for conn in _connections.values():
+            conn.close()
+        _connections.clear()
+        _schema_ready.clear()
+
+
+def _is_busy(error: sqlite3.OperationalError) -> bool:
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+@contextmanager
+def transaction():
+    """Write transaction on the pooled connection, taking the write lock up front."""
+    conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn.cursor()
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def run_in_transaction(fn, *args, **kwargs):
+    """Runs ``fn(cursor, ...)`` in a write transaction, retrying with backoff while the database is busy."""
+    for attempt in range(MAX_BUSY_RETRIES + 1):
+        try:
+            with transaction() as cursor:
+                return fn(cursor, *args, **kwargs)
+        except sqlite3.OperationalError as e:
+            if not _is_busy(e) or attempt == MAX_BUSY_RETRIES:
+                raise
+            time.sleep(RETRY_BASE_DELAY * (2 ** attempt) * (1 + random.random()))
+
+
+# --- SCHEMA MIGRATIONS ---
+def _migration_1_base_tables(cursor):
     # Store metadata like budget, income, state, NYC flag
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -36,18 +148,380 @@ def init_db():
         )
     ''')
 
-    conn.commit()
-    conn.close()
+
+def _migration_2_expense_ids(cursor):
+    # Give expenses stable IDs so saves can write only the rows that changed
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(expenses)")]
+    if "id" not in columns:
+        cursor.execute("ALTER TABLE expenses RENAME TO expenses_old")
+        cursor.execute('''
+            CREATE TABLE expenses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT,
+                date TEXT,
+                amount REAL,
+                category TEXT,
+                description TEXT
+            )
+        ''')
+        cursor.execute('''
+            INSERT INTO expenses (username, date, amount, category, description)
+            SELECT username, date, amount, category, description FROM expenses_old
+        ''')
+        cursor.execute("DROP TABLE expenses_old")
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_expenses_username_date ON expenses (username, date)")
+
+
+def _migration_3_category_rules(cursor):
+    # Per-user categorization rules, checked ahead of the default rules table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS category_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            kind TEXT NOT NULL,
+            pattern TEXT NOT NULL,
+            category TEXT NOT NULL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_category_rules_username ON category_rules (username, priority)")
+
+
+def _migration_4_expense_dedup(cursor):
+    # Statement files already imported by each user, by content hash; imported rows are
+    # keyed per statement by migration 11
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS statement_imports (
+            username TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            imported_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            rows_imported INTEGER,
+            PRIMARY KEY (username, content_hash)
+        )
+    ''')
+
+
+def _migration_5_expense_aggregates(cursor):
+    # Per-user totals by (month, category), kept current by triggers on every expense write.
+    # Amounts are summed in integer cents so repeated add/subtract never drifts.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS expense_aggregates (
+            username TEXT NOT NULL,
+            month TEXT NOT NULL,
+            category TEXT NOT NULL,
+            total_cents INTEGER NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (username, month, category)
+        )
+    ''')
+    add = '''
+        INSERT INTO expense_aggregates (username, month, category, total_cents, count)
+        VALUES (NEW.username, substr(NEW.date, 1, 7), COALESCE(NEW.category, 'Other'),
+                CAST(ROUND(COALESCE(NEW.amount, 0) * 100) AS INTEGER), 1)
+        ON CONFLICT (username, month, category) DO UPDATE SET
+            total_cents = total_cents + excluded.total_cents,
+            count = count + 1;
+    '''
+    remove = '''
+        UPDATE expense_aggregates SET
+            total_cents = total_cents - CAST(ROUND(COALESCE(OLD.amount, 0) * 100) AS INTEGER),
+            count = count - 1
+        WHERE username = OLD.username AND month = substr(OLD.date, 1, 7)
+          AND category = COALESCE(OLD.category, 'Other');
+        DELETE FROM expense_aggregates
+        WHERE username = OLD.username AND month = substr(OLD.date, 1, 7)
+          AND category = COALESCE(OLD.category, 'Other') AND count <= 0;
+    '''
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_expenses_insert_aggregates AFTER INSERT ON expenses BEGIN {add} END")
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS trg_expenses_delete_aggregates AFTER DELETE ON expenses BEGIN {remove} END")
+    cursor.execute(
+        "CREATE TRIGGER IF NOT EXISTS trg_expenses_update_aggregates "
+        f"AFTER UPDATE OF username, date, amount, category ON expenses BEGIN {remove} {add} END"
+    )
+    cursor.execute("DELETE FROM expense_aggregates")
+    cursor.execute('''
+        INSERT INTO expense_aggregates (username, month, category, total_cents, count)
+        SELECT username, substr(date, 1, 7), COALESCE(category, 'Other'),
+               SUM(CAST(ROUND(COALESCE(amount, 0) * 100) AS INTEGER)), COUNT(*)
+        FROM expenses GROUP BY 1, 2, 3
+    ''')
+
+
+def _migration_6_iso_dates(cursor):
+    # Rewrite free-form dates as ISO YYYY-MM-DD so the (username, date) index can serve
+    # date windows; the update trigger moves the affected monthly aggregates along
+    rows = cursor.execute(
+        "SELECT id, date FROM expenses WHERE date IS NOT NULL AND date NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'"
+    ).fetchall()
+    if not rows:
+        return
+    ids, dates = zip(*rows)
+    normalized = normalize_dates(pd.Series(dates, dtype=object))
+    changed = [(iso, expense_id) for expense_id, old, iso in zip(ids, dates, normalized) if iso != old]
+    cursor.executemany("UPDATE expenses SET date = ? WHERE id = ?", changed)
+
+
+def _migration_7_expense_browser_indexes(cursor):
+    # Keyset pages ordered by amount, and category filters; id rides along in every index as the rowid
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_expenses_username_amount ON expenses (username, amount)")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_expenses_username_category "
+        "ON expenses (username, COALESCE(category, 'Other'), date)"
+    )
+
+
+def _migration_8_credentials(cursor):
+    # Login credentials, looked up by username; version changes whenever a user's row does,
+    # which invalidates session tokens issued before the change
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS credentials (
+            username TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            email TEXT,
+            password_hash TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 1,
+            updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    ''')
+    # Users of the credentials.json next to the database move in once; the file is no longer read
+    path = os.path.join(os.path.dirname(DB_PATH), LEGACY_CREDENTIALS_FILE)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            users = json.load(f).get("usernames", {})
+        cursor.executemany(
+            "INSERT OR IGNORE INTO credentials (username, name, email, password_hash) VALUES (?, ?, ?, ?)",
+            [(username, user["name"], user.get("email"), user["password"]) for username, user in users.items()]
+        )
+
+
+def _migration_9_merchant_aggregates(cursor):
+    # Per-user totals by (month, merchant, category) for spotting recurring charges; filled and
+    # kept current by the triggers of migration 12
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS merchant_aggregates (
+            username TEXT NOT NULL,
+            month TEXT NOT NULL,
+            merchant TEXT NOT NULL,
+            category TEXT NOT NULL,
+            total_cents INTEGER NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (username, month, merchant, category)
+        )
+    ''')
+
+
+def _migration_10_report_jobs(cursor):
+    # A counter per (user, month) bumped by every expense write, so a finished report can tell
+    # whether the months it covers changed since without rereading them
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS expense_versions (
+            username TEXT NOT NULL,
+            month TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (username, month)
+        ) WITHOUT ROWID
+    ''')
+    bump = '''
+        INSERT INTO expense_versions (username, month, version) VALUES ({row}.username, substr({row}.date, 1, 7), 1)
+        ON CONFLICT (username, month) DO UPDATE SET version = version + 1;
+    '''
+    cursor.execute(
+        "CREATE TRIGGER IF NOT EXISTS trg_expenses_insert_versions AFTER INSERT ON expenses "
+        f"BEGIN {bump.format(row='NEW')} END"
+    )
+    cursor.execute(
+        "CREATE TRIGGER IF NOT EXISTS trg_expenses_delete_versions AFTER DELETE ON expenses "
+        f"BEGIN {bump.format(row='OLD')} END"
+    )
+    cursor.execute(
+        "CREATE TRIGGER IF NOT EXISTS trg_expenses_update_versions "
+        "AFTER UPDATE OF username, date, amount, category, description ON expenses "
+        f"BEGIN {bump.format(row='OLD')} {bump.format(row='NEW')} END"
+    )
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS report_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            period TEXT NOT NULL,
+            format TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            data_version TEXT,
+            result BLOB,
+            error TEXT,
+            worker_pid INTEGER,
+            submitted_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            started_at TEXT,
+            finished_at TEXT
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_report_jobs_user ON report_jobs (username, kind, period, format)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_report_jobs_status ON report_jobs (status, id)")
+
+
+def _migration_11_statement_occurrences(cursor):
+    # Imported rows are unique on (date, amount, description) plus which repeat of that transaction
+    # they are within their statement: overlapping statements add nothing, while two identical
+    # transactions in one statement are both kept. Rows entered by hand have no occurrence and are
+    # never deduplicated. Existing rows cannot be told apart from ones entered by hand, so they are
+    # left unnumbered and never block a later import.
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(expenses)")]
+    if "occurrence" not in columns:
+        cursor.execute("ALTER TABLE expenses ADD COLUMN occurrence INTEGER")
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_expenses_statement_row
+        ON expenses (username, date, amount, COALESCE(description, ''), occurrence) WHERE occurrence IS NOT NULL
+    ''')
+
+
+def _migration_12_expense_merchants(cursor):
+    # Every expense stores its merchant_key(), computed in Python when it is written, and the
+    # merchant_aggregates triggers read that column, so any SQLite client can write expenses.
+    # Rows written by other clients without a merchant count under the empty merchant.
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(expenses)")]
+    if "merchant" not in columns:
+        cursor.execute("ALTER TABLE expenses ADD COLUMN merchant TEXT")
+    rows = cursor.execute("SELECT id, description FROM expenses").fetchall()
+    cursor.executemany("UPDATE expenses SET merchant = ? WHERE id = ?", [
+        (merchant_key(description), expense_id) for expense_id, description in rows
+    ])
+
+    add = '''
+        INSERT INTO merchant_aggregates (username, month, merchant, category, total_cents, count)
+        VALUES (NEW.username, substr(NEW.date, 1, 7), COALESCE(NEW.merchant, ''), COALESCE(NEW.category, 'Other'),
+                CAST(ROUND(COALESCE(NEW.amount, 0) * 100) AS INTEGER), 1)
+        ON CONFLICT (username, month, merchant, category) DO UPDATE SET
+            total_cents = total_cents + excluded.total_cents,
+            count = count + 1;
+    '''
+    remove = '''
+        UPDATE merchant_aggregates SET
+            total_cents = total_cents - CAST(ROUND(COALESCE(OLD.amount, 0) * 100) AS INTEGER),
+            count = count - 1
+        WHERE username = OLD.username AND month = substr(OLD.date, 1, 7)
+          AND merchant = COALESCE(OLD.merchant, '') AND category = COALESCE(OLD.category, 'Other');
+        DELETE FROM merchant_aggregates
+        WHERE username = OLD.username AND month = substr(OLD.date, 1, 7)
+          AND merchant = COALESCE(OLD.merchant, '') AND category = COALESCE(OLD.category, 'Other')
+          AND count <= 0;
+    '''
+    cursor.execute(f"CREATE TRIGGER trg_expenses_insert_merchants AFTER INSERT ON expenses BEGIN {add} END")
+    cursor.execute(f"CREATE TRIGGER trg_expenses_delete_merchants AFTER DELETE ON expenses BEGIN {remove} END")
+    cursor.execute(
+        "CREATE TRIGGER trg_expenses_update_merchants "
+        f"AFTER UPDATE OF username, date, amount, category, merchant ON expenses BEGIN {remove} {add} END"
+    )
+    cursor.execute('''
+        INSERT INTO merchant_aggregates (username, month, merchant, category, total_cents, count)
+        SELECT username, substr(date, 1, 7), COALESCE(merchant, ''), COALESCE(category, 'Other'),
+               SUM(CAST(ROUND(COALESCE(amount, 0) * 100) AS INTEGER)), COUNT(*)
+        FROM expenses GROUP BY 1, 2, 3, 4
+    ''')
+
+
+# Applied in order; PRAGMA user_version records the last one applied
+MIGRATIONS = [
+    (1, _migration_1_base_tables),
+    (2, _migration_2_expense_ids),
+    (3, _migration_3_category_rules),
+    (4, _migration_4_expense_dedup),
+    (5, _migration_5_expense_aggregates),
+    (6, _migration_6_iso_dates),
+    (7, _migration_7_expense_browser_indexes),
+    (8, _migration_8_credentials),
+    (9, _migration_9_merchant_aggregates),
+    (10, _migration_10_report_jobs),
+    (11, _migration_11_statement_occurrences),
+    (12, _migration_12_expense_merchants),
+]
+
+
+def _ensure_schema(conn: sqlite3.Connection, path: str):
+    with _schema_lock:
+        if path in _schema_ready:
+            return
+        # Re-read the version under the write lock in case another process migrated first
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for target, migrate in MIGRATIONS:
+                if target > version:
+                    migrate(conn.cursor())
+                    conn.execute(f"PRAGMA user_version={target}")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        _schema_ready.add(path)
+
+
+# --- INIT DB ---
+@instrumentation.timed("db.init_db")
+def init_db():
+    """Opens the pooled connection, applying any pending migrations once per process."""
+    get_connection()
+
+# --- EXPENSE CHANGE TRACKING ---
+def _normalize_expenses(expenses: pd.DataFrame) -> pd.DataFrame:
+    """Coerces expenses to the types they are stored with, so saved and unsaved rows compare equal."""
+    expenses = expenses.to_frame() if isinstance(expenses, ExpenseStore) else pd.DataFrame(expenses)
+    if expenses.empty:
+        expenses = pd.DataFrame(columns=[EXPENSE_ID] + EXPENSE_COLUMNS)
+    ids = expenses[EXPENSE_ID] if EXPENSE_ID in expenses else pd.Series(pd.NA, index=expenses.index)
+    return pd.DataFrame({
+        EXPENSE_ID: pd.to_numeric(ids, errors="coerce").astype("Int64"),
+        "Date": normalize_dates(expenses["Date"]),
+        "Amount": pd.to_numeric(expenses["Amount"], errors="coerce").astype(float),
+        "Category": expenses["Category"].astype(object).where(expenses["Category"].notna(), None),
+        "Description": expenses["Description"].astype(object).where(expenses["Description"].notna(), None),
+    }, index=expenses.index)
+
+
+def expense_fingerprints(expenses: pd.DataFrame) -> pd.Series:
+    """Content hash of every saved expense row, indexed by expense ID.
+
+    This is the change tracker kept next to the session DataFrame: comparing it
+    with the current rows tells save_user_data which rows actually changed.
+    """
+    normalized = _normalize_expenses(expenses)
+    normalized = normalized[normalized[EXPENSE_ID].notna()]
+    hashes = pd.util.hash_pandas_object(normalized[EXPENSE_COLUMNS].fillna(""), index=False)
+    return pd.Series(hashes.to_numpy(), index=normalized[EXPENSE_ID].astype("int64").to_numpy())
+
+
+def diff_expenses(expenses: pd.DataFrame, snapshot: pd.Series):
+    """Splits expenses into rows to insert, rows to update and IDs to delete relative to a snapshot."""
+    normalized = _normalize_expenses(expenses)
+    inserted = normalized[normalized[EXPENSE_ID].isna()]
+    current = expense_fingerprints(normalized)
+    previous = snapshot.reindex(current.index)
+    updated_ids = current.index[current.to_numpy() != previous.to_numpy()]
+    updated = normalized[normalized[EXPENSE_ID].isin(updated_ids)]
+    deleted_ids = snapshot.index.difference(current.index)
+    return inserted, updated, deleted_ids
+
 
 # --- SAVE USER DATA ---
-def save_user_data(username: str, data: Dict[str, Any]):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+@instrumentation.timed("db.save_user_data")
+def save_user_data(username: str, data: Dict[str, Any], snapshot: Optional[pd.Series] = None) -> pd.DataFrame:
+    """Saves user metadata and writes only the expense rows that changed.
 
+    ``snapshot`` is the expense_fingerprints() of what was last saved; without it
+    the stored rows are read back to work out the difference. Returns the expenses
+    with IDs assigned to newly inserted rows.
+    """
     # Convert complex objects
     budget_json = json.dumps(data.get("budget", {}))
     tax_summary_json = json.dumps(data.get("tax_summary", {}))
 
+    # Diff outside the transaction so the write lock is only held for the writes
+    expenses = _normalize_expenses(data.get("expenses", {}))
+    changes = diff_expenses(expenses, snapshot) if snapshot is not None else None
+    return run_in_transaction(_save_user_data, username, data, budget_json, tax_summary_json, expenses, changes)
+
+
+def _save_user_data(cursor, username, data, budget_json, tax_summary_json, expenses, changes):
     # Upsert user metadata
     cursor.execute('''
         INSERT INTO users (username, annual_income, selected_state, nyc_resident, budget, tax_summary)
@@ -67,64 +541,1293 @@ def save_user_data(username: str, data: Dict[str, Any]):
         tax_summary_json
     ))
 
-    # Delete and re-insert all expenses for user
-    cursor.execute("DELETE FROM expenses WHERE username = ?", (username,))
-    for _, row in pd.DataFrame(data.get("expenses", {})).iterrows():
-        cursor.execute("""
-            INSERT INTO expenses (username, date, amount, category, description)
-            VALUES (?, ?, ?, ?, ?)
-        """, (username, str(row["Date"]), row["Amount"], row["Category"], row["Description"]))
+    if changes is None:
+        stored = pd.read_sql_query(
+            "SELECT id AS ID, date AS Date, amount AS Amount, category AS Category, description AS Description "
+            "FROM expenses WHERE username = ?", cursor.connection, params=(username,)
+        )
+        changes = diff_expenses(expenses, expense_fingerprints(stored))
+    inserted, updated, deleted_ids = changes
+
+    if len(deleted_ids):
+        cursor.executemany(
+            "DELETE FROM expenses WHERE id = ? AND username = ?",
+            [(int(expense_id), username) for expense_id in deleted_ids]
+        )
+
+    # An imported row edited beyond its category no longer matches its statement line, so it
+    # drops its occurrence and is kept like a row entered by hand
+    if not updated.empty:
+        cursor.executemany("""
+            UPDATE expenses SET
+                occurrence = CASE WHEN date IS ?3 AND amount IS ?4 AND description IS ?6 THEN occurrence END,
+                date = ?3, amount = ?4, category = ?5, description = ?6, merchant = ?7
+            WHERE id = ?1 AND username = ?2
+        """, _expense_rows(username, updated))
+        # Rows whose ID was reserved up front (write-behind) are not stored yet
+        cursor.executemany("""
+            INSERT OR IGNORE INTO expenses (id, username, date, amount, category, description, merchant)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, _expense_rows(username, updated))
+
+    if not inserted.empty:
+        expenses.loc[inserted.index, EXPENSE_ID] = list(_reserve_expense_ids(cursor, len(inserted)))
+        cursor.executemany("""
+            INSERT INTO expenses (id, username, date, amount, category, description, merchant)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, _expense_rows(username, expenses.loc[inserted.index]))
+
+    return expenses
+
+
+def _reserve_expense_ids(cursor, count: int) -> range:
+    # Runs under the transaction's write lock; AUTOINCREMENT IDs are never reused
+    cursor.execute('''
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'expenses', COALESCE(MAX(id), 0) FROM expenses
+        WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'expenses')
+    ''')
+    next_id = cursor.execute("SELECT seq + 1 FROM sqlite_sequence WHERE name = 'expenses'").fetchone()[0]
+    cursor.execute("UPDATE sqlite_sequence SET seq = seq + ? WHERE name = 'expenses'", (count,))
+    return range(next_id, next_id + count)
+
+
+def assign_expense_ids(expenses: pd.DataFrame) -> pd.DataFrame:
+    """Gives unsaved expense rows their permanent IDs without writing the rows themselves."""
+    expenses = _normalize_expenses(expenses)
+    unsaved = expenses.index[expenses[EXPENSE_ID].isna()]
+    if len(unsaved):
+        expenses.loc[unsaved, EXPENSE_ID] = list(run_in_transaction(_reserve_expense_ids, len(unsaved)))
+    return expenses
+
+
+def _expense_rows(username: str, expenses: pd.DataFrame):
+    return zip(
+        expenses[EXPENSE_ID].astype("int64").tolist(),
+        [username] * len(expenses),
+        expenses["Date"].tolist(),
+        expenses["Amount"].tolist(),
+        expenses["Category"].tolist(),
+        expenses["Description"].tolist(),
+        expenses["Description"].map(merchant_key).tolist(),
+    )
+
+
+def number_occurrences(expenses: pd.DataFrame, seen: Optional[Counter] = None) -> pd.Series:
+    """Which repeat of its (date, amount, description) each row of a statement is, counting from 1.
+
+    ``seen`` carries the counts of a statement's earlier chunks and is updated
+    with this one's, so chunked imports number rows the same as whole ones.
+    """
+    key = pd.DataFrame({
+        "date": expenses["Date"].fillna(""),
+        "amount": expenses["Amount"].fillna(0.0),
+        "description": expenses["Description"].fillna(""),
+    }, index=expenses.index)
+    occurrence = key.groupby(list(key.columns), sort=False).cumcount() + 1
+    if seen is not None:
+        keys = list(zip(key["date"], key["amount"], key["description"]))
+        if seen:
+            occurrence += [seen.get(k, 0) for k in keys]
+        seen.update(keys)
+    return occurrence
+
+
+def _statement_rows(username: str, expenses: pd.DataFrame):
+    return (row + (occurrence,) for row, occurrence in zip(
+        _expense_rows(username, expenses), expenses["occurrence"].astype("int64").tolist()
+    ))
+
+
+# --- BULK IMPORT ---
+STATEMENT_INSERT = """
+    INSERT OR IGNORE INTO expenses (id, username, date, amount, category, description, merchant, occurrence)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def append_expenses(username: str, expenses: pd.DataFrame, seen: Optional[Counter] = None) -> int:
+    """Inserts rows of a bank statement directly, skipping ones an earlier import already stored.
+
+    Rows are matched on (date, amount, description) and their occurrence within
+    the statement (see number_occurrences), so repeated identical transactions
+    are kept. Returns the number inserted.
+    """
+    expenses = _normalize_expenses(expenses)
+    expenses["occurrence"] = number_occurrences(expenses, seen)
+    expenses = _drop_archived_duplicates(username, expenses)
+
+    def _append(cursor):
+        expenses[EXPENSE_ID] = list(_reserve_expense_ids(cursor, len(expenses)))
+        cursor.executemany(STATEMENT_INSERT, _statement_rows(username, expenses))
+        return cursor.rowcount
+
+    return run_in_transaction(_append) if not expenses.empty else 0
+
+
+def statement_already_imported(username: str, content_hash: str) -> bool:
+    row = get_connection().execute(
+        "SELECT 1 FROM statement_imports WHERE username = ? AND content_hash = ?", (username, content_hash)
+    ).fetchone()
+    return row is not None
+
+
+@instrumentation.timed("db.import_bank_statement")
+def import_bank_statement(username: str, file, progress=None, chunksize: int = BANK_STATEMENT_CHUNKSIZE,
+                          content_hash: Optional[str] = None) -> int:
+    """Streams a CSV or PDF bank statement into the expenses table one chunk at a time.
+
+    A file whose content was already imported by this user is skipped, and
+    transactions already stored are not inserted again. ``progress(fraction, rows)``
+    is called after each chunk is committed. Returns the number of new rows.
+    """
+    content_hash = content_hash or statement_fingerprint(file)
+    if statement_already_imported(username, content_hash):
+        return 0
+    if _write_behind is not None:
+        _write_behind.flush()  # queued session saves must not race the import
+    size = getattr(file, "size", None) or (os.path.getsize(file) if isinstance(file, str) else None)
+    engine = get_rule_engine(load_category_rules(username))
+    rows = inserted = 0
+    seen = Counter()
+    for chunk in iter_statement(file, chunksize=chunksize, engine=engine):
+        inserted += append_expenses(username, chunk, seen)
+        rows += len(chunk)
+        if progress is not None:
+            fraction = min(file.tell() / size, 1.0) if size and hasattr(file, "tell") else 0.0
+            progress(fraction, rows)
+    # Recorded last, so an interrupted import is simply resumed by uploading again
+    run_in_transaction(lambda cursor: cursor.execute(
+        "INSERT OR REPLACE INTO statement_imports (username, content_hash, rows_imported) VALUES (?, ?, ?)",
+        (username, content_hash, inserted)
+    ))
+    if progress is not None:
+        progress(1.0, rows)
+    return inserted
+
+
+def import_statement_batch(statements) -> Dict[tuple, int]:
+    """Writes already parsed statements, for any number of users, in one transaction.
+
+    ``statements`` holds ``(username, content_hash, expenses)`` triples. Each
+    statement is recorded in statement_imports in the same transaction as its
+    rows, so an interrupted batch leaves nothing half imported, and statements
+    imported before are skipped. Returns the rows inserted per
+    ``(username, content_hash)``.
+    """
+    prepared = []
+    for username, content_hash, expenses in statements:
+        expenses = _normalize_expenses(expenses)
+        expenses["occurrence"] = number_occurrences(expenses)
+        prepared.append((username, content_hash, _drop_archived_duplicates(username, expenses)))
+    if _write_behind is not None:
+        _write_behind.flush()
+
+    def _import(cursor):
+        inserted = {}
+        for username, content_hash, expenses in prepared:
+            if (username, content_hash) in inserted or cursor.execute(
+                "SELECT 1 FROM statement_imports WHERE username = ? AND content_hash = ?", (username, content_hash)
+            ).fetchone():
+                inserted.setdefault((username, content_hash), 0)
+                continue
+            count = 0
+            if not expenses.empty:
+                expenses[EXPENSE_ID] = list(_reserve_expense_ids(cursor, len(expenses)))
+                cursor.executemany(STATEMENT_INSERT, _statement_rows(username, expenses))
+                count = cursor.rowcount
+            cursor.execute(
+                "INSERT INTO statement_imports (username, content_hash, rows_imported) VALUES (?, ?, ?)",
+                (username, content_hash, count)
+            )
+            inserted[(username, content_hash)] = count
+        return inserted
+
+    return run_in_transaction(_import) if prepared else {}
+
+# --- CATEGORY RULES ---
+def load_category_rules(username: str) -> pd.DataFrame:
+    """The user's own categorization rules, in priority order."""
+    return pd.read_sql_query(
+        "SELECT priority, kind, pattern, category FROM category_rules WHERE username = ? ORDER BY priority, id",
+        get_connection(), params=(username,)
+    )[RULE_COLUMNS]
+
+
+def save_category_rule(username: str, pattern: str, category: str, kind: str = "keyword", priority: int = 0):
+    """Adds a rule that overrides the default categorization for this user only."""
+    get_rule_engine([(priority, kind, pattern, category)])  # rejects bad kinds and regexes before storing
+    run_in_transaction(lambda cursor: cursor.execute(
+        "INSERT INTO category_rules (username, priority, kind, pattern, category) VALUES (?, ?, ?, ?, ?)",
+        (username, priority, kind, pattern, category)
+    ))
+
+
+def delete_category_rule(username: str, pattern: str):
+    run_in_transaction(lambda cursor: cursor.execute(
+        "DELETE FROM category_rules WHERE username = ? AND pattern = ?", (username, pattern)
+    ))
+
+# --- CREDENTIALS ---
+class Credential(NamedTuple):
+    username: str
+    name: str
+    email: Optional[str]
+    password_hash: str
+    version: int
+
+
+def load_credential(username: str) -> Optional[Credential]:
+    """One user's credentials by primary key, or None for an unknown user."""
+    row = get_connection().execute(
+        "SELECT username, name, email, password_hash, version FROM credentials WHERE username = ?",
+        (username,)
+    ).fetchone()
+    return Credential(*row) if row is not None else None
+
+
+def save_credentials(credentials, replace: bool = True) -> int:
+    """Inserts or updates many ``(username, name, email, password_hash)`` rows in one transaction.
+
+    An update that changes anything bumps the user's version. With ``replace=False``
+    existing users are left as they are. Returns the number of rows written.
+    """
+    rows = [(username, name, email, password_hash) for username, name, email, password_hash in credentials]
+    conflict = '''
+        DO UPDATE SET name = excluded.name, email = excluded.email, password_hash = excluded.password_hash,
+                      version = version + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE (name, email, password_hash) IS NOT (excluded.name, excluded.email, excluded.password_hash)
+    ''' if replace else "DO NOTHING"
+
+    def _save(cursor):
+        cursor.executemany(f"""
+            INSERT INTO credentials (username, name, email, password_hash) VALUES (?, ?, ?, ?)
+            ON CONFLICT (username) {conflict}
+        """, rows)
+        return cursor.rowcount
+
+    return run_in_transaction(_save) if rows else 0
+
+
+def delete_credential(username: str) -> bool:
+    return run_in_transaction(lambda cursor: cursor.execute(
+        "DELETE FROM credentials WHERE username = ?", (username,)
+    ).rowcount) > 0
 
-    conn.commit()
-    conn.close()
+# --- AGGREGATES ---
+@instrumentation.timed("db.load_category_totals")
+def load_category_totals(username: str, month: Optional[str] = None) -> pd.DataFrame:
+    """Spending per category from the maintained aggregates, optionally for one ``YYYY-MM`` month.
+
+    Reads O(months x categories) rows no matter how many expenses the user has.
+    """
+    # The aggregates only see committed rows, so commit a queued save that changes them first
+    flush_expenses_in(username, month, shift_month(month, 1) if month is not None else None)
+
+    query = "SELECT category, SUM(total_cents) / 100.0, SUM(count) FROM expense_aggregates WHERE username = ?"
+    params = [username]
+    if month is not None:
+        query += " AND month = ?"
+        params.append(month)
+    rows = get_connection().execute(query + " GROUP BY category", params).fetchall()
+    return pd.DataFrame(rows, columns=["Category", "Actual", "Count"])
+
+# --- SPEND FORECAST ---
+MERCHANT_AGGREGATE_ADD = '''
+    INSERT INTO merchant_aggregates (username, month, merchant, category, total_cents, count)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (username, month, merchant, category) DO UPDATE SET
+        total_cents = total_cents + excluded.total_cents,
+        count = count + excluded.count
+'''
+
+
+class SpendForecast(NamedTuple):
+    recurring: pd.DataFrame     # recurring charges, RECURRING_COLUMNS
+    forecast: pd.DataFrame      # expected spend per category, FORECAST_COLUMNS
+    budgets: Dict[str, int]     # suggested monthly budget per category
+
+
+@instrumentation.timed("db.load_spend_forecast")
+def load_spend_forecast(username: str, month: Optional[str] = None) -> SpendForecast:
+    """Recurring charges and expected spend per category for ``month`` (``YYYY-MM``, this month by default).
+
+    Both come from the trigger-maintained aggregates of the trailing closed
+    months, so the cost depends on how many merchants and categories the user
+    has, not on the length of their history, and new expenses are reflected as
+    soon as they are committed.
+    """
+    month = month or current_month_start()[:7]
+    window = (username, shift_month(month, -max(RECURRING_WINDOW, FORECAST_WINDOW)), month)
+    # Only closed months are read, so saves of this month's expenses or the budget stay queued
+    flush_expenses_in(username, window[1], month)
+    conn = get_connection()
+    merchant_months = pd.DataFrame(conn.execute(
+        "SELECT merchant, month, category, total_cents / 100.0, count FROM merchant_aggregates "
+        "WHERE username = ? AND month >= ? AND month < ?", window
+    ).fetchall(), columns=["merchant", "month", "category", "total", "count"])
+    category_months = pd.DataFrame(conn.execute(
+        "SELECT month, category, total_cents / 100.0 FROM expense_aggregates "
+        "WHERE username = ? AND month >= ? AND month < ?", window
+    ).fetchall(), columns=["month", "category", "total"])
+
+    recurring = detect_recurring(merchant_months, month)
+    forecast = forecast_spending(category_months, recurring, month)
+    return SpendForecast(recurring, forecast, suggested_budgets(forecast))
+
+# --- EXPENSE BROWSER ---
+EXPENSE_SORT_COLUMNS = {"Date": "date", "Amount": "amount"}
+EXPENSE_PAGE_SIZE = 50
+
+
+class ExpenseFilters(NamedTuple):
+    start: Optional[str] = None  # inclusive ISO date
+    end: Optional[str] = None  # exclusive ISO date
+    categories: tuple = ()
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+    search: str = ""  # case-insensitive substring of the description
+
+
+class ExpensePage(NamedTuple):
+    expenses: pd.DataFrame
+    total_count: int  # rows matching the filters, across all pages
+    total_amount: float
+    page_amount: float
+    next_cursor: Optional[tuple]  # pass as ``after`` for the following page; None on the last page
+
+
+def _expense_filter_sql(username: str, filters: ExpenseFilters):
+    clauses, params = ["username = ?"], [username]
+    if filters.start:
+        clauses.append("date >= ?")
+        params.append(str(filters.start))
+    if filters.end:
+        clauses.append("date < ?")
+        params.append(str(filters.end))
+    if filters.categories:
+        clauses.append(f"COALESCE(category, 'Other') IN ({', '.join('?' * len(filters.categories))})")
+        params.extend(filters.categories)
+    if filters.min_amount is not None:
+        clauses.append("amount >= ?")
+        params.append(float(filters.min_amount))
+    if filters.max_amount is not None:
+        clauses.append("amount <= ?")
+        params.append(float(filters.max_amount))
+    if filters.search:
+        escaped = filters.search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        clauses.append("description LIKE ? ESCAPE '\\'")
+        params.append(f"%{escaped}%")
+    return " AND ".join(clauses), params
+
+
+def count_expenses(username: str, filters: ExpenseFilters = ExpenseFilters()):
+    """``(count, total amount)`` of the expenses matching ``filters``.
+
+    Without date, amount or search filters this is answered from the monthly
+    aggregates instead of scanning the user's expenses.
+    """
+    conn = get_connection()
+    if not (filters.start or filters.end or filters.search
+            or filters.min_amount is not None or filters.max_amount is not None):
+        query = "SELECT COALESCE(SUM(count), 0), COALESCE(SUM(total_cents), 0) / 100.0 FROM expense_aggregates WHERE username = ?"
+        params = [username]
+        if filters.categories:
+            query += f" AND category IN ({', '.join('?' * len(filters.categories))})"
+            params.extend(filters.categories)
+        count, total = conn.execute(query, params).fetchone()
+        return int(count), float(total)
+    where, params = _expense_filter_sql(username, filters)
+    count, total = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM expenses WHERE {where}", params).fetchone()
+    archived = load_archived_expenses(username, filters, columns=["id", "amount"])
+    if archived is not None and archived.num_rows:
+        # After an interrupted archive a row is in both places; count it once, as the readers show it.
+        # Only the archived months can hold such rows, so this is an index range scan.
+        months = archived_months(username, filters.start, filters.end)
+        overlap = [row[0] for row in conn.execute(
+            f"SELECT id FROM expenses WHERE {where} AND date >= ? AND date < ?",
+            params + [f"{months[0]}-01", f"{shift_month(months[-1], 1)}-01"]
+        )]
+        cold = archived.to_pandas()
+        cold = cold[~cold["id"].isin(overlap)]
+        count += len(cold)
+        total += float(cold["amount"].sum())
+    # Round to cents so the total does not depend on how rows are split between table and archive
+    return int(count), round(float(total), 2)
+
+
+@instrumentation.timed("db.load_expense_page")
+def load_expense_page(username: str, filters: ExpenseFilters = ExpenseFilters(), sort: str = "Date",
+                      descending: bool = True, after: Optional[tuple] = None,
+                      page_size: int = EXPENSE_PAGE_SIZE, with_totals: bool = True) -> ExpensePage:
+    """One page of a user's expenses, fetched with keyset pagination.
+
+    Rows are ordered by ``sort`` (a key of EXPENSE_SORT_COLUMNS) and then ID, and
+    ``after`` is the ``next_cursor`` of the previous page, so every page is an
+    index range scan however deep it is. Totals come from count_expenses; pass
+    ``with_totals=False`` to skip them when they are already known.
+    """
+    # The page reads committed rows, so commit this user's queued save first
+    if _write_behind is not None and _write_behind.pending(username) is not None:
+        _write_behind.flush(username)
+
+    column = EXPENSE_SORT_COLUMNS[sort]
+    direction, compare = ("DESC", "<") if descending else ("ASC", ">")
+    where, params = _expense_filter_sql(username, filters)
+    if after is not None:
+        where += f" AND ({column}, id) {compare} (?, ?)"
+        params.extend(after)
+    rows = get_connection().execute(
+        f"SELECT id, date, amount, category, description FROM expenses WHERE {where} "
+        f"ORDER BY {column} {direction}, id {direction} LIMIT ?",
+        params + [page_size + 1]
+    ).fetchall()
+
+    if archived_months(username, filters.start, filters.end):
+        rows = _merge_archived_page(username, filters, sort, descending, after, page_size, rows)
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = (last[1 + EXPENSE_COLUMNS.index(sort)], last[0])
+    expenses = pd.DataFrame(rows, columns=[EXPENSE_ID] + EXPENSE_COLUMNS)
+    total_count, total_amount = count_expenses(username, filters) if with_totals else (None, None)
+    return ExpensePage(expenses, total_count, total_amount, float(expenses["Amount"].sum()), next_cursor)
+
+def _merge_archived_page(username, filters, sort, descending, after, page_size, rows):
+    """Merges the first ``page_size + 1`` matching archived rows after ``after`` into a page of live rows.
+
+    The cursor is part of the dataset filter, so Parquet row groups wholly on the
+    wrong side of it are skipped, and only the top ``page_size + 1`` rows of what
+    is read are kept. Sorted by date, month files are read in page order and
+    reading stops as soon as the page is full.
+    """
+    import pyarrow.compute as pc
+    column = EXPENSE_SORT_COLUMNS[sort]
+    condition = _archive_filter(filters)
+    if after is not None:
+        key, row_id = pc.field(column), pc.field("id")
+        if descending:
+            beyond = (key < after[0]) | ((key == after[0]) & (row_id < after[1]))
+        else:
+            beyond = (key > after[0]) | ((key == after[0]) & (row_id > after[1]))
+        condition = beyond if condition is None else condition & beyond
+
+    months = archived_months(username, filters.start, filters.end)
+    if sort == "Date":
+        if after is not None:
+            months = [month for month in months if (month <= after[0][:7] if descending else month >= after[0][:7])]
+        batches = [[month] for month in (reversed(months) if descending else months)]
+    else:
+        batches = [months] if months else []
+
+    order = "descending" if descending else "ascending"
+    live_ids = {row[0] for row in rows}
+    cold = []
+    for batch in batches:
+        table = _archive_dataset(username, batch).to_table(columns=ARCHIVE_COLUMNS, filter=condition)
+        if table.num_rows > page_size + 1:
+            table = table.take(pc.select_k_unstable(table, page_size + 1, [(column, order), ("id", order)]))
+        cold += [row for row in zip(*(table.column(c).to_pylist() for c in ARCHIVE_COLUMNS)) if row[0] not in live_ids]
+        if len(cold) > page_size:
+            break
+    key = 1 + EXPENSE_COLUMNS.index(sort)
+    merged = sorted(rows + cold, key=lambda row: (row[key], row[0]), reverse=descending)
+    return merged[:page_size + 1]
 
 # --- LOAD USER DATA ---
-def load_user_data(username: str) -> Dict[str, Any]:
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+@instrumentation.timed("db.load_user_data")
+def load_user_data(username: str, start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Any]:
+    """Loads a user's metadata and expenses dated in ``[start, end)``; no bounds loads all history."""
+    cursor = get_connection().cursor()
+    # A save still queued for write-behind is newer than what is on disk
+    pending = _write_behind.pending(username) if _write_behind is not None else None
 
     # Load metadata
     cursor.execute("SELECT annual_income, selected_state, nyc_resident, budget, tax_summary FROM users WHERE username = ?", (username,))
     row = cursor.fetchone()
-    if not row:
-        conn.close()
+    if not row and pending is None:
         return {}
 
-    annual_income, selected_state, nyc_resident, budget_json, tax_summary_json = row
-
-    # Load expenses
-    cursor.execute("SELECT date, amount, category, description FROM expenses WHERE username = ?", (username,))
-    expenses = cursor.fetchall()
-    conn.close()
+    # Load expenses, using the (username, date) index for the window
+    query = "SELECT id, date, amount, category, description FROM expenses WHERE username = ?"
+    params = [username]
+    if start is not None:
+        query += " AND date >= ?"
+        params.append(str(start))
+    if end is not None:
+        query += " AND date < ?"
+        params.append(str(end))
+    cursor.execute(query + " ORDER BY date, id", params)
+    rows = cursor.fetchall()
+    if archived_months(username, start, end):
+        rows += _archived_rows(username, start, end, [row[0] for row in rows])
+        rows.sort(key=lambda row: (row[1] or "", row[0]))
+    expenses = ExpenseStore.from_rows(rows)
 
-    expenses_df = pd.DataFrame(expenses, columns=["Date", "Amount", "Category", "Description"])
+    if pending is not None:
+        upserts = pending.upserts
+        if start is not None:
+            upserts = upserts[upserts["Date"] >= str(start)]
+        if end is not None:
+            upserts = upserts[upserts["Date"] < str(end)]
+        expenses_df = expenses.to_frame()
+        changed = expenses_df[EXPENSE_ID].isin(pending.deleted_ids) | expenses_df[EXPENSE_ID].isin(pending.upserts[EXPENSE_ID])
+        expenses_df = pd.concat([expenses_df[~changed], upserts], ignore_index=True).sort_values(["Date", EXPENSE_ID])
+        return {**pending.data, "expenses": ExpenseStore.from_frame(expenses_df)}
 
+    annual_income, selected_state, nyc_resident, budget_json, tax_summary_json = row
     return {
         "income": annual_income,
         "state": selected_state,
         "nyc_resident": bool(nyc_resident),
         "budget": json.loads(budget_json),
         "tax_summary": json.loads(tax_summary_json),
-        "expenses": expenses_df.to_dict(orient="list")
+        "expenses": expenses
     }
 
+
+def current_month_start() -> str:
+    return datetime.date.today().replace(day=1).isoformat()
+
+
+def load_user_data_window(username: str, start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Any]:
+    """load_user_data for a date window, the current month by default.
+
+    Older history is read page by page with load_expense_page instead, so
+    startup cost follows the window, not the account's age.
+    """
+    return load_user_data(username, start=start or current_month_start(), end=end)
+
+# --- ARCHIVE ---
+# Closed months can be moved out of the expenses table into per-user Parquet files,
+# one per month (ARCHIVE_DIR/<user>/month=YYYY-MM/expenses.parquet). The monthly
+# aggregates keep counting archived rows, and the readers above stitch hot and cold
+# rows together. pyarrow is only imported once an archive is read or written.
+ARCHIVE_DIR = "user_data/archive"
+# With FINPAL_ARCHIVE=1 the app archives a user's closed months once per session
+ARCHIVE_CLOSED_MONTHS = os.environ.get("FINPAL_ARCHIVE") == "1"
+ARCHIVE_FILE = "expenses.parquet"
+ARCHIVE_COLUMNS = ["id", "date", "amount", "category", "description"]
+
+
+def _archive_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("id", pa.int64()), ("date", pa.string()), ("amount", pa.float64()),
+        ("category", pa.dictionary(pa.int32(), pa.string())), ("description", pa.string()),
+        ("occurrence", pa.int64()),
+    ])
+
+
+def _archive_user_dir(username: str) -> str:
+    return os.path.join(ARCHIVE_DIR, quote(username, safe=""))
+
+
+def _archive_path(username: str, month: str) -> str:
+    return os.path.join(_archive_user_dir(username), f"month={month}", ARCHIVE_FILE)
+
+
+def archived_months(username: str, start: Optional[str] = None, end: Optional[str] = None) -> list:
+    """``YYYY-MM`` months archived for a user that overlap the date window ``[start, end)``."""
+    try:
+        entries = os.listdir(_archive_user_dir(username))
+    except FileNotFoundError:
+        return []
+    months = sorted(
+        entry[len("month="):] for entry in entries
+        if entry.startswith("month=") and os.path.exists(os.path.join(_archive_user_dir(username), entry, ARCHIVE_FILE))
+    )
+    return [
+        month for month in months
+        if (start is None or month >= str(start)[:7]) and (end is None or f"{month}-01" < str(end))
+    ]
+
+
+def _archive_dataset(username: str, months: list):
+    """Memory-mapped dataset over the given archived months, or None if there are none."""
+    if not months:
+        return None
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+    return ds.dataset(
+        [_archive_path(username, month) for month in months], schema=_archive_schema(),
+        format="parquet", filesystem=fs.LocalFileSystem(use_mmap=True)
+    )
+
+
+def _archive_filter(filters: ExpenseFilters):
+    """ExpenseFilters as a pyarrow expression, matching _expense_filter_sql."""
+    import pyarrow.compute as pc
+    conditions = []
+    if filters.start:
+        conditions.append(pc.field("date") >= str(filters.start))
+    if filters.end:
+        conditions.append(pc.field("date") < str(filters.end))
+    if filters.categories:
+        category = pc.field("category").cast("string")
+        condition = category.isin(list(filters.categories))
+        conditions.append(condition | category.is_null() if "Other" in filters.categories else condition)
+    if filters.min_amount is not None:
+        conditions.append(pc.field("amount") >= float(filters.min_amount))
+    if filters.max_amount is not None:
+        conditions.append(pc.field("amount") <= float(filters.max_amount))
+    if filters.search:
+        conditions.append(pc.match_substring(pc.field("description"), filters.search, ignore_case=True))
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def load_archived_expenses(username: str, filters: ExpenseFilters = ExpenseFilters(), columns: Optional[list] = None):
+    """Archived expenses matching ``filters`` as a pyarrow Table, or None if nothing is archived.
+
+    Only the month files overlapping the filter's date range are opened, and only
+    ``columns`` are read.
+    """
+    dataset = _archive_dataset(username, archived_months(username, filters.start, filters.end))
+    if dataset is None:
+        return None
+    # Each month file has its own category dictionary; unify them so the table groups and sorts as one
+    return dataset.to_table(columns=columns or ARCHIVE_COLUMNS, filter=_archive_filter(filters)).unify_dictionaries()
+
+
+def _archived_rows(username: str, start: Optional[str], end: Optional[str], hot_ids) -> list:
+    table = load_archived_expenses(username, ExpenseFilters(start=start, end=end))
+    if table is None or table.num_rows == 0:
+        return []
+    cold = table.to_pandas()
+    # A row can be in both places only if archiving was interrupted; the table copy wins
+    cold = cold[~cold["id"].isin(hot_ids)]
+    return list(cold[ARCHIVE_COLUMNS].itertuples(index=False, name=None))
+
+
+def _drop_archived_duplicates(username: str, expenses: pd.DataFrame) -> pd.DataFrame:
+    """Drops statement rows already archived, which the unique index cannot see.
+
+    Like the index, this matches (date, amount, description, occurrence) against
+    archived statement rows only; archived rows entered by hand have no occurrence.
+    """
+    months = set(archived_months(username)) & set(expenses["Date"].dropna().str[:7])
+    if not months:
+        return expenses
+    archived = _archive_dataset(username, sorted(months)).to_table(
+        columns=["date", "amount", "description", "occurrence"]
+    ).to_pandas().dropna(subset=["occurrence"])
+    stored = pd.MultiIndex.from_arrays([
+        archived["date"], archived["amount"], archived["description"].fillna(""), archived["occurrence"].astype("int64")
+    ])
+    incoming = pd.MultiIndex.from_arrays([
+        expenses["Date"], expenses["Amount"], expenses["Description"].fillna(""), expenses["occurrence"].astype("int64")
+    ])
+    return expenses[~incoming.isin(stored)]
+
+
+def archive_closed_months(username: str, before: Optional[str] = None) -> int:
+    """Moves a user's expenses dated before ``before`` (this month by default) into the archive.
+
+    Each month's file is written (merged with any earlier archive of that month)
+    before its rows leave the expenses table, and the deleted rows' totals are added
+    back to the monthly and merchant aggregates in the same transaction. Returns the rows archived.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if _write_behind is not None and _write_behind.pending(username) is not None:
+        _write_behind.flush(username)
+    before = before or current_month_start()
+    rows = get_connection().execute(
+        "SELECT id, date, amount, category, description, occurrence FROM expenses "
+        "WHERE username = ? AND date < ? AND date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]' "
+        "ORDER BY date, id", (username, str(before))
+    ).fetchall()
+    if not rows:
+        return 0
+
+    # Statement rows keep their occurrence, so a later import can still tell them apart
+    hot = pd.DataFrame(rows, columns=ARCHIVE_COLUMNS + ["occurrence"]).astype({"occurrence": "Int64"})
+    schema = _archive_schema()
+    for month, group in hot.groupby(hot["date"].str[:7], sort=True):
+        path = _archive_path(username, month)
+        if os.path.exists(path):
+            previous = pq.read_table(path, memory_map=True).to_pandas()
+            group = pd.concat([previous[~previous["id"].isin(group["id"])], group]).sort_values(["date", "id"])
+            group = group.astype({"occurrence": "Int64"})
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        pq.write_table(pa.Table.from_pandas(group, schema=schema, preserve_index=False), tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+
+    def _archive(cursor):
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS archive_ids (id INTEGER PRIMARY KEY)")
+        cursor.execute("DELETE FROM temp.archive_ids")
+        cursor.executemany("INSERT INTO temp.archive_ids (id) VALUES (?)", ((int(i),) for i in hot["id"]))
+        restore = cursor.execute('''
+            SELECT username, substr(date, 1, 7), COALESCE(category, 'Other'),
+                   SUM(CAST(ROUND(COALESCE(amount, 0) * 100) AS INTEGER)), COUNT(*)
+            FROM expenses WHERE id IN (SELECT id FROM temp.archive_ids) GROUP BY 1, 2, 3
+        ''').fetchall()
+        restore_merchants = cursor.execute('''
+            SELECT username, substr(date, 1, 7), COALESCE(merchant, ''), COALESCE(category, 'Other'),
+                   SUM(CAST(ROUND(COALESCE(amount, 0) * 100) AS INTEGER)), COUNT(*)
+            FROM expenses WHERE id IN (SELECT id FROM temp.archive_ids) GROUP BY 1, 2, 3, 4
+        ''').fetchall()
+        cursor.execute("DELETE FROM expenses WHERE id IN (SELECT id FROM temp.archive_ids)")
+        archived = cursor.rowcount
+        # The delete trigger subtracted these rows; archived rows still count toward the totals
+        cursor.executemany('''
+            INSERT INTO expense_aggregates (username, month, category, total_cents, count)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (username, month, category) DO UPDATE SET
+                total_cents = total_cents + excluded.total_cents,
+                count = count + excluded.count
+        ''', restore)
+        cursor.executemany(MERCHANT_AGGREGATE_ADD, restore_merchants)
+        cursor.execute("DELETE FROM temp.archive_ids")
+        return archived
+
+    return run_in_transaction(_archive)
+
+
+def load_expense_history(username: str, start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+    """Every expense dated in ``[start, end)``, archived and live, sorted by date then ID."""
+    query = "SELECT id, date, amount, category, description FROM expenses WHERE username = ?"
+    params = [username]
+    if start is not None:
+        query += " AND date >= ?"
+        params.append(str(start))
+    if end is not None:
+        query += " AND date < ?"
+        params.append(str(end))
+    hot = pd.DataFrame(get_connection().execute(query, params).fetchall(), columns=ARCHIVE_COLUMNS)
+    cold = load_archived_expenses(username, ExpenseFilters(start=start, end=end))
+    if cold is not None and cold.num_rows:
+        cold = cold.to_pandas()
+        cold["category"] = cold["category"].astype(object)
+        hot = pd.concat([cold[~cold["id"].isin(hot["id"])], hot], ignore_index=True)
+    hot = hot.sort_values(["date", "id"], ignore_index=True)
+    hot.columns = [EXPENSE_ID] + EXPENSE_COLUMNS
+    return hot
+
+
+def export_user_data(username: str, path, fmt: Optional[str] = None) -> int:
+    """Writes a user's whole expense history as CSV or Parquet; returns the row count.
+
+    ``path`` may be a file path or a binary buffer. The format follows ``fmt``, or
+    else the file extension.
+    """
+    if fmt is None:
+        fmt = os.path.splitext(path)[1].lstrip(".") if isinstance(path, str) else ""
+    fmt = (fmt or "csv").lower()
+    expenses = load_expense_history(username)
+    if fmt == "parquet":
+        expenses.to_parquet(path, index=False, compression="zstd")
+    elif fmt == "csv":
+        expenses.to_csv(path, index=False)
+    else:
+        raise ValueError(f"Unsupported export format '{fmt}', expected 'csv' or 'parquet'")
+    return len(expenses)
+
+
+# --- REPORT JOBS ---
+REPORT_QUEUED, REPORT_RUNNING, REPORT_DONE, REPORT_FAILED = "queued", "running", "done", "failed"
+_REPORT_JOB_FIELDS = "id, username, kind, period, format, status, data_version, error, submitted_at, finished_at"
+
+
+class ReportJob(NamedTuple):
+    id: int
+    username: str
+    kind: str                       # a REPORT_KINDS key
+    period: str                     # YYYY-MM for a monthly report, YYYY for a year-end summary
+    format: str                     # a REPORT_FORMATS key
+    status: str                     # REPORT_QUEUED, REPORT_RUNNING, REPORT_DONE or REPORT_FAILED
+    data_version: Optional[str]     # report_data_version() of the data it was built from, once started
+    error: Optional[str]
+    submitted_at: str
+    finished_at: Optional[str]
+
+
+def report_data_version(username: str, kind: str, period: str) -> str:
+    """Changes whenever anything a report is built from does: its months' expenses, the budget or the taxes.
+
+    The expense part sums the per-month write counters of the covered months,
+    which only ever grow, so it is two indexed reads however long the history.
+    """
+    if _write_behind is not None and _write_behind.pending(username) is not None:
+        _write_behind.flush(username)
+    months = report_months(kind, period)
+    conn = get_connection()
+    expenses_version = conn.execute(
+        "SELECT COALESCE(SUM(version), 0) FROM expense_versions WHERE username = ? AND month >= ? AND month <= ?",
+        (username, months[0], months[-1])
+    ).fetchone()[0]
+    settings = conn.execute("SELECT budget, tax_summary FROM users WHERE username = ?", (username,)).fetchone()
+    return f"{expenses_version}-{hashlib.sha1(json.dumps(settings).encode()).hexdigest()[:12]}"
+
+
+def submit_report_job(username: str, kind: str, period: str, fmt: str) -> ReportJob:
+    """Queues a report and returns its job, or the job that already covers it.
+
+    That is a queued job for the same report, or one running or done from the
+    current data: a finished report stays cached until its expenses change.
+    """
+    if fmt not in REPORT_FORMATS:
+        raise ValueError(f"Unsupported report format '{fmt}', expected one of {', '.join(REPORT_FORMATS)}")
+    months = report_months(kind, period)
+    period = months[0] if kind == "monthly" else months[0][:4]
+    data_version = report_data_version(username, kind, period)
+
+    def _submit(cursor):
+        row = cursor.execute(f'''
+            SELECT {_REPORT_JOB_FIELDS} FROM report_jobs
+            WHERE username = ? AND kind = ? AND period = ? AND format = ?
+              AND (status = ? OR (status IN (?, ?) AND data_version = ?))
+            ORDER BY id DESC LIMIT 1
+        ''', (username, kind, period, fmt, REPORT_QUEUED, REPORT_RUNNING, REPORT_DONE, data_version)).fetchone()
+        if row is None:
+            cursor.execute(
+                "INSERT INTO report_jobs (username, kind, period, format, status) VALUES (?, ?, ?, ?, ?)",
+                (username, kind, period, fmt, REPORT_QUEUED)
+            )
+            row = cursor.execute(
+                f"SELECT {_REPORT_JOB_FIELDS} FROM report_jobs WHERE id = ?", (cursor.lastrowid,)
+            ).fetchone()
+        return ReportJob(*row)
+
+    return run_in_transaction(_submit)
+
+
+def claim_report_jobs(limit: int, per_user: int) -> list:
+    """Marks up to ``limit`` queued jobs as running in this process, oldest first.
+
+    Users who already have ``per_user`` jobs running, in any process, are
+    skipped, so one user queueing many reports cannot hold every worker.
+    """
+    if limit <= 0:
+        return []
+
+    def _claim(cursor):
+        running = dict(cursor.execute(
+            "SELECT username, COUNT(*) FROM report_jobs WHERE status = ? GROUP BY username", (REPORT_RUNNING,)
+        ).fetchall())
+        claimed = []
+        for row in cursor.execute(
+            f"SELECT {_REPORT_JOB_FIELDS} FROM report_jobs WHERE status = ? ORDER BY id", (REPORT_QUEUED,)
+        ).fetchall():
+            job = ReportJob(*row)
+            if running.get(job.username, 0) < per_user:
+                running[job.username] = running.get(job.username, 0) + 1
+                claimed.append(job._replace(status=REPORT_RUNNING))
+                if len(claimed) == limit:
+                    break
+        cursor.executemany(
+            "UPDATE report_jobs SET status = ?, worker_pid = ?, started_at = CURRENT_TIMESTAMP WHERE id = ?",
+            [(REPORT_RUNNING, os.getpid(), job.id) for job in claimed]
+        )
+        return claimed
+
+    return run_in_transaction(_claim)
+
+
+def start_report_job(job_id: int, data_version: str):
+    run_in_transaction(lambda cursor: cursor.execute(
+        "UPDATE report_jobs SET data_version = ? WHERE id = ?", (data_version, job_id)
+    ))
+
+
+def finish_report_job(job_id: int, result: Optional[bytes] = None, error: Optional[str] = None):
+    """Stores a job's result, or its error, and drops older finished runs of the same report."""
+    def _finish(cursor):
+        cursor.execute(
+            "UPDATE report_jobs SET status = ?, result = ?, error = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (REPORT_FAILED if error is not None else REPORT_DONE, result, error, job_id)
+        )
+        cursor.execute('''
+            DELETE FROM report_jobs WHERE id < ? AND status IN (?, ?) AND (username, kind, period, format) =
+                (SELECT username, kind, period, format FROM report_jobs WHERE id = ?)
+        ''', (job_id, REPORT_DONE, REPORT_FAILED, job_id))
+
+    run_in_transaction(_finish)
+
+
+def _process_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def requeue_interrupted_report_jobs() -> int:
+    """Queues again the jobs left running by processes that have since exited; returns how many."""
+    rows = get_connection().execute(
+        "SELECT id, worker_pid FROM report_jobs WHERE status = ?", (REPORT_RUNNING,)
+    ).fetchall()
+    interrupted = [(REPORT_QUEUED, job_id, REPORT_RUNNING) for job_id, pid in rows
+                   if pid != os.getpid() and not _process_alive(pid)]
+    if interrupted:
+        run_in_transaction(lambda cursor: cursor.executemany(
+            "UPDATE report_jobs SET status = ?, worker_pid = NULL, data_version = NULL, started_at = NULL "
+            "WHERE id = ? AND status = ?", interrupted
+        ))
+    return len(interrupted)
+
+
+def load_report_job(username: str, job_id: int) -> Optional[ReportJob]:
+    row = get_connection().execute(
+        f"SELECT {_REPORT_JOB_FIELDS} FROM report_jobs WHERE id = ? AND username = ?", (job_id, username)
+    ).fetchone()
+    return ReportJob(*row) if row else None
+
+
+def list_report_jobs(username: str, limit: int = 10) -> list:
+    """The user's most recent report jobs, newest first."""
+    rows = get_connection().execute(
+        f"SELECT {_REPORT_JOB_FIELDS} FROM report_jobs WHERE username = ? ORDER BY id DESC LIMIT ?", (username, limit)
+    ).fetchall()
+    return [ReportJob(*row) for row in rows]
+
+
+def load_report_result(username: str, job_id: int) -> Optional[bytes]:
+    row = get_connection().execute(
+        "SELECT result FROM report_jobs WHERE id = ? AND username = ? AND status = ?", (job_id, username, REPORT_DONE)
+    ).fetchone()
+    return row[0] if row else None
+
+
+@instrumentation.timed("db.load_report")
+def load_report(username: str, kind: str, period: str) -> Report:
+    """Builds a monthly report or year-end summary, mostly from the aggregates of the months it covers."""
+    if _write_behind is not None and _write_behind.pending(username) is not None:
+        _write_behind.flush(username)
+    months = report_months(kind, period)
+    window = (username, months[0], months[-1])
+    conn = get_connection()
+    category_months = pd.DataFrame(conn.execute(
+        "SELECT month, category, total_cents / 100.0, count FROM expense_aggregates "
+        "WHERE username = ? AND month >= ? AND month <= ?", window
+    ).fetchall(), columns=["month", "category", "total", "count"])
+    merchant_months = pd.DataFrame(conn.execute(
+        "SELECT month, merchant, total_cents / 100.0, count FROM merchant_aggregates "
+        "WHERE username = ? AND month >= ? AND month <= ?", window
+    ).fetchall(), columns=["month", "merchant", "total", "count"])
+    settings = conn.execute("SELECT budget, tax_summary FROM users WHERE username = ?", (username,)).fetchone()
+    budget, tax_summary = (json.loads(value) if value else {} for value in (settings or (None, None)))
+
+    if kind == "monthly":
+        # Only the month's largest expenses need individual rows
+        expenses = load_expense_history(username, f"{months[0]}-01", f"{shift_month(months[0], 1)}-01")
+        return monthly_report(category_months, merchant_months, expenses, budget, months[0])
+    return year_end_summary(category_months, merchant_months, tax_summary, months[0][:4])
+
+
+# --- WRITE-BEHIND ---
+WRITE_BEHIND_MAX_STALENESS = float(os.environ.get("FINPAL_WRITE_BEHIND_MAX_STALENESS", "2.0"))
+WRITE_BEHIND_DEBOUNCE = 0.25
+# Attempts at a failing batch before the worker gives up on it until the next save or flush
+WRITE_BEHIND_MAX_RETRIES = 3
+
+
+class WriteBehindWorker:
+    """Background thread that coalesces session saves per user and commits them in batches.
+
+    Each save is queued as the session's user metadata plus its expense changes
+    (upserted rows and deleted IDs). Changes queued for the same user are merged,
+    so a burst of reruns costs a single write. Queued saves are committed once no
+    newer save has arrived for ``debounce`` seconds, and never later than
+    ``max_staleness`` seconds after the first one was queued. All due users are
+    written in one transaction.
+
+    A batch that fails ``WRITE_BEHIND_MAX_RETRIES`` times in a row is set aside
+    rather than retried forever; its saves are still returned by pending(), are
+    merged into the user's next save, and are written inline by flush().
+    """
+
+    def __init__(self, max_staleness: float = WRITE_BEHIND_MAX_STALENESS, debounce: float = WRITE_BEHIND_DEBOUNCE):
+        self.max_staleness = max_staleness
+        self.debounce = min(debounce, max_staleness)
+        self._cond = threading.Condition()
+        self._pending = {}  # username -> PendingSave
+        self._failed = {}   # username -> PendingSave the worker gave up on
+        self._flush_users = set()
+        self._flushing = False
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="finpal-write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, username: str, data: Dict[str, Any], upserts: pd.DataFrame, deleted_ids):
+        now = time.monotonic()
+        with self._cond:
+            queued = self._pending.get(username) or self._failed.pop(username, None)
+            if queued is not None:
+                upserts = pd.concat([queued.upserts, upserts]).drop_duplicates(EXPENSE_ID, keep="last")
+                deleted_ids = queued.deleted_ids.union(deleted_ids)
+            upserts = upserts[~upserts[EXPENSE_ID].isin(deleted_ids)]
+            self._pending[username] = PendingSave(
+                data, upserts, pd.Index(deleted_ids, dtype="int64"), queued.first_queued if queued else now, now
+            )
+            self._cond.notify_all()
+
+    def pending(self, username: str) -> Optional["PendingSave"]:
+        with self._cond:
+            return self._pending.get(username) or self._failed.get(username)
+
+    def flush(self, username: Optional[str] = None, timeout: Optional[float] = None):
+        """Blocks until every queued save, or just ``username``'s, has been committed.
+
+        Waits at most ``timeout`` seconds, by default long enough for the worker
+        to retry a failing batch. Saves still queued then, or given up on, are
+        written inline on the calling thread, so a failure raises here instead
+        of blocking the caller.
+        """
+        if timeout is None:
+            timeout = self.max_staleness * (WRITE_BEHIND_MAX_RETRIES + 1)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if username is None:
+                self._flushing = True
+            else:
+                self._flush_users.add(username)
+            self._cond.notify_all()
+            while self._thread.is_alive() and (username in self._pending if username else self._pending):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if username is None:
+                self._flushing = False
+            leftover = {
+                user: queued for user, queued in {**self._failed, **self._pending}.items()
+                if username is None or user == username
+            }
+            for user, queued in leftover.items():
+                self._failed.pop(user, None)
+                if self._pending.get(user) is queued:
+                    del self._pending[user]
+        if leftover:
+            logger.warning("Write-behind did not commit %s in time; saving inline", ", ".join(leftover))
+            try:
+                self._write(leftover)
+            except Exception:
+                self._set_aside(leftover)
+                raise
+
+    def stop(self, timeout: Optional[float] = None):
+        """Commits everything still queued, then stops the worker thread.
+
+        Waits at most ``timeout`` seconds (see flush); saves that could not be
+        written by then are logged and dropped.
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        try:
+            self.flush(timeout=timeout)
+        except Exception:
+            logger.exception("Dropping queued saves that could not be written at shutdown")
+        with self._cond:
+            self._pending.clear()
+            self._failed.clear()
+            self._cond.notify_all()
+        self._thread.join(self.max_staleness)
+
+    def _next_batch(self):
+        with self._cond:
+            while True:
+                if not self._pending and self._stopped:
+                    return None
+                now = time.monotonic()
+                if self._flushing or self._stopped:
+                    return dict(self._pending)
+                due = {
+                    username: queued for username, queued in self._pending.items()
+                    if username in self._flush_users
+                    or now - queued.last_queued >= self.debounce
+                    or now - queued.first_queued >= self.max_staleness
+                }
+                if due:
+                    self._flush_users.difference_update(due)
+                    return due
+                deadlines = [
+                    min(queued.last_queued + self.debounce, queued.first_queued + self.max_staleness)
+                    for queued in self._pending.values()
+                ]
+                self._cond.wait(min(deadlines) - now if deadlines else None)
+
+    def _run(self):
+        failures = 0
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._commit(batch)
+                failures = 0
+            except Exception:
+                failures += 1
+                if failures < WRITE_BEHIND_MAX_RETRIES:
+                    logger.exception("Write-behind commit failed for %s; retrying", ", ".join(batch))
+                    with self._cond:
+                        self._cond.wait_for(lambda: self._stopped, self.max_staleness)
+                else:
+                    logger.exception(
+                        "Write-behind commit failed %d times for %s; keeping it for the next save or flush",
+                        failures, ", ".join(batch),
+                    )
+                    self._set_aside(batch)
+                    failures = 0
+
+    def _set_aside(self, batch):
+        with self._cond:
+            for username, queued in batch.items():
+                if self._pending.get(username) is queued:
+                    del self._pending[username]
+                # A save queued meanwhile was merged with this one, so it already carries these changes
+                if username not in self._pending:
+                    self._failed[username] = queued
+            self._cond.notify_all()
+
+    def _write(self, batch):
+        prepared = [
+            (
+                username, queued.data, json.dumps(queued.data.get("budget", {})),
+                json.dumps(queued.data.get("tax_summary", {})), queued.upserts,
+                (queued.upserts.iloc[:0], queued.upserts, queued.deleted_ids)
+            )
+            for username, queued in batch.items()
+        ]
+        run_in_transaction(lambda cursor: [_save_user_data(cursor, *args) for args in prepared])
+
+    def _commit(self, batch):
+        self._write(batch)
+        with self._cond:
+            for username, queued in batch.items():
+                # Keep a save that was queued while this batch was being written
+                if self._pending.get(username) is queued:
+                    del self._pending[username]
+            self._cond.notify_all()
+
+
+class PendingSave(NamedTuple):
+    data: Dict[str, Any]        # user metadata: budget, income, state, ...
+    upserts: pd.DataFrame       # normalized expense rows to insert or update, all with IDs
+    deleted_ids: pd.Index
+    first_queued: float
+    last_queued: float
+
+
+_write_behind: Optional[WriteBehindWorker] = None
+
+
+def enable_write_behind(max_staleness: float = WRITE_BEHIND_MAX_STALENESS, debounce: float = WRITE_BEHIND_DEBOUNCE):
+    """Makes persist_session queue saves for a background worker instead of writing inline."""
+    global _write_behind
+    if _write_behind is None:
+        _write_behind = WriteBehindWorker(max_staleness, debounce)
+        atexit.register(disable_write_behind)
+    return _write_behind
+
+
+def disable_write_behind():
+    """Flushes any queued saves and goes back to writing inline."""
+    global _write_behind
+    worker, _write_behind = _write_behind, None
+    if worker is not None:
+        worker.stop()
+
+
+def flush_expenses_in(username: str, start: Optional[str] = None, end: Optional[str] = None):
+    """Commits the user's queued save if it changes expenses dated in ``[start, end)``.
+
+    Bounds are ``YYYY-MM`` months or ISO dates; None is open. A save that only
+    changes metadata such as the budget, or other months, stays queued, so
+    readers of a few months' aggregates do not turn write-behind into inline writes.
+    """
+    pending = _write_behind.pending(username) if _write_behind is not None else None
+    if pending is None or (pending.upserts.empty and not len(pending.deleted_ids)):
+        return
+    if start is not None or end is not None:
+        dates = pending.upserts["Date"].dropna().astype(str)
+        in_range = pd.Series(True, index=dates.index)
+        if start is not None:
+            in_range &= dates >= start
+        if end is not None:
+            in_range &= dates < end
+        # An edit or delete can also move a stored row out of the range
+        changed_ids = [int(i) for i in pending.upserts[EXPENSE_ID]] + [int(i) for i in pending.deleted_ids]
+        query = "SELECT 1 FROM expenses WHERE username = ? AND id IN (SELECT value FROM json_each(?))"
+        params = [username, json.dumps(changed_ids)]
+        if start is not None:
+            query += " AND date >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND date < ?"
+            params.append(end)
+        if not in_range.any() and get_connection().execute(query + " LIMIT 1", params).fetchone() is None:
+            return
+    _write_behind.flush(username)
+
+
+if os.environ.get("FINPAL_WRITE_BEHIND") == "1":
+    enable_write_behind()
+
 # --- SAVE STATE ---
+def session_fingerprint(data: Dict[str, Any]) -> str:
+    """Digest of everything persist_session would write, used to skip saves that change nothing."""
+    digest = hashlib.sha1(json.dumps([
+        data.get("budget", {}), data.get("income", 0), data.get("state", "NY"),
+        bool(data.get("nyc_resident", False)), data.get("tax_summary", {})
+    ], sort_keys=True, default=str).encode())
+    expenses = _normalize_expenses(data.get("expenses", {}))
+    digest.update(pd.util.hash_pandas_object(expenses, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+@instrumentation.timed("db.persist_session")
 def persist_session(username: str):
     if "budget" not in st.session_state:
         return  # Avoid persisting if state hasn't loaded
 
-    expenses_df = st.session_state.get("expenses")
-    if not isinstance(expenses_df, pd.DataFrame):
-        expenses_df = pd.DataFrame(columns=["Date", "Amount", "Category", "Description"])
+    expenses = st.session_state.get("expenses")
+    if isinstance(expenses, ExpenseStore):
+        expenses_df = expenses.to_frame()
+    elif isinstance(expenses, pd.DataFrame):
+        expenses_df = expenses
+    else:
+        expenses_df = pd.DataFrame(columns=[EXPENSE_ID] + EXPENSE_COLUMNS)
 
-    save_user_data(username, {
+    data = {
         "budget": st.session_state.get("budget", {}),
         "income": st.session_state.get("annual_income", 0),
         "state": st.session_state.get("selected_state", "NY"),
-        "expenses": expenses_df.to_dict(),
+        "expenses": expenses_df,
         "nyc_resident": st.session_state.get("nyc_resident", False),
         "tax_summary": st.session_state.get("tax_summary", {})
-    })
+    }
+    if session_fingerprint(data) == st.session_state.get("persisted_fingerprint"):
+        return  # Nothing changed since the last save
+
+    if _write_behind is not None:
+        # Only new rows touch the database here, to reserve their IDs
+        saved = assign_expense_ids(expenses_df)
+        snapshot = st.session_state.get("expenses_snapshot")
+        _, upserts, deleted_ids = diff_expenses(saved, snapshot if snapshot is not None else expense_fingerprints(saved.iloc[:0]))
+        metadata = copy.deepcopy({key: value for key, value in data.items() if key != "expenses"})
+        _write_behind.submit(username, metadata, upserts, deleted_ids)
+    else:
+        saved = save_user_data(username, data, snapshot=st.session_state.get("expenses_snapshot"))
+
+    # New rows now carry their IDs, and the snapshot reflects what is stored
+    saved = ExpenseStore.from_frame(saved)
+    st.session_state.expenses = saved
+    st.session_state.expenses_snapshot = expense_fingerprints(saved)
+    st.session_state.persisted_fingerprint = session_fingerprint({**data, "expenses": saved})
 
 # --- INITIALIZE SESSION STATE ---
 def initialize_session_from_user_data(user_data: Dict[str, Any]):
@@ -134,10 +1837,18 @@ def initialize_session_from_user_data(user_data: Dict[str, Any]):
     st.session_state.budget = user_data.get("budget", {})
     st.session_state.annual_income = user_data.get("income", 0)
     st.session_state.selected_state = user_data.get("state", "NY")
-    expenses_dict = user_data.get("expenses", {})
-    st.session_state.expenses = (
-        pd.DataFrame(expenses_dict)
-        if expenses_dict else pd.DataFrame(columns=["Date", "Amount", "Category", "Description"])
-    )
+    expenses = user_data.get("expenses")
+    if not isinstance(expenses, ExpenseStore):
+        expenses = ExpenseStore.from_frame(pd.DataFrame(expenses or {column: [] for column in [EXPENSE_ID] + EXPENSE_COLUMNS}))
+    st.session_state.expenses = expenses
+    st.session_state.expenses_snapshot = expense_fingerprints(st.session_state.expenses)
     st.session_state.nyc_resident = user_data.get("nyc_resident", False)
     st.session_state.tax_summary = user_data.get("tax_summary", {})
+    st.session_state.persisted_fingerprint = session_fingerprint({
+        "budget": st.session_state.budget,
+        "income": st.session_state.annual_income,
+        "state": st.session_state.selected_state,
+        "expenses": st.session_state.expenses,
+        "nyc_resident": st.session_state.nyc_resident,
+        "tax_summary": st.session_state.tax_summary
+    })
@@ -0,0 +1,137 @@
+"""Background generation of FinPal reports, off the Streamlit script thread.
+
+Jobs and their results live in the report_jobs table (see db_manager), so the
+UI only submits a job and polls its status, a report survives the session
+that asked for it, and jobs left running by a process that died are picked
+up again by the next one. A finished report is served from the table until
+the expenses it covers, the budget or the tax summary change.
+
+Reports read the maintained aggregates plus at most a month of expenses, so
+a small thread pool is enough; sqlite3 and most of pandas release the GIL.
+Each user may have only REPORT_JOBS_PER_USER jobs running at once. It can
+also be run once from the command line, e.g. for a year-end batch:
+
+    python report_jobs.py alice --kind year_end --period 2025 --format html --out alice_2025.html
+"""
+import argparse
+import atexit
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import db_manager
+from utils import instrumentation
+from utils.reports import REPORT_FORMATS, REPORT_KINDS, render_report
+
+REPORT_WORKERS = int(os.environ.get("FINPAL_REPORT_WORKERS", "2"))
+REPORT_JOBS_PER_USER = int(os.environ.get("FINPAL_REPORT_JOBS_PER_USER", "1"))
+# How often the UI re-checks a pending job
+REPORT_POLL_SECONDS = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+class ReportJobQueue:
+    """Runs queued report jobs on a thread pool, claiming them from SQLite as workers free up.
+
+    Claiming is a single transaction that skips users at their running limit,
+    so the cap holds across every process sharing the database.
+    """
+
+    def __init__(self, workers: int = REPORT_WORKERS, per_user: int = REPORT_JOBS_PER_USER):
+        self.workers = workers
+        self.per_user = per_user
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="finpal-report")
+        db_manager.requeue_interrupted_report_jobs()
+        self.dispatch()
+
+    def submit(self, username: str, kind: str, period: str, fmt: str) -> db_manager.ReportJob:
+        """Queues a report and returns its job at once; a cached or duplicate request returns the existing job."""
+        job = db_manager.submit_report_job(username, kind, period, fmt)
+        if job.status == db_manager.REPORT_QUEUED:
+            self.dispatch()
+        return job
+
+    def dispatch(self):
+        """Starts as many queued jobs as there are idle workers."""
+        with self._lock:
+            jobs = db_manager.claim_report_jobs(self.workers - self._in_flight, self.per_user)
+            self._in_flight += len(jobs)
+        for job in jobs:
+            self._executor.submit(self._run, job)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job):
+        try:
+            with instrumentation.span(f"reports.{job.kind}"):
+                # Read before the data, so a change made while building makes the result stale, not wrong
+                db_manager.start_report_job(
+                    job.id, db_manager.report_data_version(job.username, job.kind, job.period)
+                )
+                report = db_manager.load_report(job.username, job.kind, job.period)
+                db_manager.finish_report_job(job.id, result=render_report(report, job.format))
+        except Exception as e:
+            logger.exception("Report job %s (%s %s for %s) failed", job.id, job.kind, job.period, job.username)
+            db_manager.finish_report_job(job.id, error=f"{type(e).__name__}: {e}")
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self.dispatch()
+
+
+_queue: Optional[ReportJobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_report_queue() -> ReportJobQueue:
+    """The process-wide queue, started on first use and shared by every session."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = ReportJobQueue()
+            atexit.register(_queue.shutdown, wait=False)
+        return _queue
+
+
+def wait_for_report(username: str, job_id: int, timeout: Optional[float] = None) -> db_manager.ReportJob:
+    """Polls a job until it is done or failed, or ``timeout`` seconds have passed."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        job = db_manager.load_report_job(username, job_id)
+        if job is None or job.status in (db_manager.REPORT_DONE, db_manager.REPORT_FAILED):
+            return job
+        if deadline is not None and time.monotonic() >= deadline:
+            return job
+        time.sleep(REPORT_POLL_SECONDS / 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("username")
+    parser.add_argument("--kind", choices=list(REPORT_KINDS), default="monthly")
+    parser.add_argument("--period", required=True, help="YYYY-MM for a monthly report, YYYY for a year-end summary")
+    parser.add_argument("--format", choices=list(REPORT_FORMATS), default="html")
+    parser.add_argument("--out", required=True, help="file to write the report to")
+    parser.add_argument("--db", default=db_manager.DB_PATH, help="SQLite database (default: %(default)s)")
+    args = parser.parse_args()
+
+    db_manager.DB_PATH = args.db
+    db_manager.init_db()
+    job = get_report_queue().submit(args.username, args.kind, args.period, args.format)
+    job = wait_for_report(args.username, job.id)
+    if job.status != db_manager.REPORT_DONE:
+        raise SystemExit(f"Report failed: {job.error}")
+    with open(args.out, "wb") as f:
+        f.write(db_manager.load_report_result(args.username, job.id))
+    print(f"Wrote {REPORT_KINDS[args.kind].lower()} for {args.username}, {job.period}, to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
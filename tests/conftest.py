@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Let the tests import the app modules and benchmarks.synthetic when run from anywhere,
+# and find the bracket and rule CSVs, which the app reads relative to the repository root
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Points db_manager at a fresh database and archive under tmp_path."""
+    import db_manager
+
+    db_manager.close_connections()
+    monkeypatch.setattr(db_manager, "DB_PATH", str(tmp_path / "finpal.db"))
+    monkeypatch.setattr(db_manager, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    db_manager.init_db()
+    yield db_manager.DB_PATH
+    db_manager.close_connections()
@@ -0,0 +1,109 @@
+import os
+
+import pandas as pd
+import pytest
+
+import db_manager
+
+USER = "alice"
+CATEGORIES = ["Groceries", "Dining Out", "Transportation"]
+# Four expenses a day over January to April 2025, with repeated amounts so pages break ties by ID
+EXPENSES = [
+    (str(day.date()), float(10 + (day.day + i) % 7), CATEGORIES[(day.day + i) % 3], f"SHOP {(day.day * 4 + i) % 11}")
+    for day in pd.date_range("2025-01-01", "2025-04-30") for i in range(4)
+]
+BEFORE = "2025-03-01"
+
+
+@pytest.fixture
+def expenses(temp_db):
+    db_manager.save_user_data(USER, {
+        "budget": {}, "income": 50000, "state": "NY",
+        "expenses": pd.DataFrame(EXPENSES, columns=db_manager.EXPENSE_COLUMNS),
+    })
+    return db_manager.load_expense_history(USER)
+
+
+def hot_dates():
+    return [row[0] for row in db_manager.get_connection().execute(
+        "SELECT date FROM expenses WHERE username = ?", (USER,)
+    )]
+
+
+def all_pages(filters=db_manager.ExpenseFilters(), sort="Date", descending=True, page_size=25):
+    pages, after = [], None
+    while True:
+        page = db_manager.load_expense_page(USER, filters, sort, descending, after, page_size, with_totals=False)
+        pages.append(page.expenses)
+        after = page.next_cursor
+        if after is None:
+            return pd.concat(pages, ignore_index=True)
+
+
+def test_archive_moves_closed_months_to_parquet(expenses):
+    totals = db_manager.count_expenses(USER)
+    archived = db_manager.archive_closed_months(USER, before=BEFORE)
+
+    assert archived == (expenses["Date"] < BEFORE).sum()
+    assert db_manager.archived_months(USER) == ["2025-01", "2025-02"]
+    assert os.path.exists(db_manager._archive_path(USER, "2025-01"))
+    assert min(hot_dates()) >= BEFORE
+    # The aggregates still count archived rows
+    assert db_manager.count_expenses(USER) == totals
+    assert db_manager.load_archived_expenses(USER).num_rows == archived
+
+
+def test_readers_stitch_archived_and_live_rows(expenses):
+    db_manager.archive_closed_months(USER, before=BEFORE)
+
+    pd.testing.assert_frame_equal(db_manager.load_expense_history(USER), expenses, check_dtype=False)
+    loaded = db_manager.load_user_data(USER)["expenses"].to_frame()
+    assert loaded[db_manager.EXPENSE_ID].tolist() == expenses[db_manager.EXPENSE_ID].tolist()
+    window = db_manager.load_user_data(USER, start="2025-02-15", end="2025-03-15")["expenses"].to_frame()
+    assert window["Date"].min() == "2025-02-15" and window["Date"].max() == "2025-03-14"
+
+    filters = db_manager.ExpenseFilters(start="2025-02-01", categories=("Groceries",), search="shop 1")
+    matching = expenses[
+        (expenses["Date"] >= "2025-02-01") & (expenses["Category"] == "Groceries")
+        & expenses["Description"].str.contains("SHOP 1", regex=False)
+    ]
+    assert db_manager.count_expenses(USER, filters) == (len(matching), round(matching["Amount"].sum(), 2))
+
+
+@pytest.mark.parametrize("sort", ["Date", "Amount"])
+@pytest.mark.parametrize("descending", [True, False])
+@pytest.mark.parametrize("page_size", [7, 50])
+def test_pages_cross_the_archive_boundary(expenses, sort, descending, page_size):
+    db_manager.archive_closed_months(USER, before=BEFORE)
+    expected = expenses.sort_values([sort, db_manager.EXPENSE_ID], ascending=not descending, ignore_index=True)
+
+    pages = all_pages(sort=sort, descending=descending, page_size=page_size)
+    assert pages[db_manager.EXPENSE_ID].tolist() == expected[db_manager.EXPENSE_ID].tolist()
+
+    filters = db_manager.ExpenseFilters(start="2025-02-10", end="2025-03-20", min_amount=12)
+    pages = all_pages(filters, sort=sort, descending=descending, page_size=page_size)
+    expected = expected[(expected["Date"] >= "2025-02-10") & (expected["Date"] < "2025-03-20") & (expected["Amount"] >= 12)]
+    assert pages[db_manager.EXPENSE_ID].tolist() == expected[db_manager.EXPENSE_ID].tolist()
+
+
+def test_interrupted_archive_shows_and_counts_rows_once(expenses, monkeypatch):
+    def interrupted(fn, *args):
+        raise KeyboardInterrupt
+
+    # The month files are written, but the rows never leave the expenses table
+    with monkeypatch.context() as patch:
+        patch.setattr(db_manager, "run_in_transaction", interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            db_manager.archive_closed_months(USER, before=BEFORE)
+    assert db_manager.archived_months(USER) == ["2025-01", "2025-02"]
+    assert len(hot_dates()) == len(expenses)
+
+    filters = db_manager.ExpenseFilters(start="2025-01-15")
+    matching = expenses[expenses["Date"] >= "2025-01-15"]
+    assert db_manager.count_expenses(USER, filters) == (len(matching), round(matching["Amount"].sum(), 2))
+    assert all_pages(filters, page_size=30)[db_manager.EXPENSE_ID].tolist() == matching[db_manager.EXPENSE_ID][::-1].tolist()
+    pd.testing.assert_frame_equal(db_manager.load_expense_history(USER), expenses, check_dtype=False)
+
+    # Archiving again finishes the move
+    db_manager.archive_closed_months(USER, before=BEFORE)
+    assert db_manager.count_expenses(USER, filters) == (len(matching), round(matching["Amount"].sum(), 2))
@@ -0,0 +1,96 @@
+import json
+
+import bcrypt
+import pytest
+
+import db_manager
+import user_auth_storage as auth
+
+
+@pytest.fixture
+def users(temp_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(auth, "AUTH_KEY_PATH", str(tmp_path / "auth_key"))
+    monkeypatch.setattr(auth, "_auth_key", None)
+    monkeypatch.delenv("FINPAL_AUTH_KEY", raising=False)
+    auth.provision_users([
+        {"username": "Alice", "name": "Alice A", "password": "alice-pw"},
+        {"username": "bob", "name": "Bob B", "email": "bob@example.com", "password": "bob-pw"},
+    ], rounds=4)
+    return temp_db
+
+
+def test_check_password(users):
+    assert auth.check_password("Alice", "alice-pw").name == "Alice A"
+    assert auth.check_password("Alice", "bob-pw") is None
+    assert auth.check_password("carol", "alice-pw") is None
+
+
+def test_usernames_are_case_sensitive(users):
+    assert auth.check_password("alice", "alice-pw") is None
+    assert auth.check_password("Bob", "bob-pw") is None
+    auth.provision_users([{"username": "alice", "password": "other-pw"}], rounds=4)
+    assert auth.check_password("alice", "other-pw").username == "alice"
+    assert auth.check_password("Alice", "alice-pw").username == "Alice"
+
+
+def test_token_invalidated_by_password_change(users):
+    token = auth.issue_token(auth.check_password("Alice", "alice-pw"))
+    assert auth.verify_token(token).username == "Alice"
+
+    auth.set_password("Alice", "new-pw")
+    assert auth.verify_token(token) is None
+    assert auth.check_password("Alice", "alice-pw") is None
+    new_token = auth.issue_token(auth.check_password("Alice", "new-pw"))
+    assert auth.verify_token(new_token).username == "Alice"
+
+    auth.remove_user("Alice")
+    assert auth.verify_token(new_token) is None
+
+
+def test_token_needs_signing_key(users, monkeypatch):
+    token = auth.issue_token(auth.check_password("bob", "bob-pw"))
+    monkeypatch.setattr(auth, "_auth_key", "another signing key of at least 32 bytes")
+    assert auth.verify_token(token) is None
+    assert auth.verify_token("not a token") is None
+
+
+def test_provisioning_keeps_unchanged_users(users):
+    before = db_manager.load_credential("bob")
+    written = auth.provision_users([{"username": "bob", "name": "Bob B", "email": "bob@example.com",
+                                     "password_hash": before.password_hash}])
+    assert written == 0
+    assert db_manager.load_credential("bob").version == before.version
+
+
+def test_credentials_json_moves_into_database(tmp_path, monkeypatch):
+    hashed = bcrypt.hashpw(b"legacy-pw", bcrypt.gensalt(4)).decode()
+    (tmp_path / db_manager.LEGACY_CREDENTIALS_FILE).write_text(json.dumps({"usernames": {
+        "Dana": {"name": "Dana D", "email": "dana@example.com", "password": hashed},
+        "eve": {"name": "Eve E", "password": hashed},
+    }}))
+    db_manager.close_connections()
+    monkeypatch.setattr(db_manager, "DB_PATH", str(tmp_path / "finpal.db"))
+    try:
+        db_manager.init_db()
+        assert auth.check_password("Dana", "legacy-pw").email == "dana@example.com"
+        assert auth.check_password("eve", "legacy-pw").name == "Eve E"
+        assert auth.check_password("dana", "legacy-pw") is None
+    finally:
+        db_manager.close_connections()
+
+
+def test_login_page(users):
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file("../app.py", default_timeout=60).run()
+    app.text_input[0].input("alice")
+    app.text_input[1].input("alice-pw")
+    app.button[0].click().run()
+    assert app.session_state["authentication_status"] is not True
+    assert app.error
+
+    app.text_input[0].input("Alice")
+    app.button[0].click().run()
+    assert not app.exception
+    assert app.session_state["username"] == "Alice"
+    assert app.session_state["authentication_status"] is True
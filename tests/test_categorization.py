@@ -0,0 +1,36 @@
+import pandas as pd
+
+from benchmarks.categorization import legacy_categorize_expense
+from benchmarks.synthetic import synthetic_descriptions
+from utils.categorization import RuleEngine, get_rule_engine, load_rules
+
+
+def test_matches_legacy_chain():
+    rules = load_rules()
+    engine = RuleEngine(rules[~rules["category"].isin(["Gym", "Internet"])])
+    descriptions = pd.concat([synthetic_descriptions(5000), pd.Series(["", "Rent at the CAFE", None])],
+                             ignore_index=True)
+
+    expected = descriptions.map(legacy_categorize_expense)
+    assert engine.categorize(descriptions).tolist() == expected.tolist()
+    assert [engine.categorize_one(d) for d in descriptions] == expected.tolist()
+
+
+def test_first_matching_rule_wins():
+    engine = RuleEngine([
+        (1, "merchant", "uber eats", "Dining Out"),
+        (2, "keyword", "uber", "Transportation"),
+        (3, "regex", r"(?<!net)flix", "Entertainment"),  # not supported by Arrow's regex engine
+        (4, "keyword", "flix", "Subscriptions"),
+    ])
+    descriptions = pd.Series(["UBER EATS 123", "Uber trip", "NETFLIX.COM", "Filmflix", "groceries"],
+                             index=[5, 6, 7, 8, 9])
+
+    categorized = engine.categorize(descriptions)
+    assert categorized.tolist() == ["Dining Out", "Transportation", "Subscriptions", "Entertainment", "Other"]
+    assert categorized.index.tolist() == [5, 6, 7, 8, 9]
+
+
+def test_user_rules_take_precedence():
+    engine = get_rule_engine([(0, "keyword", "whole foods", "Dining Out")])
+    assert engine.categorize(pd.Series(["WHOLE FOODS MARKET", "SUPERMARKET"])).tolist() == ["Dining Out", "Groceries"]
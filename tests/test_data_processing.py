@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.data_processing import calculate_taxes, calculate_taxes_batch
+from utils.tax_brackets import normalize_state
+
+CSV_STATES = sorted(pd.read_csv("normalized_state_brackets_2024.csv")["State"].map(normalize_state).unique())
+INCOMES = [0, 9000, 14600, 14601, 52000, 85000, 250000, 1_250_000]
+RESULT_KEYS = ["standard_deduction", "taxable_income", "federal_tax", "state_tax", "nyc_tax", "total_tax",
+               "net_income"]
+
+
+def assert_matches_scalar(batch, incomes, states, nyc_flags, **kwargs):
+    assert len(batch) == len(incomes)
+    for row, income, state, nyc in zip(batch.itertuples(index=False), incomes, states, nyc_flags):
+        expected = calculate_taxes(income, state, nyc, **kwargs)
+        for key in RESULT_KEYS:
+            assert getattr(row, key) == pytest.approx(expected[key], abs=1e-9), (state, income, nyc, key)
+        assert row.federal_breakdown == expected["federal_breakdown"]
+        assert row.state_breakdown == expected["state_breakdown"]
+
+
+@pytest.mark.parametrize("nyc", [False, True])
+@pytest.mark.parametrize("state", CSV_STATES + ["ZZ"])
+def test_batch_matches_scalar(state, nyc):
+    batch = calculate_taxes_batch(INCOMES, state, nyc, breakdowns=True)
+    assert_matches_scalar(batch, INCOMES, [state] * len(INCOMES), [nyc] * len(INCOMES))
+
+
+@pytest.mark.parametrize("filing_status", ["single", "married", "head_of_household"])
+def test_mixed_batch_matches_scalar(filing_status):
+    rng = np.random.default_rng(0)
+    states = rng.choice(np.array(CSV_STATES + ["ny", " Calif. ", "ZZ"], dtype=object), 300)
+    incomes = np.round(rng.lognormal(11.2, 0.8, 300), 2)
+    nyc_flags = rng.random(300) < 0.5
+    users = pd.DataFrame({"annual_income": incomes, "selected_state": states, "nyc_resident": nyc_flags})
+
+    batch = calculate_taxes_batch(users, year=2025, filing_status=filing_status, breakdowns=True)
+    assert_matches_scalar(batch, incomes, states, nyc_flags, year=2025, filing_status=filing_status)
+
+
+def test_empty_batch():
+    batch = calculate_taxes_batch([], "NY", breakdowns=True)
+    assert batch.empty
+    assert {"gross_income", "state", "federal_tax", "state_tax", "nyc_tax", "total_tax", "net_income",
+            "federal_breakdown", "state_breakdown"} <= set(batch.columns)
+    assert calculate_taxes_batch(pd.DataFrame(columns=["annual_income", "selected_state", "nyc_resident"])).empty
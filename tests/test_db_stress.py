@@ -0,0 +1,39 @@
+import pytest
+
+import db_manager
+from benchmarks.db_stress import run
+
+
+def aggregate_rows(conn, query):
+    return sorted(conn.execute(query).fetchall())
+
+
+@pytest.mark.parametrize("sessions, rounds", [(1, 10), (8, 15)])
+def test_concurrent_sessions(temp_db, sessions, rounds):
+    _, errors = run(sessions, rounds)
+
+    assert errors == []
+    conn = db_manager.get_connection()
+    counts = dict(conn.execute("SELECT username, COUNT(*) FROM expenses GROUP BY username").fetchall())
+    assert counts == {f"stress_user_{i}": rounds for i in range(sessions)}
+    # Every expense keeps its own ID, and each session's expenses are the ones it added
+    assert conn.execute("SELECT COUNT(DISTINCT id) FROM expenses").fetchone()[0] == sessions * rounds
+    for i in range(sessions):
+        descriptions = [row[0] for row in conn.execute(
+            "SELECT description FROM expenses WHERE username = ?", (f"stress_user_{i}",)
+        )]
+        assert sorted(descriptions) == sorted(f"stress {n}" for n in range(rounds))
+
+    assert aggregate_rows(conn, "SELECT username, month, category, total_cents, count FROM expense_aggregates") == \
+        aggregate_rows(conn, """
+            SELECT username, substr(date, 1, 7), COALESCE(category, 'Other'),
+                   SUM(CAST(ROUND(amount * 100) AS INTEGER)), COUNT(*)
+            FROM expenses GROUP BY 1, 2, 3
+        """)
+    assert aggregate_rows(conn, "SELECT username, month, merchant, category, total_cents, count "
+                                "FROM merchant_aggregates") == \
+        aggregate_rows(conn, """
+            SELECT username, substr(date, 1, 7), COALESCE(merchant, ''), COALESCE(category, 'Other'),
+                   SUM(CAST(ROUND(amount * 100) AS INTEGER)), COUNT(*)
+            FROM expenses GROUP BY 1, 2, 3, 4
+        """)
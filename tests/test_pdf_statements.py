@@ -0,0 +1,98 @@
+import sys
+import types
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import PDF_ROWS_PER_PAGE, synthetic_bank_statement, write_pdf_statement
+from utils import pdf_statements
+from utils.data_processing import normalize_dates
+
+
+@pytest.fixture
+def text_cache():
+    """An empty PDF text cache, emptied again afterwards."""
+    pdf_statements.clear_pdf_text_cache()
+    yield
+    pdf_statements.clear_pdf_text_cache()
+
+
+def expected_rows(rows, seed=0):
+    expected = synthetic_bank_statement(rows, seed)
+    expected["Date"] = normalize_dates(expected["Date"])
+    return expected
+
+
+def assert_same_rows(parsed, expected):
+    assert len(parsed) == len(expected)
+    for column in ["Date", "Amount", "Description"]:
+        assert parsed[column].tolist() == expected[column].tolist(), column
+
+
+@pytest.mark.parametrize("pages, workers", [(1, 1), (3, 1), (pdf_statements.PARALLEL_MIN_PAGES, 2)])
+def test_round_trip(tmp_path, text_cache, pages, workers):
+    rows = pages * PDF_ROWS_PER_PAGE - 7  # a short last page
+    path = write_pdf_statement(str(tmp_path / "statement.pdf"), rows, seed=pages)
+
+    parsed = pdf_statements.parse_pdf_statement(path, workers=workers)
+
+    assert_same_rows(parsed, expected_rows(rows, seed=pages))
+    assert parsed["Category"].notna().all()
+
+
+def test_cache_hit(tmp_path, text_cache, monkeypatch):
+    rows = 2 * PDF_ROWS_PER_PAGE
+    path = write_pdf_statement(str(tmp_path / "statement.pdf"), rows)
+    first = pdf_statements.parse_pdf_statement(path, workers=1)
+
+    def no_extraction(*args):
+        raise AssertionError("statement text was extracted again instead of read from the cache")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(pdf_statements, "_extract_file", no_extraction)
+        cached = pdf_statements.parse_pdf_statement(path)
+    assert_same_rows(first, expected_rows(rows))
+    pd.testing.assert_frame_equal(cached, first)
+    # Nothing outlives the process: once the cache is emptied the statement is read again
+    pdf_statements.clear_pdf_text_cache()
+    pd.testing.assert_frame_equal(pdf_statements.parse_pdf_statement(path, workers=1), first)
+    assert sorted(entry.name for entry in tmp_path.iterdir()) == ["statement.pdf"]
+
+
+def test_cache_keeps_only_recent_statements(tmp_path, text_cache, monkeypatch):
+    monkeypatch.setattr(pdf_statements, "PDF_TEXT_CACHE_SIZE", 2)
+    paths = [write_pdf_statement(str(tmp_path / f"statement_{seed}.pdf"), 10, seed=seed) for seed in range(3)]
+    hashes = [pdf_statements.statement_fingerprint(path) for path in paths]
+    for path in paths[:2] + paths[:1] + paths[2:]:
+        pdf_statements.extract_pdf_text(path, workers=1)
+    # The first statement was read again after the second, so the second is the one evicted
+    assert list(pdf_statements._text_cache) == [hashes[0], hashes[2]]
+
+
+def test_upload_uses_same_cache(tmp_path, text_cache, monkeypatch):
+    path = write_pdf_statement(str(tmp_path / "statement.pdf"), PDF_ROWS_PER_PAGE)
+    pdf_statements.parse_pdf_statement(path, workers=1)
+    monkeypatch.setattr(pdf_statements, "_extract_file", lambda *args: pytest.fail("cache miss"))
+
+    with open(path, "rb") as upload:
+        parsed = pdf_statements.parse_pdf_statement(upload)
+
+    assert_same_rows(parsed, expected_rows(PDF_ROWS_PER_PAGE))
+
+
+def test_workers_do_not_run_the_main_script(tmp_path, text_cache, monkeypatch):
+    # Under Streamlit, __main__ is app.py, loaded from its file rather than run with -m
+    script = tmp_path / "app.py"
+    marker = tmp_path / "ran"
+    script.write_text(f"open({str(marker)!r}, 'a').close()\n")
+    main = types.ModuleType("__main__")
+    main.__file__ = str(script)
+    monkeypatch.setitem(sys.modules, "__main__", main)
+    path = write_pdf_statement(str(tmp_path / "statement.pdf"), pdf_statements.PARALLEL_MIN_PAGES * PDF_ROWS_PER_PAGE)
+
+    # An unusual pool size, so the workers are started by this test
+    parsed = pdf_statements.parse_pdf_statement(path, workers=3)
+
+    assert len(parsed) == pdf_statements.PARALLEL_MIN_PAGES * PDF_ROWS_PER_PAGE
+    assert not marker.exists()
+    assert main.__file__ == str(script)
@@ -0,0 +1,135 @@
+import pandas as pd
+import pytest
+
+import db_manager
+import report_jobs
+from utils.reports import Report, render_report
+
+USER = "alice"
+EXPENSES = [
+    ("2025-02-27", 75.0, "Groceries", "WHOLE FOODS MARKET"),
+    ("2025-03-01", 1800.0, "Housing", "RENT PAYMENT APT 4B REF3115"),
+    ("2025-03-04", 62.5, "Groceries", "WHOLE FOODS MARKET"),
+    ("2025-03-11", 37.5, "Groceries", "WHOLE FOODS MARKET"),
+    ("2025-03-15", 48.0, "Dining Out", "CHIPOTLE 1234"),
+    ("2025-03-20", 120.0, "Dining Out", "CARBONE NYC"),
+    ("2025-07-02", 1800.0, "Housing", "RENT PAYMENT APT 4B REF420"),
+]
+SETTINGS = {
+    "budget": {"Groceries": 400, "Dining Out": 100, "Utilities": 90}, "income": 85000, "state": "NY",
+    "tax_summary": {"net_income": 60000.0},
+}
+
+
+def save(expenses, **settings):
+    """Saves ``expenses`` (a frame as returned by an earlier save, IDs included) and the settings."""
+    return db_manager.save_user_data(USER, {**SETTINGS, **settings, "expenses": expenses})
+
+
+@pytest.fixture
+def saved(temp_db):
+    return save(pd.DataFrame(EXPENSES, columns=db_manager.EXPENSE_COLUMNS))
+
+
+def test_monthly_report(saved):
+    report = db_manager.load_report(USER, "monthly", "2025-03")
+
+    assert report.title == "Monthly spending report, March 2025"
+    assert dict(report.summary) == {
+        "Total spent": "$2,068.00", "Total budgeted": "$590.00", "Over budget": "$1,478.00", "Transactions": "5",
+    }
+    by_category = report.tables["Spending by category"].set_index("Category")
+    assert by_category.index.tolist() == ["Housing", "Dining Out", "Groceries", "Utilities"]
+    assert by_category.loc["Dining Out"].tolist() == [100.0, 168.0, -68.0, 2, 0.0812]
+    # Budgeted categories without spending are listed too
+    assert by_category.loc["Utilities"].tolist() == [90.0, 0.0, 90.0, 0, 0.0]
+
+    top = report.tables["Top merchants"]
+    assert top["Merchant"].tolist() == ["rent payment apt", "carbone nyc", "whole foods market", "chipotle"]
+    assert top.set_index("Merchant").loc["whole foods market"].tolist() == [100.0, 2]
+    assert report.tables["Largest expenses"]["Amount"].tolist() == [1800.0, 120.0, 62.5, 48.0, 37.5]
+
+
+def test_year_end_summary(saved):
+    report = db_manager.load_report(USER, "year_end", "2025")
+
+    by_month = report.tables["Spending by month"]
+    assert by_month["Month"].tolist() == [f"2025-{m:02d}" for m in range(1, 13)]
+    assert by_month.set_index("Month")["Total"].to_dict()["2025-03"] == 2068.0
+    assert by_month["Total"].sum() == 3943.0
+    summary = dict(report.summary)
+    assert summary["Largest category"] == "Housing ($3,600.00)"
+    assert summary["Most expensive month"] == "2025-03 ($2,068.00)"
+    assert summary["Saved"] == "$56,057.00"
+    assert summary["Savings rate"] == "93.4%"
+
+
+def test_unknown_report_kind(saved):
+    with pytest.raises(ValueError, match="Unknown report kind"):
+        db_manager.load_report(USER, "weekly", "2025-03")
+
+
+def test_data_version_tracks_what_the_report_reads(saved):
+    version = db_manager.report_data_version(USER, "monthly", "2025-03")
+    assert db_manager.report_data_version(USER, "monthly", "2025-03") == version
+
+    # An expense in another month leaves March's report valid, but not the year's
+    year = db_manager.report_data_version(USER, "year_end", "2025")
+    save(saved.iloc[:-1])
+    assert db_manager.report_data_version(USER, "monthly", "2025-03") == version
+    assert db_manager.report_data_version(USER, "year_end", "2025") != year
+
+    edited = saved.iloc[:-1].copy()
+    edited.loc[edited["Date"] == "2025-03-15", "Amount"] = 50.0
+    save(edited)
+    changed = db_manager.report_data_version(USER, "monthly", "2025-03")
+    assert changed != version
+    save(edited, budget={"Groceries": 450})
+    assert db_manager.report_data_version(USER, "monthly", "2025-03") != changed
+
+
+def test_finished_report_is_served_until_its_expenses_change(saved):
+    queue = report_jobs.ReportJobQueue(workers=1)
+    try:
+        job = queue.submit(USER, "monthly", "2025-03", "csv")
+        job = report_jobs.wait_for_report(USER, job.id, timeout=10)
+        assert job.status == db_manager.REPORT_DONE
+        assert db_manager.load_report_result(USER, job.id).startswith(b"Category,Budget,Spent")
+
+        # Asking again, even as "2025-3", returns the stored result
+        assert queue.submit(USER, "monthly", "2025-3", "csv").id == job.id
+        # Another format is another report
+        assert queue.submit(USER, "monthly", "2025-03", "html").id != job.id
+
+        edited = saved.copy()
+        edited.loc[edited["Date"] == "2025-03-20", "Amount"] = 150.0
+        save(edited)
+        rebuilt = queue.submit(USER, "monthly", "2025-03", "csv")
+        assert rebuilt.id != job.id
+        rebuilt = report_jobs.wait_for_report(USER, rebuilt.id, timeout=10)
+        assert b"Dining Out,100.0,198.0" in db_manager.load_report_result(USER, rebuilt.id)
+        # The stale run is dropped once the new one finishes
+        assert db_manager.load_report_job(USER, job.id) is None
+    finally:
+        queue.shutdown()
+
+
+def test_render_report():
+    report = Report(
+        "Monthly <report>", [("Total spent", "$1,234.50")],
+        {"Spending by category": pd.DataFrame({"Category": ["Dining Out"], "Spent": [1234.5]}),
+         "Largest expenses": pd.DataFrame({"Description": ["<script>alert(1)</script>"], "Amount": [99.0]}),
+         "Top merchants": pd.DataFrame(columns=["Merchant", "Spent"])},
+    )
+    # CSV holds the first table only
+    assert render_report(report, "csv") == b"Category,Spent\nDining Out,1234.5\n"
+
+    page = render_report(report, "html").decode()
+    assert page.startswith("<!DOCTYPE html>")
+    assert "<title>Monthly &lt;report&gt;</title>" in page
+    assert "<th>Total spent</th><td>$1,234.50</td>" in page
+    assert "1,234.50" in page and "&lt;script&gt;" in page and "<script>" not in page
+    assert "<h2>Top merchants</h2><p>None</p>" in page
+
+    with pytest.raises(ValueError, match="Unsupported report format"):
+        render_report(report, "pdf")
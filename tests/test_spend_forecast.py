@@ -0,0 +1,118 @@
+import pandas as pd
+import pytest
+
+import db_manager
+from utils.spend_forecast import detect_recurring, forecast_spending, merchant_key, suggested_budgets
+
+MONTH = "2025-07"
+# The trailing closed months detect_recurring looks at for MONTH
+WINDOW = ["2025-01", "2025-02", "2025-03", "2025-04", "2025-05", "2025-06"]
+
+
+def merchant_months(charges):
+    """Merchant aggregate rows from ``{merchant: {month: (total, count)}}``."""
+    return pd.DataFrame([
+        (merchant, month, category, total, count)
+        for (merchant, category), months in charges.items()
+        for month, (total, count) in months.items()
+    ], columns=["merchant", "month", "category", "total", "count"])
+
+
+def monthly(amount, months=WINDOW):
+    return {month: (amount, 1) for month in months}
+
+
+def recurring_merchants(charges, **kwargs):
+    return detect_recurring(merchant_months(charges), MONTH, **kwargs)["Merchant"].tolist()
+
+
+def test_monthly_charges_recur():
+    recurring = detect_recurring(merchant_months({
+        ("rent payment apt", "Housing"): monthly(1800.0),
+        ("netflix com", "Subscriptions"): monthly(15.49, WINDOW[2:]),
+    }), MONTH)
+    assert recurring["Merchant"].tolist() == ["rent payment apt", "netflix com"]
+    assert recurring["Expected"].tolist() == [1800.0, 15.49]
+    assert recurring["Months"].tolist() == [6, 4]
+    assert recurring["Last Month"].tolist() == ["2025-06", "2025-06"]
+
+
+def test_months_with_several_charges_do_not_count():
+    # A coffee shop visited many times a month is habit, not a recurring charge
+    coffee = {month: (42.0, 8) for month in WINDOW}
+    # Charged twice in two of its months, which leaves only two single charges
+    gym = {**monthly(40.0, WINDOW[2:]), "2025-04": (80.0, 2), "2025-06": (80.0, 2)}
+    assert recurring_merchants({
+        ("starbucks cafe", "Dining Out"): coffee, ("planet fitness", "Health"): gym,
+    }) == []
+
+    # With three single months left it recurs, and the doubled months are not averaged in
+    gym["2025-02"] = (40.0, 1)
+    recurring = detect_recurring(merchant_months({("planet fitness", "Health"): gym}), MONTH)
+    assert recurring["Expected"].tolist() == [40.0]
+    assert recurring["Months"].tolist() == [3]
+
+
+@pytest.mark.parametrize("amounts, recurs", [
+    ([100.0, 100.0, 100.0, 100.0], True),
+    ([80.0, 120.0, 80.0, 120.0], True),    # spread of 0.2 of the mean
+    ([60.0, 140.0, 60.0, 140.0], False),   # spread of 0.4 of the mean
+])
+def test_variation_threshold(amounts, recurs):
+    charges = {month: (amount, 1) for month, amount in zip(WINDOW[2:], amounts)}
+    assert recurring_merchants({("con ed utility", "Utilities"): charges}) == (["con ed utility"] if recurs else [])
+    assert recurring_merchants({("con ed utility", "Utilities"): charges}, max_variation=0.5) == ["con ed utility"]
+
+
+def test_recurring_charges_must_be_recent():
+    # Charged January to May, so still running in one of the last two closed months
+    assert recurring_merchants({("hulu", "Subscriptions"): monthly(9.99, WINDOW[:5])}) == ["hulu"]
+    # Cancelled after April: four monthly charges, none in May or June
+    assert recurring_merchants({("hulu", "Subscriptions"): monthly(9.99, WINDOW[:4])}) == []
+    # Charges older than the window are ignored entirely
+    old = monthly(9.99, ["2024-10", "2024-11", "2024-12", "2025-06"])
+    assert recurring_merchants({("hulu", "Subscriptions"): old}) == []
+
+
+def test_forecast_is_never_below_recurring_charges():
+    category_months = pd.DataFrame([
+        ("2025-04", "Housing", 900.0),  # rent split with a roommate until June
+        ("2025-05", "Housing", 900.0),
+        ("2025-06", "Housing", 1800.0),
+        ("2025-04", "Dining Out", 300.0),
+        ("2025-06", "Dining Out", 150.0),
+    ], columns=["month", "category", "total"])
+    recurring = detect_recurring(merchant_months({
+        ("rent payment apt", "Housing"): monthly(1800.0),
+        ("netflix com", "Subscriptions"): monthly(15.49),
+    }), MONTH)
+
+    forecast = forecast_spending(category_months, recurring, MONTH).set_index("Category")
+    # Housing averages 1200 but rent alone is 1800; months without dining out count as 0
+    assert forecast.loc["Housing"].tolist() == [1800.0, 1800.0, 1200.0]
+    assert forecast.loc["Dining Out"].tolist() == [150.0, 0.0, 150.0]
+    # A recurring charge in a category with no spending of its own still gets a forecast
+    assert forecast.loc["Subscriptions"].tolist() == [15.49, 15.49, 0.0]
+    assert suggested_budgets(forecast.reset_index()) == {"Housing": 1800, "Dining Out": 150, "Subscriptions": 20}
+
+
+def test_forecast_without_history_is_empty():
+    empty = pd.DataFrame(columns=["month", "category", "total"])
+    assert forecast_spending(empty, detect_recurring(merchant_months({}), MONTH), MONTH).empty
+
+
+def test_load_spend_forecast_reads_the_aggregates(temp_db):
+    expenses = [
+        (f"{month}-01", 1800.0, "Housing", f"RENT PAYMENT APT 4B REF{i}") for i, month in enumerate(WINDOW)
+    ] + [(f"{MONTH}-02", 1800.0, "Housing", "RENT PAYMENT APT 4B REF99"), ("2025-06-14", 60.0, "Dining Out", "CHIPOTLE 1234")]
+    db_manager.save_user_data("alice", {
+        "budget": {}, "income": 50000, "state": "NY",
+        "expenses": pd.DataFrame(expenses, columns=db_manager.EXPENSE_COLUMNS),
+    })
+
+    result = db_manager.load_spend_forecast("alice", MONTH)
+    assert merchant_key("RENT PAYMENT APT 4B REF3115") == "rent payment apt"
+    assert result.recurring["Merchant"].tolist() == ["rent payment apt"]
+    # This month's rent is not part of its own forecast
+    assert result.forecast.set_index("Category")["Forecast"].to_dict() == {"Housing": 1800.0, "Dining Out": 20.0}
+    assert result.budgets == {"Housing": 1800, "Dining Out": 20}
@@ -0,0 +1,122 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import db_manager
+
+USER = "alice"
+
+
+def write_statement(path, rows):
+    pd.DataFrame(rows, columns=["Date", "Amount", "Description"]).to_csv(path, index=False)
+    return str(path)
+
+
+def stored(username=USER):
+    return db_manager.get_connection().execute(
+        "SELECT date, amount, description, occurrence FROM expenses WHERE username = ? ORDER BY date, id",
+        (username,)
+    ).fetchall()
+
+
+def save_by_hand(rows, username=USER):
+    db_manager.save_user_data(username, {
+        "budget": {}, "income": 50000, "state": "NY",
+        "expenses": pd.DataFrame(rows, columns=db_manager.EXPENSE_COLUMNS),
+    })
+
+
+JANUARY = [
+    ("01/03/2025", 2.90, "MTA METRO CARD"),
+    ("01/03/2025", 2.90, "MTA METRO CARD"),  # the same fare twice in a day
+    ("01/03/2025", 4.50, "STARBUCKS CAFE"),
+    ("01/20/2025", 1800.00, "RENT PAYMENT APT 4B"),
+]
+
+
+def test_identical_transactions_in_one_statement_are_kept(temp_db, tmp_path):
+    assert db_manager.import_bank_statement(USER, write_statement(tmp_path / "jan.csv", JANUARY)) == 4
+    assert [row[3] for row in stored()] == [1, 2, 1, 1]
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 1000])
+def test_reimport_adds_nothing(temp_db, tmp_path, chunksize):
+    path = write_statement(tmp_path / "jan.csv", JANUARY)
+    assert db_manager.import_bank_statement(USER, path, chunksize=chunksize) == 4
+    assert db_manager.statement_already_imported(USER, db_manager.statement_fingerprint(path))
+    assert db_manager.import_bank_statement(USER, path, chunksize=chunksize) == 0
+    # The same rows in a different file, e.g. downloaded again with another header order
+    pd.read_csv(path)[["Description", "Amount", "Date"]].to_csv(tmp_path / "again.csv", index=False)
+    assert db_manager.import_bank_statement(USER, str(tmp_path / "again.csv"), chunksize=chunksize) == 0
+    assert len(stored()) == 4
+
+
+def test_overlapping_statements_add_only_new_rows(temp_db, tmp_path):
+    first = write_statement(tmp_path / "first.csv", JANUARY[:3])
+    # Three fares on the 3rd: the two already stored and a third, later one
+    overlap = write_statement(tmp_path / "overlap.csv", JANUARY + [("01/03/2025", 2.90, "MTA METRO CARD")])
+    assert db_manager.import_bank_statement(USER, first) == 3
+    assert db_manager.import_bank_statement(USER, overlap) == 2
+    assert [row[:3] for row in stored()] == [
+        ("2025-01-03", 2.90, "MTA METRO CARD"), ("2025-01-03", 2.90, "MTA METRO CARD"),
+        ("2025-01-03", 4.50, "STARBUCKS CAFE"), ("2025-01-03", 2.90, "MTA METRO CARD"),
+        ("2025-01-20", 1800.00, "RENT PAYMENT APT 4B"),
+    ]
+
+
+def test_batch_import_skips_known_statements_and_rows(temp_db, tmp_path):
+    statement = pd.DataFrame(JANUARY, columns=["Date", "Amount", "Description"]).assign(Category="Other")
+    inserted = db_manager.import_statement_batch([(USER, "h1", statement), (USER, "h1", statement),
+                                                  (USER, "h2", statement), ("bob", "h1", statement)])
+    assert inserted == {(USER, "h1"): 4, (USER, "h2"): 0, ("bob", "h1"): 4}
+    assert len(stored()) == 4 and len(stored("bob")) == 4
+
+
+def test_rows_entered_by_hand_never_block_an_import(temp_db, tmp_path):
+    save_by_hand([("2025-01-03", 2.90, "Transportation", "MTA METRO CARD")])
+    assert db_manager.import_bank_statement(USER, write_statement(tmp_path / "jan.csv", JANUARY)) == 4
+    assert [row[3] for row in stored()].count(None) == 1
+    assert len(stored()) == 5
+
+
+def test_existing_rows_are_not_numbered_by_the_migration(tmp_path, monkeypatch):
+    # A database from before migrations: expenses without IDs, imported or entered by hand
+    path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users (username TEXT PRIMARY KEY, annual_income REAL, selected_state TEXT, "
+                 "nyc_resident INTEGER, budget TEXT, tax_summary TEXT)")
+    conn.execute("CREATE TABLE expenses (username TEXT, date TEXT, amount REAL, category TEXT, description TEXT)")
+    conn.executemany("INSERT INTO expenses VALUES (?, ?, ?, ?, ?)", [
+        (USER, "2025-01-03", 2.90, "Transportation", "MTA METRO CARD"),
+        (USER, "01/03/2025", 2.90, "Transportation", "MTA METRO CARD"),
+    ])
+    conn.commit()
+    conn.close()
+    db_manager.close_connections()
+    monkeypatch.setattr(db_manager, "DB_PATH", str(path))
+    monkeypatch.setattr(db_manager, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    try:
+        db_manager.init_db()
+        assert [row[3] for row in stored()] == [None, None]
+        assert db_manager.import_bank_statement(USER, write_statement(tmp_path / "jan.csv", JANUARY[:2])) == 2
+        assert len(stored()) == 4
+    finally:
+        db_manager.close_connections()
+
+
+def test_archived_statement_rows_are_not_imported_again(temp_db, tmp_path):
+    save_by_hand([("2025-01-20", 1800.00, "Rent", "RENT PAYMENT APT 4B")])
+    path = write_statement(tmp_path / "jan.csv", JANUARY)
+    assert db_manager.import_bank_statement(USER, path) == 4
+    assert db_manager.archive_closed_months(USER, before="2025-02-01") == 5
+    assert stored() == []
+
+    # A re-downloaded copy of the statement adds nothing, not even the rent matching a row entered by hand
+    pd.read_csv(path)[["Description", "Amount", "Date"]].to_csv(tmp_path / "again.csv", index=False)
+    assert db_manager.import_bank_statement(USER, str(tmp_path / "again.csv")) == 0
+    history = db_manager.load_expense_history(USER)
+    assert len(history) == 5
+    # while a statement with one more fare that day adds just that fare
+    extra = write_statement(tmp_path / "extra.csv", JANUARY + [("01/03/2025", 2.90, "MTA METRO CARD")])
+    assert db_manager.import_bank_statement(USER, extra) == 1
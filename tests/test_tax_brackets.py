@@ -0,0 +1,45 @@
+import pytest
+
+from utils.data_processing import DEFAULT_STATE_SCHEDULE, calculate_taxes
+from utils.tax_brackets import FEDERAL, get_schedule, get_standard_deduction, supported_filings
+
+
+@pytest.mark.parametrize("year, filing_status", [(2024, "single"), (2024, "married"), (2025, "single"),
+                                                 (2025, "head_of_household")])
+@pytest.mark.parametrize("state", ["TX", "Tex.", "WA", "NV"])
+def test_no_income_tax_state(state, year, filing_status):
+    assert calculate_taxes(100000, state, year=year, filing_status=filing_status)["state_tax"] == 0
+
+
+@pytest.mark.parametrize("year, filing_status", [(2024, "married"), (2024, "head_of_household"),
+                                                 (2025, "single"), (2025, "married_separately")])
+def test_state_without_table_uses_closest_schedule(year, filing_status):
+    # Only 2024 single filers have state tables, so every filing falls back to them
+    assert get_schedule("CA", year, filing_status) is get_schedule("CA", 2024, "single")
+    taxes = calculate_taxes(200000, "CA", year=year, filing_status=filing_status)
+    taxable = taxes["taxable_income"]
+    assert taxes["state_tax"] == pytest.approx(get_schedule("CA").tax(taxable))
+    assert taxes["state_tax"] != pytest.approx(DEFAULT_STATE_SCHEDULE.tax(taxable))
+
+
+def test_married_filer_uses_married_federal_tables():
+    single = calculate_taxes(200000, "CA")
+    married = calculate_taxes(200000, "CA", filing_status="married")
+    assert married["standard_deduction"] == get_standard_deduction(2024, "married") == 29200
+    assert married["federal_tax"] == pytest.approx(
+        get_schedule(FEDERAL, 2024, "married").tax(200000 - 29200)
+    )
+    assert married["federal_tax"] < single["federal_tax"]
+
+
+def test_unknown_state_uses_flat_default():
+    assert get_schedule("ZZ") is None
+    taxes = calculate_taxes(100000, "ZZ")
+    assert taxes["state_tax"] == pytest.approx(DEFAULT_STATE_SCHEDULE.tax(taxes["taxable_income"]))
+
+
+@pytest.mark.parametrize("year, filing_status", [(2023, "single"), (2024, "widowed")])
+def test_unsupported_filing_raises(year, filing_status):
+    with pytest.raises(ValueError, match="supported: 2024 head_of_household"):
+        calculate_taxes(50000, "NY", year=year, filing_status=filing_status)
+    assert (year, filing_status) not in supported_filings()
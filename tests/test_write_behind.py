@@ -0,0 +1,123 @@
+import datetime
+
+import pandas as pd
+import pytest
+import streamlit as st
+
+import db_manager
+
+USER = "alice"
+THIS_MONTH = datetime.date.today().replace(day=1)
+LAST_MONTH = (THIS_MONTH - datetime.timedelta(days=1)).replace(day=1)
+
+
+@pytest.fixture
+def write_behind(temp_db):
+    """Write-behind that only commits when flushed, on a database holding two expenses."""
+    db_manager.save_user_data(USER, {
+        "budget": {"Groceries": 400}, "income": 85000, "state": "NY",
+        "expenses": pd.DataFrame([
+            (str(THIS_MONTH), 50.0, "Groceries", "WHOLE FOODS MARKET"),
+            (str(LAST_MONTH), 12.5, "Dining Out", "CHIPOTLE 1234"),
+        ], columns=db_manager.EXPENSE_COLUMNS),
+    })
+    st.session_state.clear()
+    db_manager.initialize_session_from_user_data(db_manager.load_user_data(USER))
+    worker = db_manager.enable_write_behind(max_staleness=60, debounce=60)
+    yield worker
+    db_manager.disable_write_behind()
+    st.session_state.clear()
+
+
+def edit_session(change):
+    """Applies ``change`` to the session's expenses and persists the session, as a rerun does."""
+    expenses = st.session_state.expenses.to_frame()
+    st.session_state.expenses = change(expenses)
+    db_manager.persist_session(USER)
+
+
+def stored():
+    return db_manager.get_connection().execute(
+        "SELECT date, amount, category, description FROM expenses WHERE username = ? ORDER BY date, id", (USER,)
+    ).fetchall()
+
+
+def add(row):
+    def change(expenses):
+        new = pd.DataFrame([row], columns=db_manager.EXPENSE_COLUMNS)
+        return pd.concat([expenses, new], ignore_index=True)
+    return change
+
+
+def test_pending_save_is_read_before_it_is_flushed(write_behind):
+    before = stored()
+    st.session_state.budget = {"Groceries": 500}
+    edit_session(add((str(THIS_MONTH), 7.25, "Dining Out", "STARBUCKS CAFE")))
+
+    assert stored() == before
+    queued = db_manager.load_user_data(USER)
+    assert queued["budget"] == {"Groceries": 500}
+    assert queued["expenses"].to_frame()["Amount"].tolist() == [12.5, 50.0, 7.25]
+    window = db_manager.load_user_data(USER, start=str(THIS_MONTH))
+    assert window["expenses"].to_frame()["Amount"].tolist() == [50.0, 7.25]
+
+    write_behind.flush(USER)
+    assert write_behind.pending(USER) is None
+    assert len(stored()) == 3
+    assert db_manager.load_user_data(USER)["budget"] == {"Groceries": 500}
+
+
+def test_saves_coalesce_and_deletes_win(write_behind, monkeypatch):
+    edit_session(add((str(THIS_MONTH), 3.0, "Transportation", "MTA METRO CARD")))
+    edit_session(add((str(THIS_MONTH), 4.0, "Transportation", "MTA METRO CARD")))
+    # Delete the first new row and one that was stored before
+    edit_session(lambda expenses: expenses[~expenses["Amount"].isin([3.0, 12.5])])
+
+    pending = write_behind.pending(USER)
+    assert pending.upserts["Amount"].tolist() == [4.0]
+    assert len(pending.deleted_ids) == 2
+
+    commits = []
+    run_in_transaction = db_manager.run_in_transaction
+
+    def counted(fn, *args):
+        commits.append(fn)
+        return run_in_transaction(fn, *args)
+
+    monkeypatch.setattr(db_manager, "run_in_transaction", counted)
+    write_behind.flush(USER)
+    assert len(commits) == 1
+    assert [row[1] for row in stored()] == [50.0, 4.0]
+
+
+def test_category_totals_flush_only_saves_for_their_month(write_behind):
+    edit_session(add((str(LAST_MONTH), 20.0, "Dining Out", "CHIPOTLE 1234")))
+    assert db_manager.load_category_totals(USER, month=str(THIS_MONTH)[:7])["Actual"].tolist() == [50.0]
+    assert write_behind.pending(USER) is not None
+
+    totals = db_manager.load_category_totals(USER, month=str(LAST_MONTH)[:7])
+    assert totals.set_index("Category")["Actual"].to_dict() == {"Dining Out": 32.5}
+    assert write_behind.pending(USER) is None
+
+
+def test_failed_flush_keeps_save_queued(write_behind, monkeypatch):
+    edit_session(add((str(THIS_MONTH), 9.99, "Subscriptions", "NETFLIX.COM")))
+    run_in_transaction = db_manager.run_in_transaction
+
+    def disk_full(fn, *args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(db_manager, "run_in_transaction", disk_full)
+    with pytest.raises(OSError):
+        write_behind.flush(USER, timeout=0.5)
+    assert write_behind.pending(USER) is not None
+    assert len(stored()) == 2
+    assert 9.99 in db_manager.load_user_data(USER)["expenses"].to_frame()["Amount"].tolist()
+
+    # Once the disk recovers, the next save carries the failed changes forward
+    monkeypatch.setattr(db_manager, "run_in_transaction", run_in_transaction)
+    edit_session(add((str(THIS_MONTH), 1.0, "Other", "VENMO PAYMENT")))
+    # The worker is still backing off from the failure, so this commits inline
+    write_behind.flush(USER, timeout=0.5)
+    assert write_behind.pending(USER) is None
+    assert sorted(row[1] for row in stored()) == [1.0, 9.99, 12.5, 50.0]
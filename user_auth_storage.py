@@ -1,50 +1,183 @@
 # user_auth_storage.py
 import streamlit as st
-import streamlit_authenticator as stauth
-import json
+import extra_streamlit_components as stx
+import argparse
+import bcrypt
+import csv
+import datetime
+import jwt
 import os
-import pandas as pd
-from streamlit_authenticator import Hasher
-from typing import Dict, Any
-from db_manager import save_user_data, load_user_data
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from db_manager import Credential, load_credential, save_credentials, delete_credential
 
-CREDENTIALS_PATH = "user_data/credentials.json"
+AUTH_KEY_PATH = "user_data/auth_key"
+AUTH_COOKIE = "finpal_cookie"
+COOKIE_EXPIRY_DAYS = 30
+BCRYPT_ROUNDS = 12
 
-def load_credentials():
-    with open(CREDENTIALS_PATH, "r") as f:
-        return json.load(f)
+_auth_lock = threading.Lock()
+_auth_key = None
 
-def save_credentials(credentials):
-    with open(CREDENTIALS_PATH, "w") as f:
-        json.dump(credentials, f, indent=4)
-        
-credentials = load_credentials()
+def get_auth_key():
+    """Key signing session tokens: FINPAL_AUTH_KEY, else a random key kept in AUTH_KEY_PATH."""
+    global _auth_key
+    if _auth_key is None:
+        with _auth_lock:
+            if _auth_key is None:
+                _auth_key = os.environ.get("FINPAL_AUTH_KEY") or _load_or_create_key(AUTH_KEY_PATH)
+    return _auth_key
 
-authenticator = stauth.Authenticate(
-    credentials,
-    "finpal_cookie", "random_signature", cookie_expiry_days=30
-)
+def _load_or_create_key(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        key = secrets.token_hex(32)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:  # another process created it first
+            return _load_or_create_key(path)
+        with os.fdopen(fd, "w") as f:
+            f.write(key)
+        return key
+
+def hash_password(password, rounds=BCRYPT_ROUNDS):
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+def provision_users(users, rounds=BCRYPT_ROUNDS, workers=None):
+    """Creates or updates many users in one transaction; returns the number of rows written.
+
+    ``users`` holds mappings with ``username``, ``name``, optional ``email`` and
+    either a plain ``password`` or an existing bcrypt ``password_hash``. Plain
+    passwords are hashed on a thread pool, since bcrypt releases the GIL.
+    Changed users' open sessions end on their next interaction.
+    """
+    users = list(users)
+    for user in users:
+        if not user.get("username") or not (user.get("password") or user.get("password_hash")):
+            raise ValueError(f"User {user.get('username')!r} needs a username and a password or password_hash")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        hashes = list(pool.map(
+            lambda user: user.get("password_hash") or hash_password(user["password"], rounds), users
+        ))
+    return save_credentials(
+        (user["username"], user.get("name") or user["username"], user.get("email"), password_hash)
+        for user, password_hash in zip(users, hashes)
+    )
+
+def set_password(username, password):
+    credential = load_credential(username)
+    if credential is None:
+        raise KeyError(f"Unknown user '{username}'")
+    save_credentials([(credential.username, credential.name, credential.email, hash_password(password))])
+
+def remove_user(username):
+    return delete_credential(username)
+
+def check_password(username, password) -> Optional[Credential]:
+    """The user's credentials if ``password`` is right; the only place bcrypt runs at login."""
+    credential = load_credential(username)
+    if credential is None or not bcrypt.checkpw(password.encode(), credential.password_hash.encode()):
+        return None
+    return credential
+
+def issue_token(credential, expiry_days=COOKIE_EXPIRY_DAYS):
+    expires = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=expiry_days)
+    return jwt.encode(
+        {"sub": credential.username, "ver": credential.version, "exp": expires}, get_auth_key(), algorithm="HS256"
+    )
+
+def verify_token(token) -> Optional[Credential]:
+    """The credentials a session token was issued for, if it is still valid.
+
+    Checking the signature costs microseconds, and the version lookup is a
+    primary key read, so a token issued before the user's password changed or
+    the user was removed stops working without restarting anything.
+    """
+    if not token:
+        return None
+    try:
+        claims = jwt.decode(token, get_auth_key(), algorithms=["HS256"])
+    except jwt.InvalidTokenError:
+        return None
+    credential = load_credential(claims.get("sub", ""))
+    if credential is None or credential.version != claims.get("ver"):
+        return None
+    return credential
+
+def _start_session(credential, token):
+    st.session_state["auth_token"] = token
+    st.session_state["authentication_status"] = True
+    st.session_state["username"] = credential.username
+    st.session_state["name"] = credential.name
+
+def _end_session():
+    for key in ["auth_token", "name", "authentication_status", "username"]:
+        st.session_state[key] = None
 
 def login_user():
-    for key in ["logout", "name", "authentication_status", "username"]:
+    for key in ["logout", "name", "authentication_status", "username", "auth_token"]:
         if key not in st.session_state:
             st.session_state[key] = None
 
-    print("DEBUG: Full loaded credentials dict:")
-    print(json.dumps(credentials, indent=2))  # show full structure
-    
-    name, auth_status, username = authenticator.login("Login", "main")
+    # Reruns of a signed-in session only re-check its token, never the password
+    token = st.session_state["auth_token"]
+    if token:
+        credential = verify_token(token)
+        if credential is not None:
+            _start_session(credential, token)
+            return credential.username
+        _end_session()
 
-    print("DEBUG: Login result ->", f"auth_status: {auth_status}, username: {username}, name: {name}")
+    cookies = stx.CookieManager(key="finpal_cookies")
+    if st.session_state["logout"]:
+        # Dropped here rather than at the logout click, which is followed straight away by a rerun
+        if cookies.get(AUTH_COOKIE) is not None:
+            cookies.delete(AUTH_COOKIE, key="finpal_cookie_delete")
+    else:
+        token = cookies.get(AUTH_COOKIE)
+        credential = verify_token(token)
+        if credential is not None:
+            _start_session(credential, token)
+            return credential.username
 
-    if auth_status:
-        st.session_state["authentication_status"] = True
-        st.session_state["username"] = username
-        st.session_state["name"] = name
-    elif auth_status is False:
+    login_form = st.form("Login")
+    login_form.subheader("Login")
+    username = login_form.text_input("Username").strip()
+    password = login_form.text_input("Password", type="password")
+    if login_form.form_submit_button("Login"):
+        credential = check_password(username, password)
+        if credential is not None:
+            token = issue_token(credential)
+            cookies.set(AUTH_COOKIE, token, key="finpal_cookie_set",
+                        expires_at=datetime.datetime.now() + datetime.timedelta(days=COOKIE_EXPIRY_DAYS))
+            st.session_state["logout"] = None
+            _start_session(credential, token)
+            return credential.username
+        st.session_state["authentication_status"] = False
         st.error("Username/password is incorrect")
-    elif auth_status is None:
+    else:
         st.warning("Please enter your username and password")
+    return None
+
+def logout_user(button_name="Logout", location="sidebar"):
+    container = st.sidebar if location == "sidebar" else st
+    if container.button(button_name):
+        # Keeps the cookie from signing this session back in; login_user deletes it
+        st.session_state["logout"] = True
+        _end_session()
 
-    return username if auth_status else None
+def _read_users_csv(path):
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create or update FinPal users in bulk.")
+    parser.add_argument("users_csv", help="CSV with username, name, email and password or password_hash columns")
+    parser.add_argument("--rounds", type=int, default=BCRYPT_ROUNDS, help="bcrypt cost for plain passwords")
+    args = parser.parse_args()
+    print(f"Provisioned {provision_users(_read_users_csv(args.users_csv), rounds=args.rounds)} user(s)")
@@ -0,0 +1,100 @@
+import re
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+CATEGORY_RULES_PATH = "expense_category_rules.csv"
+RULE_COLUMNS = ["priority", "kind", "pattern", "category"]
+RULE_KINDS = ("keyword", "regex", "merchant")
+DEFAULT_CATEGORY = "Other"
+
+# Categories offered on the Budget Setup page; the default rules only produce these
+BUDGET_CATEGORIES = [
+    "Rent", "Groceries", "Transportation", "Dining Out", "Entertainment", "Utilities",
+    "Subscriptions", "Insurance", "Gym", "Internet"
+]
+
+
+def _rule_regex(kind, pattern):
+    if kind == "keyword":
+        return re.escape(pattern.lower())
+    if kind == "merchant":
+        return r"\b" + re.escape(pattern.lower()) + r"\b"
+    if kind == "regex":
+        return pattern
+    raise ValueError(f"Unknown rule kind '{kind}', expected one of {RULE_KINDS}")
+
+
+class RuleEngine:
+    """Expense categorizer compiled from an ordered rules table.
+
+    Consecutive rules for the same category are merged into one alternation,
+    and a Series is categorized with one vectorized ``str.contains`` per run,
+    which pandas runs in Arrow for its default string dtype. ``np.select`` then
+    takes the first run that matched, so the first rule that matches anywhere
+    in the text wins, exactly as a chain of ``if`` checks would.
+    """
+
+    def __init__(self, rules):
+        rules = pd.DataFrame(rules, columns=RULE_COLUMNS)
+        rules = rules.sort_values("priority", kind="stable").reset_index(drop=True)
+        self.rules = rules
+        run_starts = rules["category"].ne(rules["category"].shift()).to_numpy()
+        runs = np.cumsum(run_starts) - 1
+        self.categories = np.append(rules["category"].to_numpy(dtype=object)[run_starts], DEFAULT_CATEGORY)
+        self.patterns = []
+        for i in range(len(self.categories) - 1):
+            run = rules[runs == i]
+            patterns = [_rule_regex(kind, pattern) for kind, pattern in zip(run["kind"], run["pattern"])]
+            self.patterns.append("|".join(patterns))
+        self.matchers = [re.compile(pattern, re.IGNORECASE) for pattern in self.patterns]
+
+    def categorize_one(self, description):
+        text = str(description).lower()
+        for category, matcher in zip(self.categories, self.matchers):
+            if matcher.search(text):
+                return category
+        return DEFAULT_CATEGORY
+
+    def categorize(self, descriptions):
+        """Categorizes a whole Series, matching each distinct description only once."""
+        codes, uniques = pd.factorize(pd.Series(descriptions).astype(str).str.lower())
+        uniques = pd.Series(uniques)
+        matched = [uniques.str.contains(pattern, case=False, regex=True).to_numpy(dtype=bool)
+                   for pattern in self.patterns]
+        labels = np.select(matched, self.categories[:-1], DEFAULT_CATEGORY) if matched else \
+            np.full(len(uniques), DEFAULT_CATEGORY, dtype=object)
+        # factorize marks missing values with -1; those fall through to the default category
+        labels = np.append(labels.astype(object), DEFAULT_CATEGORY)
+        return pd.Series(labels[codes], index=getattr(descriptions, "index", None))
+
+
+def load_rules(path=CATEGORY_RULES_PATH):
+    rules = pd.read_csv(path, dtype={"priority": "int64", "kind": str, "pattern": str, "category": str})
+    rules["kind"] = rules["kind"].str.strip().str.lower()
+    return rules[RULE_COLUMNS]
+
+
+@lru_cache(maxsize=64)
+def _compile(rules):
+    return RuleEngine(list(rules))
+
+
+def get_rule_engine(user_rules=None):
+    """Compiled engine for the default rules, with ``user_rules`` taking precedence.
+
+    Engines are cached by their rule set, so compiling happens once per distinct
+    set of overrides.
+    """
+    rules = _default_rules()
+    if user_rules is not None and len(user_rules):
+        overrides = pd.DataFrame(user_rules, columns=RULE_COLUMNS).sort_values("priority", kind="stable")
+        # Overrides are ranked ahead of every default rule, keeping their own order
+        rules = [(-len(overrides) + i, kind, pattern, category)
+                 for i, (_, kind, pattern, category) in enumerate(overrides.itertuples(index=False))] + list(rules)
+    return _compile(tuple(rules))
+
+
+@lru_cache(maxsize=1)
+def _default_rules():
+    return tuple(tuple(rule) for rule in load_rules().itertuples(index=False))
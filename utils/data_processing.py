@@ -1,86 +1,45 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
+from utils import instrumentation
+from utils.categorization import get_rule_engine
+from utils.tax_brackets import (
+    DEFAULT_FILING_STATUS, DEFAULT_TAX_YEAR, FEDERAL, STATE_NAME_TO_CODE, BracketSchedule,
+    get_schedule, get_standard_deduction
+)
 
-STATE_BRACKETS_DF = pd.read_csv("normalized_state_brackets_2024.csv")
-# Standardize state names by removing periods, trimming spaces, and converting to uppercase for reliable matching
-STATE_BRACKETS_DF["State"] = STATE_BRACKETS_DF["State"].str.replace(".", "", regex=False).str.strip().str.upper()
+# Flat rate applied when a state has no bracket table at all
+DEFAULT_STATE_SCHEDULE = BracketSchedule([0], [0.04])
+NYC_TAX_RATE = 0.03876
 
-# Reversed map: full uppercase names like N D to their USPS codes
-STATE_NAME_TO_CODE = {
-    "ALA": "AL", "ALASKA": "AK", "ARIZ": "AZ", "ARK": "AR", "CALIF": "CA", "COLO": "CO",
-    "CONN": "CT", "DC": "DC", "DEL": "DE", "FLA": "FL", "GA": "GA", "HAWAII": "HI", "IDAHO": "ID",
-    "ILL": "IL", "IND": "IN", "IOWA": "IA", "KANS": "KS", "KY": "KY", "LA": "LA", "MAINE": "ME",
-    "MD": "MD", "MASS": "MA", "MICH": "MI", "MINN": "MN", "MISS": "MS", "MO": "MO", "MONT": "MT",
-    "NEB": "NE", "NEV": "NV", "NH": "NH", "NJ": "NJ", "NM": "NM", "NY": "NY", "NC": "NC", "ND": "ND",
-    "OHIO": "OH", "OKLA": "OK", "ORE": "OR", "PA": "PA", "RI": "RI", "SC": "SC", "SD": "SD",
-    "TENN": "TN", "TEX": "TX", "UTAH": "UT", "VT": "VT", "VA": "VA", "WASH": "WA", "W VA": "WV",
-    "WIS": "WI", "WYO": "WY"
-}
 
-
-def calculate_taxes(gross_income, state, nyc=False):
+@instrumentation.timed("data_processing.calculate_taxes")
+def calculate_taxes(gross_income, state, nyc=False, year=DEFAULT_TAX_YEAR, filing_status=DEFAULT_FILING_STATUS):
     """Calculates federal, state, and NYC taxes and returns detailed breakdown."""
     # Get the taxable income for the year
-    STANDARD_DEDUCTION = 14600
+    STANDARD_DEDUCTION = get_standard_deduction(year, filing_status)
     taxable_income = max(0, gross_income - STANDARD_DEDUCTION)
-    
-    # These are the 2024 U.S. federal tax brackets for single filers
-    federal_brackets = [
-        (0, 11000, 0.10), (11000, 44725, 0.12), (44725, 95375, 0.22),
-        (95375, 182100, 0.24), (182100, 231250, 0.32),
-        (231250, 578125, 0.35), (578125, float('inf'), 0.37)
-    ]
-
-    def apply_brackets(income, brackets):
-        tax = 0.0
-        breakdown = []
-        for lower, upper, rate in brackets:
-            if income > lower:
-                taxed = min(income, upper) - lower
-                segment_tax = taxed * rate
-                breakdown.append({
-                    "lower_bound": f"${lower:,.0f}",
-                    "upper_bound": f"${min(income, upper):,.0f}",
-                    "rate": f"{rate*100:.1f}%",
-                    "amount_taxed": f"${taxed:,.2f}",
-                    "tax": f"${segment_tax:,.2f}"
-                })
-                tax += segment_tax
-            else:
-                break
-        return tax, breakdown
 
     state_clean = state.upper().strip()
-    # Reverse the mapping so we can go from USPS code (e.g., 'NY') back to the normalized format used in the CSV (e.g., 'NEW YORK')
-    reverse_lookup = {v: k for k, v in STATE_NAME_TO_CODE.items()}
-    state_lookup = reverse_lookup.get(state_clean, state_clean)
-
-    state_df = STATE_BRACKETS_DF[STATE_BRACKETS_DF["State"] == state_lookup]
-
+    federal_schedule = get_schedule(FEDERAL, year, filing_status)
     # Use default flat tax bracket if state is not found
-    if state_df.empty:
-        state_brackets = [(0, float('inf'), 0.04)]
-    else:
-        sorted_df = state_df.sort_values("Bracket_Min")
-        thresholds = sorted_df["Bracket_Min"].tolist()
-        rates = sorted_df["Rate"].tolist()
-        state_brackets = [
-            (thresholds[i], thresholds[i+1] if i+1 < len(thresholds) else float('inf'), rates[i])
-            for i in range(len(rates))
-        ]
-
-    federal_tax, federal_breakdown = apply_brackets(taxable_income, federal_brackets)
-    state_tax, state_breakdown = apply_brackets(taxable_income, state_brackets)
+    state_schedule = get_schedule(state_clean, year, filing_status) or DEFAULT_STATE_SCHEDULE
+
+    federal_tax = federal_schedule.tax(taxable_income)
+    state_tax = state_schedule.tax(taxable_income)
     # Add NYC tax if applicable
-    nyc_tax = taxable_income * 0.03876 if nyc and state_clean == "NY" else 0.0
+    nyc_tax = taxable_income * NYC_TAX_RATE if nyc and state_clean == "NY" else 0.0
 
     total_tax = federal_tax + state_tax + nyc_tax
     net_income = gross_income - total_tax
 
     return {
-        "state_breakdown": state_breakdown,
+        "state_breakdown": state_schedule.breakdown(taxable_income),
         "standard_deduction": STANDARD_DEDUCTION,
         "taxable_income": taxable_income,
-        "federal_breakdown": federal_breakdown,
+        "federal_breakdown": federal_schedule.breakdown(taxable_income),
         "net_income": net_income,
         "federal_tax": federal_tax,
         "state_tax": state_tax,
@@ -89,28 +48,197 @@ def calculate_taxes(gross_income, state, nyc=False):
     }
 
 
-def parse_bank_statement(file):
+@instrumentation.timed("data_processing.calculate_taxes_batch")
+def calculate_taxes_batch(incomes, states=None, nyc_flags=None, year=DEFAULT_TAX_YEAR,
+                          filing_status=DEFAULT_FILING_STATUS, breakdowns=False):
+    """Vectorized calculate_taxes over many incomes at once.
+
+    ``incomes`` may be an array-like of gross incomes, or a DataFrame with the
+    ``annual_income``, ``selected_state`` and ``nyc_resident`` columns of the users
+    table. ``states`` and ``nyc_flags`` may be scalars, which apply to every row.
+    Returns one row per income; the bracket breakdown columns are only built when
+    ``breakdowns=True``.
+    """
+    if isinstance(incomes, pd.DataFrame):
+        frame = incomes
+        incomes = frame["annual_income"]
+        states = frame["selected_state"] if states is None else states
+        nyc_flags = frame.get("nyc_resident", False) if nyc_flags is None else nyc_flags
+
+    gross = np.asarray(incomes, dtype=np.float64).reshape(-1)
+    n = len(gross)
+    states = np.broadcast_to(np.asarray("NY" if states is None else states, dtype=object), (n,))
+    nyc_flags = np.broadcast_to(np.asarray(False if nyc_flags is None else nyc_flags, dtype=bool), (n,))
+    # Normalize each distinct state string once, then map back onto the rows
+    inverse, raw_states = pd.factorize(states)
+    codes = np.array([str(s).upper().strip() for s in raw_states], dtype=object)
+    state_clean = codes[inverse]
+
+    standard_deduction = get_standard_deduction(year, filing_status)
+    taxable = np.maximum(0, gross - standard_deduction)
+
+    federal_schedule = get_schedule(FEDERAL, year, filing_status)
+    federal_tax = federal_schedule.tax_array(taxable)
+
+    # One searchsorted per distinct state rather than per row
+    state_tax = np.zeros(n)
+    state_schedules = {}
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.searchsorted(inverse[order], np.arange(len(codes) + 1))
+    for i, code in enumerate(codes):
+        rows = order[bounds[i]:bounds[i + 1]]
+        schedule = get_schedule(code, year, filing_status) or DEFAULT_STATE_SCHEDULE
+        state_schedules[code] = schedule
+        state_tax[rows] = schedule.tax_array(taxable[rows])
+
+    nyc_tax = np.where(nyc_flags & (codes == "NY")[inverse], taxable * NYC_TAX_RATE, 0.0)
+    total_tax = federal_tax + state_tax + nyc_tax
+
+    result = pd.DataFrame({
+        "gross_income": gross,
+        "state": state_clean,
+        "standard_deduction": standard_deduction,
+        "taxable_income": taxable,
+        "federal_tax": federal_tax,
+        "state_tax": state_tax,
+        "nyc_tax": nyc_tax,
+        "total_tax": total_tax,
+        "net_income": gross - total_tax
+    })
+    if breakdowns:
+        result["federal_breakdown"] = [federal_schedule.breakdown(t) for t in taxable]
+        result["state_breakdown"] = [state_schedules[s].breakdown(t) for s, t in zip(state_clean, taxable)]
+    return result
+
+
+BANK_STATEMENT_CHUNKSIZE = 50_000
+
+def normalize_dates(dates):
+    """Converts dates in any common format to ISO ``YYYY-MM-DD`` strings.
+
+    ISO strings sort chronologically and share a month prefix, which is what the
+    expenses table's (username, date) index and monthly aggregates rely on. Values
+    that cannot be parsed are kept as they are.
+    """
+    dates = pd.Series(dates)
+    parsed = pd.to_datetime(dates, format="ISO8601", errors="coerce")
+    retry = parsed.isna() & dates.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(dates[retry].astype(str), format="mixed", errors="coerce")
+    return parsed.dt.strftime("%Y-%m-%d").where(parsed.notna(), dates.astype(str))
+
+
+PARSE_CACHE_SIZE = 32
+_parse_cache = OrderedDict()  # (content hash, engine) -> parsed DataFrame, least recently used first
+_parse_cache_lock = threading.Lock()
+
+
+def statement_fingerprint(file):
+    """SHA-256 of a statement's content; the file position is left at the start."""
+    digest = hashlib.sha256()
+    if isinstance(file, str):
+        with open(file, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    file.seek(0)
+    for block in iter(lambda: file.read(1 << 20), b""):
+        digest.update(block.encode() if isinstance(block, str) else block)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+PDF_MAGIC = b"%PDF-"
+
+
+def is_pdf_statement(file):
+    """Whether a statement path or file object holds a PDF rather than a CSV, by its first bytes."""
+    if isinstance(file, str):
+        with open(file, "rb") as f:
+            head = f.read(len(PDF_MAGIC))
+    else:
+        file.seek(0)
+        head = file.read(len(PDF_MAGIC))
+        file.seek(0)
+    return (head.encode() if isinstance(head, str) else head) == PDF_MAGIC
+
+
+@instrumentation.timed("data_processing.parse_bank_statement")
+def parse_bank_statement(file, engine=None):
+    """Parses and categorizes a whole CSV or PDF bank statement.
+
+    Results are kept in a small LRU cache keyed by the file's content hash, so the
+    same statement is never parsed twice.
+    """
     try:
-        df = pd.read_csv(file)
-        df.columns = df.columns.str.strip().str.lower()
-        if 'date' not in df or 'amount' not in df:
-            raise ValueError("CSV must contain 'Date' and 'Amount'")
-        df['Category'] = df['description'].apply(categorize_expense)
-        return df.rename(columns={
-            'date': 'Date', 'amount': 'Amount', 'description': 'Description'
-        })[["Date", "Amount", "Category", "Description"]]
+        key = (statement_fingerprint(file), engine)
+        with _parse_cache_lock:
+            if key in _parse_cache:
+                _parse_cache.move_to_end(key)
+                return _parse_cache[key].copy()
+        parsed = pd.concat(list(iter_statement(file, engine=engine)), ignore_index=True)
     except Exception as e:
         raise ValueError(f"Failed to parse bank statement: {e}")
+    with _parse_cache_lock:
+        _parse_cache[key] = parsed
+        while len(_parse_cache) > PARSE_CACHE_SIZE:
+            _parse_cache.popitem(last=False)
+    return parsed.copy()
+
+
+def iter_bank_statement(file, chunksize=BANK_STATEMENT_CHUNKSIZE, engine=None):
+    """Reads a CSV bank statement in chunks of at most ``chunksize`` categorized rows.
+
+    Only the date, amount and description columns are read, with fixed dtypes, so
+    memory stays bounded by the chunk size rather than the file size. ``engine`` is
+    the RuleEngine to categorize with, e.g. one including a user's own rules.
+    """
+    if hasattr(file, "seek"):
+        file.seek(0)
+    header = pd.read_csv(file, nrows=0)
+    if hasattr(file, "seek"):
+        file.seek(0)
+    columns = {c.strip().lower(): c for c in header.columns}
+    if 'date' not in columns or 'amount' not in columns:
+        raise ValueError("CSV must contain 'Date' and 'Amount'")
+    if 'description' not in columns:
+        raise ValueError("CSV must contain 'Description'")
+
+    reader = pd.read_csv(
+        file,
+        usecols=[columns['date'], columns['amount'], columns['description']],
+        dtype={columns['date']: "string", columns['amount']: "float64", columns['description']: "string"},
+        chunksize=chunksize
+    )
+    for chunk in reader:
+        chunk = chunk.rename(columns={
+            columns['date']: 'Date', columns['amount']: 'Amount', columns['description']: 'Description'
+        })
+        chunk['Date'] = normalize_dates(chunk['Date'])
+        chunk['Category'] = categorize_expenses(chunk['Description'], engine)
+        yield chunk[["Date", "Amount", "Category", "Description"]]
+
+
+def iter_statement(file, chunksize=BANK_STATEMENT_CHUNKSIZE, engine=None, workers=None):
+    """iter_bank_statement for CSVs and PDFs alike.
+
+    A PDF's text is extracted in full (with ``workers`` processes) and parsed in
+    one go, then handed out in chunks of at most ``chunksize`` rows.
+    """
+    if not is_pdf_statement(file):
+        yield from iter_bank_statement(file, chunksize=chunksize, engine=engine)
+        return
+    from utils.pdf_statements import parse_pdf_statement  # pdfminer is only imported once a PDF shows up
+    parsed = parse_pdf_statement(file, engine=engine, workers=workers)
+    for start in range(0, len(parsed), chunksize):
+        yield parsed.iloc[start:start + chunksize]
+
+
+@instrumentation.timed("data_processing.categorize_expenses")
+def categorize_expenses(descriptions, engine=None):
+    """Vectorized categorize_expense over a whole Series of descriptions."""
+    return (engine or get_rule_engine()).categorize(descriptions)
 
 
-def categorize_expense(description):
-    description = str(description).lower()
-    if any(x in description for x in ['rent', 'apartment', 'lease']): return "Rent"
-    if any(x in description for x in ['grocery', 'whole foods', 'supermarket']): return "Groceries"
-    if any(x in description for x in ['uber', 'lyft', 'metro', 'transit', 'gas']): return "Transportation"
-    if any(x in description for x in ['restaurant', 'cafe', 'chipotle', 'mcdonald']): return "Dining Out"
-    if any(x in description for x in ['netflix', 'spotify', 'subscription']): return "Subscriptions"
-    if any(x in description for x in ['insurance']): return "Insurance"
-    if any(x in description for x in ['entertainment', 'movie', 'concert']): return "Entertainment"
-    if any(x in description for x in ['electric', 'water', 'coned', 'utility']): return "Utilities"
-    return "Other"
+def categorize_expense(description, engine=None):
+    return (engine or get_rule_engine()).categorize_one(description)
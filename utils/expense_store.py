@@ -0,0 +1,173 @@
+import datetime
+import numpy as np
+import pandas as pd
+from utils.data_processing import normalize_dates
+
+EXPENSE_COLUMNS = ["Date", "Amount", "Category", "Description"]
+EXPENSE_ID = "ID"
+UNSAVED_ID = -1
+MISSING_CODE = -1
+
+
+class _Dictionary:
+    """Interns repeated strings (categories, merchant descriptions) as int32 codes."""
+
+    __slots__ = ("values", "lookup")
+
+    def __init__(self):
+        self.values = []
+        self.lookup = {}
+
+    def code(self, value):
+        if value is None or value != value:  # None or NaN
+            return MISSING_CODE
+        value = str(value)
+        code = self.lookup.get(value)
+        if code is None:
+            code = self.lookup[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def encode(self, items):
+        local_codes, uniques = pd.factorize(pd.Series(items, dtype=object), use_na_sentinel=True)
+        mapping = np.empty(len(uniques) + 1, dtype=np.int32)
+        for i, value in enumerate(uniques):
+            mapping[i] = self.code(value)
+        mapping[-1] = MISSING_CODE  # factorize marks missing values with -1
+        return mapping[local_codes]
+
+    def decode(self, codes):
+        return pd.Categorical.from_codes(codes, categories=pd.Index(self.values, dtype=object))
+
+
+class ExpenseStore:
+    """Compact columnar storage for one session's expenses.
+
+    Amounts are int64 cents, dates datetime64[D], and categories and descriptions
+    int32 codes into per-store string dictionaries. Columns grow by doubling, so
+    appending one expense is amortized O(1) instead of a full DataFrame copy.
+    Dates that cannot be parsed are kept verbatim on the side.
+    """
+
+    __slots__ = ("_size", "_ids", "_days", "_cents", "_category_codes", "_description_codes",
+                 "_categories", "_descriptions", "_odd_dates")
+
+    def __init__(self, capacity=16):
+        self._size = 0
+        self._ids = np.empty(capacity, dtype=np.int64)
+        self._days = np.empty(capacity, dtype="datetime64[D]")
+        self._cents = np.empty(capacity, dtype=np.int64)
+        self._category_codes = np.empty(capacity, dtype=np.int32)
+        self._description_codes = np.empty(capacity, dtype=np.int32)
+        self._categories = _Dictionary()
+        self._descriptions = _Dictionary()
+        self._odd_dates = {}  # row -> original date string
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def empty(self):
+        return self._size == 0
+
+    def _reserve(self, extra):
+        needed = self._size + extra
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2)
+        for name in ("_ids", "_days", "_cents", "_category_codes", "_description_codes"):
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            setattr(self, name, grown)
+
+    def extend(self, dates, amounts, categories, descriptions, ids=None):
+        """Appends columns of expenses; rows without an ID are unsaved."""
+        n = len(dates)
+        if n == 0:
+            return self
+        self._reserve(n)
+        start, stop = self._size, self._size + n
+
+        if ids is None:
+            self._ids[start:stop] = UNSAVED_ID
+        else:
+            self._ids[start:stop] = pd.to_numeric(pd.Series(ids), errors="coerce").fillna(UNSAVED_ID).to_numpy(np.int64)
+
+        raw_dates = pd.Series(dates, dtype=object)
+        iso_dates = normalize_dates(raw_dates)
+        days = pd.to_datetime(iso_dates, format="%Y-%m-%d", errors="coerce")
+        self._days[start:stop] = days.to_numpy(dtype="datetime64[D]")
+        for offset in np.flatnonzero(days.isna().to_numpy() & raw_dates.notna().to_numpy()):
+            self._odd_dates[start + int(offset)] = str(raw_dates.iloc[offset])
+
+        amounts = pd.to_numeric(pd.Series(amounts), errors="coerce").fillna(0).to_numpy(np.float64)
+        self._cents[start:stop] = np.round(amounts * 100).astype(np.int64)
+        self._category_codes[start:stop] = self._categories.encode(categories)
+        self._description_codes[start:stop] = self._descriptions.encode(descriptions)
+        self._size = stop
+        return self
+
+    def append(self, date, amount, category, description, expense_id=None):
+        """Appends one expense without going through the vectorized column path."""
+        try:
+            day = np.datetime64(date if isinstance(date, (datetime.date, np.datetime64)) else str(date), "D")
+        except (ValueError, TypeError):
+            # Non-ISO text: let normalize_dates parse it or keep it verbatim
+            return self.extend([date], [amount], [category], [description],
+                               None if expense_id is None else [expense_id])
+        self._reserve(1)
+        row = self._size
+        self._ids[row] = UNSAVED_ID if expense_id is None else int(expense_id)
+        self._days[row] = day
+        self._cents[row] = round(float(amount) * 100)
+        self._category_codes[row] = self._categories.code(category)
+        self._description_codes[row] = self._descriptions.code(description)
+        self._size = row + 1
+        return self
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Builds a store straight from ``(id, date, amount, category, description)`` query rows."""
+        store = cls(capacity=max(len(rows), 16))
+        if rows:
+            ids, dates, amounts, categories, descriptions = zip(*rows)
+            store.extend(dates, amounts, categories, descriptions, ids=ids)
+        return store
+
+    @classmethod
+    def from_frame(cls, frame):
+        store = cls(capacity=max(len(frame), 16))
+        if len(frame):
+            store.extend(
+                frame["Date"], frame["Amount"], frame["Category"], frame["Description"],
+                ids=frame[EXPENSE_ID] if EXPENSE_ID in frame else None
+            )
+        return store
+
+    def to_frame(self):
+        """The expenses as a DataFrame with the usual ID/Date/Amount/Category/Description columns."""
+        n = self._size
+        ids = pd.array(self._ids[:n], dtype="Int64")
+        ids[self._ids[:n] == UNSAVED_ID] = pd.NA
+        dates = pd.Series(self._days[:n]).dt.strftime("%Y-%m-%d").astype(object)
+        for row, raw in self._odd_dates.items():
+            dates.iat[row] = raw
+        return pd.DataFrame({
+            EXPENSE_ID: ids,
+            "Date": dates,
+            "Amount": self._cents[:n] / 100,
+            "Category": self._categories.decode(self._category_codes[:n]),
+            "Description": self._descriptions.decode(self._description_codes[:n]),
+        })
+
+    def memory_usage(self):
+        """Bytes held by the store, including spare capacity and the string dictionaries."""
+        arrays = sum(getattr(self, name).nbytes for name in
+                     ("_ids", "_days", "_cents", "_category_codes", "_description_codes"))
+        strings = sum(
+            pd.Series(dictionary.values, dtype=object).memory_usage(deep=True, index=False)
+            for dictionary in (self._categories, self._descriptions)
+        )
+        return arrays + strings
@@ -0,0 +1,218 @@
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from bisect import bisect_left
+
+# Timing is off unless FINPAL_TIMING=1 or enable() is called; disabled spans cost one flag check
+_enabled = os.environ.get("FINPAL_TIMING") == "1"
+# When set, the metrics are rewritten here after every rerun (.json, anything else is Prometheus text)
+METRICS_FILE = os.environ.get("FINPAL_METRICS_FILE")
+PROFILE_DIR = "user_data/profiles"
+
+# Upper bounds in seconds, as in Prometheus' default latency buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+
+class StageHistogram:
+    """Latency histogram for one stage, with fixed cumulative-style buckets."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the ``q`` quantile (the max for the overflow bucket)."""
+        if not self.count:
+            return 0.0
+        target, seen = q * self.count, 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            "count": self.count, "sum": self.total, "max": self.max,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5), "p95": self.quantile(0.95),
+            "buckets": dict(zip(map(str, BUCKETS), self.counts)),
+        }
+
+
+_lock = threading.Lock()
+_histograms = {}
+_current = threading.local()  # spans of the rerun running on this thread
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def record(stage, seconds):
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = StageHistogram()
+        histogram.observe(seconds)
+    spans = getattr(_current, "spans", None)
+    if spans is not None:
+        spans.append((stage, seconds))
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(stage):
+    """Context manager timing one stage; a shared no-op while timing is disabled."""
+    return _Span(stage) if _enabled else _NULL_SPAN
+
+
+def timed(stage):
+    """Decorator recording every call of a function as ``stage``."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def snapshot():
+    """Every stage's histogram summary, keyed by stage name."""
+    with _lock:
+        return {stage: histogram.as_dict() for stage, histogram in sorted(_histograms.items())}
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def to_prometheus(stats=None):
+    """The histograms in the Prometheus text exposition format."""
+    stats = snapshot() if stats is None else stats
+    lines = [
+        "# HELP finpal_stage_seconds Latency of FinPal app stages.",
+        "# TYPE finpal_stage_seconds histogram",
+    ]
+    for stage, data in stats.items():
+        cumulative = 0
+        for bound, n in data["buckets"].items():
+            cumulative += n
+            le = "+Inf" if bound == "inf" else bound
+            lines.append(f'finpal_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+        lines.append(f'finpal_stage_seconds_sum{{stage="{stage}"}} {data["sum"]:.6f}')
+        lines.append(f'finpal_stage_seconds_count{{stage="{stage}"}} {data["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+def dump_metrics(path):
+    """Writes the histograms to ``path`` atomically: JSON for ``.json`` files, else Prometheus text."""
+    stats = snapshot()
+    text = json.dumps(stats, indent=2) if path.endswith(".json") else to_prometheus(stats)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+    return path
+
+
+class RerunTimer:
+    """Times one Streamlit rerun: collects its spans and optionally profiles it with cProfile."""
+
+    def __init__(self, profile=False):
+        self.start = time.perf_counter()
+        self.spans = []
+        self.profiler = cProfile.Profile() if profile else None
+        self.profile_text = None
+        self.profile_path = None
+        self.finished = False
+        _current.spans = self.spans if _enabled else None
+        if self.profiler is not None:
+            self.profiler.enable()
+
+    def abandon(self):
+        """Ends a rerun that st.stop() or st.rerun() cut short, without recording it."""
+        if not self.finished:
+            if self.profiler is not None:
+                self.profiler.disable()
+            _current.spans = None
+            self.finished = True
+
+    def finish(self, limit=30):
+        """Stops the rerun, recording its total time; returns its ``(stage, seconds)`` spans."""
+        self.finished = True
+        if self.profiler is not None:
+            self.profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            self.profile_path = os.path.join(PROFILE_DIR, f"rerun_{time.strftime('%Y%m%d_%H%M%S')}.prof")
+            self.profiler.dump_stats(self.profile_path)
+            out = io.StringIO()
+            pstats.Stats(self.profiler, stream=out).sort_stats("cumulative").print_stats(limit)
+            self.profile_text = out.getvalue()
+        _current.spans = None
+        if _enabled:
+            total = time.perf_counter() - self.start
+            record("app.rerun", total)
+            self.spans.append(("app.rerun", total))
+            if METRICS_FILE:
+                dump_metrics(METRICS_FILE)
+        return self.spans
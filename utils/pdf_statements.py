@@ -0,0 +1,207 @@
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import pandas as pd
+from pdfminer.high_level import extract_pages
+from pdfminer.layout import LAParams, LTTextContainer, LTTextLine
+from pdfminer.pdfpage import PDFPage
+from utils import instrumentation
+from utils.data_processing import categorize_expenses, normalize_dates, statement_fingerprint
+
+# Extracted page text, by the statement's content hash. Kept in memory only, as statements are
+# sensitive and, once imported, live in the database anyway
+PDF_TEXT_CACHE_SIZE = 16
+_text_cache = OrderedDict()  # content hash -> tuple of page texts, least recently used first
+_text_cache_lock = threading.Lock()
+
+# Statements shorter than this are extracted inline; starting workers would cost more than it saves
+PARALLEL_MIN_PAGES = 8
+TASKS_PER_WORKER = 4
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+# Points within which text pieces count as the same row; banks lay columns out as separate text runs
+ROW_TOLERANCE = 2.0
+
+_AMOUNT = r"\(?-?\$?\d[\d,]*\.\d{2}\)?(?:\s?(?:CR|DR))?"
+# One transaction per line: a full date first, then the description, the amount and an optional balance
+TRANSACTION_LINE = (
+    r"^(?P<date>\d{1,2}/\d{1,2}/\d{2,4}|\d{4}-\d{2}-\d{2}|\d{1,2}[ -][A-Za-z]{3}[ -]\d{4}"
+    r"|[A-Za-z]{3}\.? \d{1,2},? \d{4})"
+    rf"\s+(?P<description>.*?\S)\s+(?P<amount>{_AMOUNT})(?:\s+{_AMOUNT})?$"
+)
+
+
+def _page_text(layout):
+    """A page's text one visual row per line, with its columns in left-to-right order."""
+    pieces = []
+    for box in layout:
+        if isinstance(box, LTTextContainer):
+            for line in box:
+                text = line.get_text().strip() if isinstance(line, LTTextLine) else ""
+                if text:
+                    pieces.append((-line.y0, line.x0, text))
+    rows, last_y = [], None
+    for y, x, text in sorted(pieces):
+        if last_y is None or y - last_y > ROW_TOLERANCE:
+            rows.append([])
+            last_y = y
+        rows[-1].append((x, text))
+    return "\n".join("  ".join(text for _, text in sorted(row)) for row in rows)
+
+
+def _extract_pages(path, page_numbers):
+    """Worker: the text of the given zero-based pages of the PDF at ``path``."""
+    # boxes_flow=None skips pdfminer's reading-order analysis, which is most of its time per
+    # page and which _page_text redoes its own way anyway
+    laparams = LAParams(boxes_flow=None)
+    return [_page_text(layout) for layout in extract_pages(path, page_numbers=set(page_numbers), laparams=laparams)]
+
+
+def page_count(path):
+    with open(path, "rb") as f:
+        return sum(1 for _ in PDFPage.get_pages(f))
+
+
+def _get_pool(workers):
+    """A process pool shared by all sessions, recreated only if a different size is asked for.
+
+    Workers are spawned rather than forked, as forking the multithreaded
+    Streamlit server could copy locks held by other threads.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+@contextmanager
+def _main_script_hidden():
+    """Keeps workers spawned meanwhile from running the main script again.
+
+    A spawned process re-runs ``__main__`` from its ``__file__`` unless it was
+    started with ``-m``. Under Streamlit that is app.py, which would build the
+    whole app, and open the default database, in every worker.
+    """
+    main = sys.modules.get("__main__")
+    main_file = getattr(main, "__file__", None)
+    if main_file is None or getattr(main, "__spec__", None) is not None:
+        yield
+        return
+    del main.__file__
+    try:
+        yield
+    finally:
+        main.__file__ = main_file
+
+
+def _extract_file(path, workers):
+    pages = page_count(path)
+    if workers <= 1 or pages < PARALLEL_MIN_PAGES:
+        return _extract_pages(path, range(pages))
+    # A few contiguous page ranges per worker, so a slow range does not leave the others idle
+    size = max(1, -(-pages // (workers * TASKS_PER_WORKER)))
+    ranges = [range(start, min(start + size, pages)) for start in range(0, pages, size)]
+    # The pool starts its workers as tasks are submitted, which map does before returning
+    with _main_script_hidden():
+        chunks = _get_pool(workers).map(_extract_pages, [path] * len(ranges), ranges)
+    texts = []
+    for chunk in chunks:
+        texts.extend(chunk)
+    return texts
+
+
+def _cached_text(content_hash):
+    with _text_cache_lock:
+        if content_hash in _text_cache:
+            _text_cache.move_to_end(content_hash)
+            return _text_cache[content_hash]
+    return None
+
+
+def _store_text(content_hash, pages):
+    with _text_cache_lock:
+        _text_cache[content_hash] = pages
+        _text_cache.move_to_end(content_hash)
+        while len(_text_cache) > PDF_TEXT_CACHE_SIZE:
+            _text_cache.popitem(last=False)
+
+
+@instrumentation.timed("pdf_statements.extract_pdf_text")
+def extract_pdf_text(file, content_hash=None, workers=None):
+    """Text of every page of a PDF statement, extracted page ranges at a time in a process pool.
+
+    ``file`` is a path or a binary file object (e.g. a Streamlit upload). Results
+    are cached in memory by content hash, so the same statement is only extracted
+    once per process.
+    """
+    content_hash = content_hash or statement_fingerprint(file)
+    pages = _cached_text(content_hash)
+    if pages is not None:
+        return pages
+
+    workers = workers or os.cpu_count() or 1
+    if isinstance(file, str):
+        pages = tuple(_extract_file(file, workers))
+    else:
+        # Workers open the statement by path, so an upload is spooled to a temporary file first
+        file.seek(0)
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+            tmp.write(file.read())
+        file.seek(0)
+        try:
+            pages = tuple(_extract_file(tmp.name, workers))
+        finally:
+            os.remove(tmp.name)
+    _store_text(content_hash, pages)
+    return pages
+
+
+def parse_pdf_text(pages, engine=None):
+    """Transactions found in a statement's page texts, as Date/Amount/Category/Description rows.
+
+    Lines that do not start with a full date and end with an amount (plus an
+    optional running balance) are headers, totals or notes and are skipped.
+    Amounts in parentheses, with a minus sign or marked CR are credits and come
+    out negative.
+    """
+    lines = pd.Series("\n".join(pages).splitlines(), dtype="string").str.strip()
+    found = lines.str.extract(TRANSACTION_LINE).dropna(subset=["date"])
+    dates = normalize_dates(found["date"].astype(object))
+    parsed = dates.str.fullmatch(r"\d{4}-\d{2}-\d{2}").to_numpy()
+    found, dates = found[parsed], dates[parsed]
+
+    raw = found["amount"]
+    amounts = raw.str.replace(r"[^\d.]", "", regex=True).astype("float64")
+    credit = raw.str.contains(r"^\(|-|CR$", regex=True)
+    descriptions = found["description"].str.replace(r"\s{2,}", " ", regex=True)
+    expenses = pd.DataFrame({
+        "Date": dates.to_numpy(),
+        "Amount": amounts.where(~credit, -amounts).to_numpy(),
+        "Description": descriptions.astype(object).to_numpy(),
+    })
+    expenses["Category"] = categorize_expenses(expenses["Description"], engine)
+    return expenses[["Date", "Amount", "Category", "Description"]]
+
+
+def parse_pdf_statement(file, engine=None, workers=None):
+    """Parses and categorizes a PDF bank statement into the same schema as the CSV path."""
+    expenses = parse_pdf_text(extract_pdf_text(file, workers=workers), engine)
+    if expenses.empty:
+        raise ValueError("No transactions found in the PDF statement")
+    return expenses
+
+
+def clear_pdf_text_cache():
+    with _text_cache_lock:
+        _text_cache.clear()
@@ -0,0 +1,133 @@
+import html
+from typing import Dict, List, NamedTuple, Tuple
+import pandas as pd
+from utils.spend_forecast import month_range
+
+REPORT_KINDS = {"monthly": "Monthly spending report", "year_end": "Year-end summary"}
+REPORT_FORMATS = {"csv": "text/csv", "html": "text/html"}
+TOP_MERCHANTS = 10
+LARGEST_EXPENSES = 10
+
+
+class Report(NamedTuple):
+    title: str
+    summary: List[Tuple[str, str]]      # (label, formatted value) pairs shown above the tables
+    tables: Dict[str, pd.DataFrame]     # the first table is the one written to CSV
+
+
+def report_months(kind, period):
+    """The ``YYYY-MM`` months a report covers: ``period`` itself, or every month of a ``YYYY`` year."""
+    if kind == "monthly":
+        return [pd.Period(period, freq="M").strftime("%Y-%m")]
+    if kind == "year_end":
+        year = pd.Period(period, freq="Y").year
+        return month_range(f"{year}-01", f"{year}-12")
+    raise ValueError(f"Unknown report kind '{kind}', expected one of {', '.join(REPORT_KINDS)}")
+
+
+def _money(value):
+    return f"-${-value:,.2f}" if value < 0 else f"${value:,.2f}"
+
+
+def _top_merchants(merchant_months, limit=TOP_MERCHANTS):
+    merchants = merchant_months[merchant_months["merchant"] != ""]
+    top = (merchants.groupby("merchant", as_index=False)[["total", "count"]].sum()
+           .sort_values("total", ascending=False, kind="stable").head(limit))
+    return pd.DataFrame({
+        "Merchant": top["merchant"].to_numpy(),
+        "Spent": top["total"].round(2).to_numpy(),
+        "Transactions": top["count"].astype(int).to_numpy(),
+    })
+
+
+def monthly_report(category_months, merchant_months, expenses, budget, month):
+    """Spending in one month against the user's budget, with its top merchants and largest expenses.
+
+    ``category_months`` and ``merchant_months`` are the month's rows of the
+    category and merchant aggregates; ``expenses`` is the month's expense history.
+    """
+    spent = category_months.groupby("category")["total"].sum()
+    counts = category_months.groupby("category")["count"].sum()
+    budget = pd.Series(budget, dtype=float)
+    categories = spent.index.union(budget[budget > 0].index)
+    spent = spent.reindex(categories, fill_value=0.0)
+    budget = budget.reindex(categories, fill_value=0.0)
+    by_category = pd.DataFrame({
+        "Category": categories,
+        "Budget": budget.round(2).to_numpy(),
+        "Spent": spent.round(2).to_numpy(),
+        "Remaining": (budget - spent).round(2).to_numpy(),
+        "Transactions": counts.reindex(categories, fill_value=0).astype(int).to_numpy(),
+        "Share": (spent / spent.sum() if spent.sum() else spent * 0).round(4).to_numpy(),
+    }).sort_values("Spent", ascending=False, ignore_index=True)
+
+    largest = expenses.sort_values("Amount", ascending=False, kind="stable").head(LARGEST_EXPENSES)
+    largest = largest[["Date", "Amount", "Category", "Description"]]
+    total, budgeted = spent.sum(), budget.sum()
+    summary = [
+        ("Total spent", _money(total)),
+        ("Total budgeted", _money(budgeted)),
+        ("Over budget" if total > budgeted else "Under budget", _money(abs(budgeted - total))),
+        ("Transactions", f"{int(counts.sum()):,}"),
+    ]
+    return Report(
+        f"Monthly spending report, {pd.Period(month, freq='M').strftime('%B %Y')}", summary,
+        {"Spending by category": by_category, "Top merchants": _top_merchants(merchant_months),
+         "Largest expenses": largest.reset_index(drop=True)},
+    )
+
+
+def year_end_summary(category_months, merchant_months, tax_summary, year):
+    """A year's spending by month and category, its top merchants, and savings against net income."""
+    months = report_months("year_end", year)
+    by_month = category_months.pivot_table(
+        index="month", columns="category", values="total", aggfunc="sum", fill_value=0.0
+    ).reindex(months, fill_value=0.0)
+    by_month["Total"] = by_month.sum(axis=1)
+    by_month = by_month.round(2).rename_axis(index="Month", columns=None).reset_index()
+
+    spent = category_months.groupby("category")["total"].sum().sort_values(ascending=False)
+    total = spent.sum()
+    by_category = pd.DataFrame({
+        "Category": spent.index,
+        "Spent": spent.round(2).to_numpy(),
+        "Monthly average": (spent / len(months)).round(2).to_numpy(),
+        "Share": (spent / total if total else spent * 0).round(4).to_numpy(),
+    })
+
+    net_income = float((tax_summary or {}).get("net_income", 0) or 0)
+    summary = [("Total spent", _money(total)), ("Monthly average", _money(total / len(months)))]
+    if not spent.empty:
+        busiest = by_month.loc[by_month["Total"].idxmax()]
+        summary += [("Largest category", f"{spent.index[0]} ({_money(spent.iloc[0])})"),
+                    ("Most expensive month", f"{busiest['Month']} ({_money(busiest['Total'])})")]
+    if net_income:
+        summary += [("Net income", _money(net_income)), ("Saved", _money(net_income - total)),
+                    ("Savings rate", f"{(net_income - total) / net_income:.1%}")]
+    return Report(
+        f"Year-end summary, {months[0][:4]}", summary,
+        {"Spending by month": by_month, "Spending by category": by_category,
+         "Top merchants": _top_merchants(merchant_months)},
+    )
+
+
+def render_report(report, fmt):
+    """The report as CSV (its first table) or as a self-contained HTML page, encoded as UTF-8."""
+    if fmt == "csv":
+        return next(iter(report.tables.values())).to_csv(index=False).encode()
+    if fmt != "html":
+        raise ValueError(f"Unsupported report format '{fmt}', expected one of {', '.join(REPORT_FORMATS)}")
+    title = html.escape(report.title)
+    summary = "".join(f"<tr><th>{html.escape(label)}</th><td>{html.escape(value)}</td></tr>"
+                      for label, value in report.summary)
+    sections = "".join(
+        f"<h2>{html.escape(name)}</h2>"
+        + (table.to_html(index=False, float_format="{:,.2f}".format, border=0) if not table.empty else "<p>None</p>")
+        for name, table in report.tables.items()
+    )
+    return (
+        f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{title}</title><style>"
+        "body{font-family:sans-serif;margin:2em}table{border-collapse:collapse;margin-bottom:1.5em}"
+        "th,td{padding:4px 10px;border-bottom:1px solid #ddd;text-align:left}"
+        f"</style></head><body><h1>{title}</h1><table>{summary}</table>{sections}</body></html>"
+    ).encode()
@@ -0,0 +1,120 @@
+import re
+import numpy as np
+import pandas as pd
+
+# Closed months looked at when deciding whether a merchant recurs, and averaged for the forecast
+RECURRING_WINDOW = 6
+RECURRING_MIN_MONTHS = 3
+# Largest month-to-month spread (std / mean) of a recurring charge; rent and subscriptions barely move
+RECURRING_MAX_VARIATION = 0.25
+FORECAST_WINDOW = 3
+BUDGET_ROUNDING = 10
+
+RECURRING_COLUMNS = ["Merchant", "Category", "Expected", "Months", "Last Month"]
+FORECAST_COLUMNS = ["Category", "Forecast", "Recurring", "Average"]
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def merchant_key(description):
+    """Groups a merchant's transactions: lowercase words of the description, minus reference numbers.
+
+    "RENT PAYMENT APT 4B REF3115" and "RENT PAYMENT APT 4B REF420" both give
+    "rent payment apt". Stored with every expense, where the merchant aggregates' triggers read it.
+    """
+    if description is None:
+        return ""
+    words = [w for w in _WORD.findall(str(description).lower()) if not any(c.isdigit() for c in w)]
+    return " ".join(words[:4])
+
+
+def month_range(first, last):
+    """Every ``YYYY-MM`` month from ``first`` to ``last`` inclusive."""
+    return pd.period_range(first, last, freq="M").strftime("%Y-%m").tolist()
+
+
+def shift_month(month, months):
+    return (pd.Period(month, freq="M") + months).strftime("%Y-%m")
+
+
+def _monthly(rows, columns, value, months):
+    """``rows`` summed into a month x key matrix: a row for each of ``months`` (0 where a key has
+    nothing), a column per distinct ``columns`` value. Scattered with numpy, as pivot_table costs
+    milliseconds even for a few hundred rows.
+    """
+    keys, key_codes = pd.factorize(rows[columns].to_numpy(), sort=True)[::-1]
+    month_codes = pd.Index(months).get_indexer(rows["month"])
+    matrix = np.zeros((len(months), len(keys)))
+    np.add.at(matrix, (month_codes, key_codes), rows[value].to_numpy(dtype=float))
+    return pd.DataFrame(matrix, index=months, columns=keys)
+
+
+def detect_recurring(merchant_months, month, window=RECURRING_WINDOW, min_months=RECURRING_MIN_MONTHS,
+                     max_variation=RECURRING_MAX_VARIATION):
+    """Merchants charged about the same amount once a month, as of the month before ``month``.
+
+    ``merchant_months`` has one row per (merchant, month, category) with the
+    month's ``total`` and ``count``, as kept in the merchant aggregates. All
+    merchants are scored at once, column-wise over a month x merchant matrix
+    of the trailing ``window`` closed months: a merchant recurs if it charged
+    exactly once in at least ``min_months`` of them, including one of the last
+    two, and those charges varied by at most ``max_variation`` of their mean.
+    """
+    months = month_range(shift_month(month, -window), shift_month(month, -1))
+    rows = merchant_months[merchant_months["month"].isin(months) & (merchant_months["merchant"] != "")]
+    if rows.empty:
+        return pd.DataFrame(columns=RECURRING_COLUMNS)
+
+    totals = _monthly(rows, "merchant", "total", months)
+    counts = _monthly(rows, "merchant", "count", months)
+    # Months with exactly one charge; anything else (none, or a coffee shop's daily visits) is a gap
+    charges = totals.where(counts == 1)
+    seen, mean, std = charges.count(), charges.mean(), charges.std(ddof=0)
+    recent = charges.iloc[-2:].notna().any()
+    recurring = (seen >= min_months) & recent & (std <= max_variation * mean.abs()) & (mean > 0)
+    if not recurring.any():
+        return pd.DataFrame(columns=RECURRING_COLUMNS)
+
+    merchants = recurring.index[recurring.to_numpy()]
+    last_month = charges[merchants].notna().to_numpy()[::-1].argmax(axis=0)
+    category = (rows[rows["merchant"].isin(merchants)]
+                .sort_values("month").groupby("merchant")["category"].last())
+    return pd.DataFrame({
+        "Merchant": merchants,
+        "Category": category.reindex(merchants).to_numpy(),
+        "Expected": mean[merchants].round(2).to_numpy(),
+        "Months": seen[merchants].astype(int).to_numpy(),
+        "Last Month": np.array(months)[len(months) - 1 - last_month],
+    }).sort_values("Expected", ascending=False, ignore_index=True)
+
+
+def forecast_spending(category_months, recurring, month, window=FORECAST_WINDOW):
+    """Expected spend per category in ``month``, from the ``window`` closed months before it.
+
+    Every category's forecast is the trailing mean of its monthly totals (months
+    without spending count as 0), but never less than the recurring charges
+    detected in it, which are due regardless of recent habits.
+    """
+    months = month_range(shift_month(month, -window), shift_month(month, -1))
+    rows = category_months[category_months["month"].isin(months)]
+    committed = recurring.groupby("Category")["Expected"].sum() if not recurring.empty else pd.Series(dtype=float)
+    if rows.empty and committed.empty:
+        return pd.DataFrame(columns=FORECAST_COLUMNS)
+
+    average = _monthly(rows, "category", "total", months).mean() if not rows.empty else pd.Series(dtype=float)
+    categories = average.index.union(committed.index)
+    average = average.reindex(categories, fill_value=0.0)
+    committed = committed.reindex(categories, fill_value=0.0)
+    forecast = pd.DataFrame({
+        "Category": categories,
+        "Forecast": np.maximum(average, committed).round(2).to_numpy(),
+        "Recurring": committed.round(2).to_numpy(),
+        "Average": average.round(2).to_numpy(),
+    })
+    return forecast[forecast["Forecast"] > 0].sort_values("Forecast", ascending=False, ignore_index=True)
+
+
+def suggested_budgets(forecast, rounding=BUDGET_ROUNDING):
+    """Monthly budget per category: its forecast rounded up to the next ``rounding`` dollars."""
+    amounts = np.ceil(forecast["Forecast"].to_numpy(dtype=float) / rounding) * rounding
+    return dict(zip(forecast["Category"], amounts.astype(int).tolist()))
@@ -0,0 +1,248 @@
+import argparse
+import glob
+import os
+import pickle
+import re
+import threading
+import numpy as np
+import pandas as pd
+
+BRACKET_CSV_PATTERN = "normalized_state_brackets_*.csv"
+# Federal brackets and standard deductions, one row per (Year, Filing_Status)
+FEDERAL_BRACKET_CSV = "federal_brackets.csv"
+STANDARD_DEDUCTION_CSV = "standard_deductions.csv"
+# Optional precompiled copy of the registry, rebuilt whenever a bracket CSV changes
+BRACKET_CACHE_PATH = os.environ.get("FINPAL_BRACKET_CACHE")
+DEFAULT_TAX_YEAR = 2024
+DEFAULT_FILING_STATUS = "single"
+FEDERAL = "US"
+
+# Reversed map: full uppercase names like N D to their USPS codes
+STATE_NAME_TO_CODE = {
+    "ALA": "AL", "ALASKA": "AK", "ARIZ": "AZ", "ARK": "AR", "CALIF": "CA", "COLO": "CO",
+    "CONN": "CT", "DC": "DC", "DEL": "DE", "FLA": "FL", "GA": "GA", "HAWAII": "HI", "IDAHO": "ID",
+    "ILL": "IL", "IND": "IN", "IOWA": "IA", "KANS": "KS", "KY": "KY", "LA": "LA", "MAINE": "ME",
+    "MD": "MD", "MASS": "MA", "MICH": "MI", "MINN": "MN", "MISS": "MS", "MO": "MO", "MONT": "MT",
+    "NEB": "NE", "NEV": "NV", "NH": "NH", "NJ": "NJ", "NM": "NM", "NY": "NY", "NC": "NC", "ND": "ND",
+    "OHIO": "OH", "OKLA": "OK", "ORE": "OR", "PA": "PA", "RI": "RI", "SC": "SC", "SD": "SD",
+    "TENN": "TN", "TEX": "TX", "UTAH": "UT", "VT": "VT", "VA": "VA", "WASH": "WA", "W VA": "WV",
+    "WIS": "WI", "WYO": "WY"
+}
+
+
+class BracketSchedule:
+    """Progressive bracket table stored as sorted NumPy arrays.
+
+    ``cumulative[i]`` holds the total tax owed on income up to ``thresholds[i]``,
+    so the tax on any income is one binary search plus one multiply.
+    """
+
+    __slots__ = ("thresholds", "rates", "cumulative")
+
+    def __init__(self, thresholds, rates):
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        rates = np.asarray(rates, dtype=np.float64)
+        order = np.argsort(thresholds, kind="stable")
+        self.thresholds = thresholds[order]
+        self.rates = rates[order]
+        widths = np.diff(self.thresholds)
+        self.cumulative = np.concatenate(([0.0], np.cumsum(widths * self.rates[:-1])))
+
+    def tax(self, income):
+        """Tax owed on a single taxable income."""
+        i = int(np.searchsorted(self.thresholds, income, side="right")) - 1
+        if i < 0:
+            return 0.0
+        return float(self.cumulative[i] + (income - self.thresholds[i]) * self.rates[i])
+
+    def tax_array(self, incomes):
+        """Vectorized ``tax`` over an array of taxable incomes."""
+        incomes = np.asarray(incomes, dtype=np.float64)
+        idx = np.searchsorted(self.thresholds, incomes, side="right") - 1
+        below = idx < 0
+        idx = np.clip(idx, 0, None)
+        taxes = self.cumulative[idx] + (incomes - self.thresholds[idx]) * self.rates[idx]
+        return np.where(below, 0.0, taxes)
+
+    def breakdown(self, income):
+        """Per-bracket breakdown of the tax on ``income``, formatted for display."""
+        breakdown = []
+        uppers = np.append(self.thresholds[1:], np.inf)
+        for lower, upper, rate in zip(self.thresholds, uppers, self.rates):
+            if income <= lower:
+                break
+            taxed = min(income, upper) - lower
+            breakdown.append({
+                "lower_bound": f"${lower:,.0f}",
+                "upper_bound": f"${min(income, upper):,.0f}",
+                "rate": f"{rate*100:.1f}%",
+                "amount_taxed": f"${taxed:,.2f}",
+                "tax": f"${taxed * rate:,.2f}"
+            })
+        return breakdown
+
+
+def normalize_state(state):
+    """Maps a USPS code or a CSV-style state name (e.g. 'N.Y.') to the registry key."""
+    state_clean = str(state).replace(".", "").strip().upper()
+    return STATE_NAME_TO_CODE.get(state_clean, state_clean)
+
+
+def _year_from_path(path):
+    match = re.search(r"(\d{4})", os.path.basename(path))
+    return int(match.group(1)) if match else DEFAULT_TAX_YEAR
+
+
+def load_bracket_csv(path, year=None, filing_status=DEFAULT_FILING_STATUS):
+    """Builds ``{(year, filing_status, state): BracketSchedule}`` from one bracket CSV.
+
+    The year is taken from the file name unless the CSV has a ``Year`` column, and
+    the filing status defaults to single unless it has a ``Filing_Status`` column.
+    """
+    df = pd.read_csv(path)
+    df["State"] = df["State"].map(normalize_state)
+    df["Year"] = df["Year"].astype(int) if "Year" in df else (year or _year_from_path(path))
+    if "Filing_Status" in df:
+        df["Filing_Status"] = df["Filing_Status"].str.strip().str.lower()
+    else:
+        df["Filing_Status"] = filing_status
+
+    schedules = {}
+    for (yr, status, state), group in df.groupby(["Year", "Filing_Status", "State"], sort=False):
+        schedules[(int(yr), status, state)] = BracketSchedule(group["Bracket_Min"], group["Rate"])
+    return schedules
+
+
+def load_standard_deductions(path=STANDARD_DEDUCTION_CSV):
+    """Builds ``{(year, filing_status): deduction}`` from the standard deduction CSV."""
+    df = pd.read_csv(path)
+    statuses = df["Filing_Status"].str.strip().str.lower()
+    return {(int(yr), status): int(amount)
+            for yr, status, amount in zip(df["Year"], statuses, df["Standard_Deduction"])}
+
+
+def _source_paths():
+    return sorted(glob.glob(BRACKET_CSV_PATTERN)) + [FEDERAL_BRACKET_CSV, STANDARD_DEDUCTION_CSV]
+
+
+def build_registry(paths=None):
+    """Loads every yearly bracket CSV side by side, plus the federal tables and standard deductions.
+
+    Returns ``{(year, filing_status, state): BracketSchedule}``; the standard
+    deductions are stored under ``(year, filing_status)``.
+    """
+    if paths is None:
+        paths = _source_paths()
+    registry = {}
+    for path in paths:
+        if os.path.basename(path) == STANDARD_DEDUCTION_CSV:
+            registry.update(load_standard_deductions(path))
+        else:
+            registry.update(load_bracket_csv(path))
+    return registry
+
+
+def _source_signature(paths):
+    return [(os.path.abspath(path), os.stat(path).st_mtime_ns, os.stat(path).st_size) for path in paths]
+
+
+def compile_registry(cache_path, paths=None):
+    """Builds the registry and pickles it to ``cache_path`` with the signature of its source CSVs."""
+    if paths is None:
+        paths = _source_paths()
+    registry = build_registry(paths)
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump({"signature": _source_signature(paths), "registry": registry}, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+    return registry
+
+
+def load_compiled_registry(cache_path, paths=None):
+    """The registry pickled by compile_registry, or None if it is missing or stale."""
+    if paths is None:
+        paths = _source_paths()
+    try:
+        with open(cache_path, "rb") as f:
+            compiled = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+    if compiled.get("signature") != _source_signature(paths):
+        return None
+    return compiled["registry"]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """The bracket registry, loaded on first use and shared by every session in the process."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                registry = None
+                if BRACKET_CACHE_PATH:
+                    registry = load_compiled_registry(BRACKET_CACHE_PATH)
+                    if registry is None:
+                        registry = compile_registry(BRACKET_CACHE_PATH)
+                _registry = registry if registry is not None else build_registry()
+    return _registry
+
+
+def reset_registry():
+    """Drops the loaded registry so the next lookup reads the bracket files again."""
+    global _registry
+    with _registry_lock:
+        _registry = None
+
+
+def supported_filings():
+    """The ``(year, filing_status)`` pairs with both federal brackets and a standard deduction."""
+    registry = get_registry()
+    return sorted((key[0], key[1]) for key in registry if len(key) == 3 and key[2] == FEDERAL
+                  and (key[0], key[1]) in registry)
+
+
+def _check_filing(year, filing_status):
+    key = (int(year), filing_status.strip().lower())
+    if (*key, FEDERAL) not in get_registry() or key not in get_registry():
+        supported = ", ".join(f"{yr} {status}" for yr, status in supported_filings())
+        raise ValueError(f"No tax tables for {year} filing status '{filing_status}'; supported: {supported}")
+    return key
+
+
+def get_schedule(state, year=DEFAULT_TAX_YEAR, filing_status=DEFAULT_FILING_STATUS):
+    """Returns the BracketSchedule for a state (or FEDERAL), or None if the state has no table at all.
+
+    A state without a table for this year and filing status uses its closest
+    one: the same filing status if any year has it, else single filers, from
+    the nearest year (the later one on a tie). Raises ValueError if the year
+    and filing status are not supported at all.
+    """
+    year, filing_status = _check_filing(year, filing_status)
+    key = FEDERAL if state == FEDERAL else normalize_state(state)
+    registry = get_registry()
+    schedule = registry.get((year, filing_status, key))
+    if schedule is not None or key == FEDERAL:
+        return schedule
+    available = [k for k in registry if len(k) == 3 and k[2] == key and k[1] in (filing_status, DEFAULT_FILING_STATUS)]
+    if not available:
+        return None
+    return registry[min(available, key=lambda k: (k[1] != filing_status, abs(k[0] - year), -k[0]))]
+
+
+def get_standard_deduction(year=DEFAULT_TAX_YEAR, filing_status=DEFAULT_FILING_STATUS):
+    """The federal standard deduction; raises ValueError for an unsupported year or filing status."""
+    return get_registry()[_check_filing(year, filing_status)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompile the tax bracket CSVs into a binary registry.")
+    parser.add_argument("cache_path", nargs="?", default=BRACKET_CACHE_PATH or "user_data/bracket_registry.pkl")
+    args = parser.parse_args()
+    # Pickle the schedules under their importable module name, not __main__
+    from utils import tax_brackets
+    print(f"Compiled {len(tax_brackets.compile_registry(args.cache_path))} tax tables into {args.cache_path}")
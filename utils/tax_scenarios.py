@@ -0,0 +1,103 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from utils.data_processing import NYC_TAX_RATE, DEFAULT_STATE_SCHEDULE, calculate_taxes_batch
+from utils.tax_brackets import DEFAULT_FILING_STATUS, DEFAULT_TAX_YEAR, FEDERAL, get_schedule, normalize_state
+
+SCENARIO_INCOME_MIN = 0
+SCENARIO_INCOME_MAX = 500_000
+SCENARIO_POINTS = 1_000
+SCENARIO_COLUMNS = [
+    "state", "nyc", "gross_income", "total_tax", "effective_rate", "marginal_rate", "net_monthly_income"
+]
+
+SCENARIO_CACHE_SIZE = 256
+_curve_cache = OrderedDict()  # (year, filing_status, state, nyc, grid) -> curve DataFrame, least recently used first
+_curve_cache_lock = threading.Lock()
+
+
+def income_grid(income_min=SCENARIO_INCOME_MIN, income_max=SCENARIO_INCOME_MAX, points=SCENARIO_POINTS):
+    return np.linspace(float(income_min), float(income_max), int(points))
+
+
+def marginal_rates(schedule, taxable):
+    """Rate of the bracket each taxable income falls in (0 where there is no taxable income)."""
+    idx = np.searchsorted(schedule.thresholds, taxable, side="right") - 1
+    rates = schedule.rates[np.clip(idx, 0, None)]
+    return np.where((idx < 0) | (taxable <= 0), 0.0, rates)
+
+
+def _compute_curves(pairs, grid, year, filing_status):
+    """Curves for many ``(state, nyc)`` pairs from a single calculate_taxes_batch call."""
+    n = len(grid)
+    states = np.repeat(np.array([state for state, _ in pairs], dtype=object), n)
+    nyc_flags = np.repeat(np.array([nyc for _, nyc in pairs], dtype=bool), n)
+    taxes = calculate_taxes_batch(np.tile(grid, len(pairs)), states, nyc_flags, year, filing_status)
+
+    taxable = taxes["taxable_income"].to_numpy()[:n]  # the same for every pair
+    federal_marginal = marginal_rates(get_schedule(FEDERAL, year, filing_status), taxable)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        effective = np.where(taxes["gross_income"] > 0, taxes["total_tax"] / taxes["gross_income"], 0.0)
+
+    curves = {}
+    for i, (state, nyc) in enumerate(pairs):
+        rows = slice(i * n, (i + 1) * n)
+        schedule = get_schedule(state, year, filing_status) or DEFAULT_STATE_SCHEDULE
+        marginal = federal_marginal + marginal_rates(schedule, taxable)
+        if nyc:
+            marginal = marginal + np.where(taxable > 0, NYC_TAX_RATE, 0.0)
+        curves[(state, nyc)] = pd.DataFrame({
+            "state": state,
+            "nyc": nyc,
+            "gross_income": grid,
+            "total_tax": taxes["total_tax"].to_numpy()[rows],
+            "effective_rate": effective[rows],
+            "marginal_rate": marginal,
+            "net_monthly_income": taxes["net_income"].to_numpy()[rows] / 12,
+        })
+    return curves
+
+
+def tax_scenarios(states, nyc_options=(False,), income_min=SCENARIO_INCOME_MIN, income_max=SCENARIO_INCOME_MAX,
+                  points=SCENARIO_POINTS, year=DEFAULT_TAX_YEAR, filing_status=DEFAULT_FILING_STATUS):
+    """Effective and marginal tax rate and net monthly income curves over an income grid.
+
+    Returns one row per (state, nyc, income) with the SCENARIO_COLUMNS. The NYC
+    flag only applies to New York, so other states get a single curve. Curves are
+    memoized per (year, filing status, state, nyc, grid) in an LRU cache, and all
+    the curves missing from it are computed together in one vectorized pass.
+    """
+    filing_status = filing_status.lower()
+    grid = income_grid(income_min, income_max, points)
+    grid_key = (float(income_min), float(income_max), int(points))
+    pairs = list(dict.fromkeys(
+        (code, bool(nyc) and code == "NY") for code in map(normalize_state, states) for nyc in nyc_options
+    ))
+
+    curves, missing = {}, []
+    with _curve_cache_lock:
+        for pair in pairs:
+            key = (year, filing_status) + pair + (grid_key,)
+            if key in _curve_cache:
+                _curve_cache.move_to_end(key)
+                curves[pair] = _curve_cache[key]
+            else:
+                missing.append(pair)
+    if missing:
+        computed = _compute_curves(missing, grid, year, filing_status)
+        curves.update(computed)
+        with _curve_cache_lock:
+            for pair, curve in computed.items():
+                _curve_cache[(year, filing_status) + pair + (grid_key,)] = curve
+            while len(_curve_cache) > SCENARIO_CACHE_SIZE:
+                _curve_cache.popitem(last=False)
+
+    if not pairs:
+        return pd.DataFrame(columns=SCENARIO_COLUMNS)
+    return pd.concat([curves[pair] for pair in pairs], ignore_index=True)
+
+
+def clear_scenario_cache():
+    with _curve_cache_lock:
+        _curve_cache.clear()